@@ -1,5 +1,6 @@
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Optional, Literal, Any
 
 from pydantic import BaseModel, Field, field_validator
 from pydantic_core.core_schema import FieldValidationInfo
@@ -21,12 +22,17 @@ class WebsocketConfig(BaseModel):
     timeframe: Literal["1m", "3m", "5m", "15m", "1h"] = "1m"
 
     # поведение
-    mode: Literal["replay", "live"] = "replay"
-    reconnect_delay: int = 5  # сек
+    mode: Literal[
+        "replay", "live", "walkforward", "montecarlo", "ingest", "soak", "batch"
+    ] = "replay"
+    reconnect_delay: int = 5  # сек, база экспоненциального backoff
+    reconnect_max_delay: int = 60  # сек, потолок backoff
 
     # торговые настройки
     max_bars_wait: int = 12
     retest_pct: float = 0.003
+    rsi_long_max: float = 45.0  # RSI 1d для лонга не выше
+    rsi_short_min: float = 55.0  # RSI 1d для шорта не ниже
     order_percent: float = 0.40
     trailing_pct: float = 0.01
     take_profit_pct: Optional[float] = None
@@ -35,6 +41,28 @@ class WebsocketConfig(BaseModel):
     max_order_cost_usdt: Optional[float] = None
     base_buffer_maxlen: Optional[int] = 8000
 
+    # жизненный цикл PostOnly-входов (см. trade/orders.py)
+    order_max_bars: int = 3  # баров без исполнения до cancel/replace
+    order_max_drift_pct: Optional[float] = 0.003  # уход цены от лимитки
+    order_max_replaces: int = 2
+    order_poll_interval: float = 2.0  # сек
+
+    # цена входа от лучших bid/ask из orderbook.1 (см. trade/orderbook.py)
+    orderbook_enabled: bool = True
+    orderbook_max_age_ms: int = 5000
+    # старшие ТФ индикаторов из нативных потоков kline.60/kline.D (+ REST на
+    # старте) вместо агрегации из базового буфера; буфер — только на EMA базы
+    native_htf_enabled: bool = False
+    # закрывать бар по часам на границе, не дожидаясь confirm (trade/barclock.py)
+    early_close_enabled: bool = False
+    early_close_grace_ms: int = 150  # запас после границы на сделки в пути
+    # параллельные соединения WS (trade/data_ws.py): свеча берётся от первого
+    # доставившего, отстающее соединение переподключается
+    feeds: int = 1
+    feed_urls: list[str] = []  # альтернативные эндпоинты, по кругу вместе с url
+    feed_max_lag_ms: int = 1500  # опоздание подтверждённой свечи от первой
+    feed_lag_strikes: int = 3  # баров подряд с опозданием до переподключения
+
     # хотим, чтобы повторная установка значений тоже валидировалась
     model_config = {"validate_assignment": True}
 
@@ -46,6 +74,20 @@ class WebsocketConfig(BaseModel):
             raise ValueError("url должен начинаться с ws:// или wss://")
         return url
 
+    @field_validator("feed_urls")
+    @classmethod
+    def validate_feed_urls(cls, urls: list[str]) -> list[str]:
+        for url in urls:
+            cls.validate_ws_url(url)
+        return urls
+
+    @field_validator("feeds", "feed_max_lag_ms", "feed_lag_strikes")
+    @classmethod
+    def validate_feeds(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
     @field_validator("symbol")
     @classmethod
     def uppercase_symbol(cls, symbol: str) -> str:
@@ -64,6 +106,7 @@ class WebsocketConfig(BaseModel):
         "balance_drawdown_limit_pct",
         "retest_pct",
         "take_profit_pct",
+        "order_max_drift_pct",
     )
     @classmethod
     def validate_percent_range(
@@ -75,6 +118,34 @@ class WebsocketConfig(BaseModel):
             raise ValueError(f"{info.field_name} должен быть в диапазоне (0, 1]")
         return percent_value
 
+    @field_validator("order_max_bars", "order_max_replaces")
+    @classmethod
+    def validate_order_counts(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 0:
+            raise ValueError(f"{info.field_name} должен быть >= 0")
+        return value
+
+    @field_validator("order_poll_interval")
+    @classmethod
+    def validate_poll_interval(cls, order_poll_interval: float) -> float:
+        if order_poll_interval <= 0:
+            raise ValueError("order_poll_interval должен быть > 0")
+        return order_poll_interval
+
+    @field_validator("early_close_grace_ms")
+    @classmethod
+    def validate_early_close_grace(cls, early_close_grace_ms: int) -> int:
+        if early_close_grace_ms < 0:
+            raise ValueError("early_close_grace_ms должен быть >= 0")
+        return early_close_grace_ms
+
+    @field_validator("orderbook_max_age_ms")
+    @classmethod
+    def validate_orderbook_max_age(cls, orderbook_max_age_ms: int) -> int:
+        if orderbook_max_age_ms < 1:
+            raise ValueError("orderbook_max_age_ms должен быть >= 1")
+        return orderbook_max_age_ms
+
     @field_validator("min_atr_1h")
     @classmethod
     def validate_min_atr(cls, min_atr_1h: Optional[float]) -> Optional[float]:
@@ -84,14 +155,411 @@ class WebsocketConfig(BaseModel):
             raise ValueError("min_atr_1h должен быть > 0")
         return min_atr_1h
 
-    @field_validator("reconnect_delay")
+    @field_validator("reconnect_delay", "reconnect_max_delay")
     @classmethod
-    def validate_reconnect_delay(cls, reconnect_delay: int) -> int:
+    def validate_reconnect_delay(
+        cls, reconnect_delay: int, info: FieldValidationInfo
+    ) -> int:
         if reconnect_delay < 0:
-            raise ValueError("reconnect_delay должен быть >= 0")
+            raise ValueError(f"{info.field_name} должен быть >= 0")
         return reconnect_delay
 
 
+class ReplayConfig(BaseModel):
+    # "rest" — последние total_bars с биржи; "file" — локальная история
+    source: Literal["rest", "file"] = "rest"
+    total_bars: int = 5000
+    data_dir: Path = BASE_DIR / "data" / "history"
+    path_template: str = "{symbol}_{timeframe}.csv"  # .csv / .parquet / .bin
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    chunk_bars: int = 100_000
+
+    @field_validator("total_bars", "chunk_bars")
+    @classmethod
+    def validate_positive(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+
+class IndicatorSpec(BaseModel):
+    name: str
+    kind: Literal["ema", "rsi", "atr"]
+    # "base" — базовый ТФ потока (ws.timeframe), каким бы он ни был
+    timeframe: Literal["base", "1m", "3m", "5m", "15m", "1h", "1d"]
+    window: int
+
+    @field_validator("window")
+    @classmethod
+    def validate_window(cls, window: int) -> int:
+        if window < 1:
+            raise ValueError("window должен быть >= 1")
+        return window
+
+    def timeframe_for(self, base_timeframe: str) -> str:
+        """ТФ индикатора при базовом base_timeframe."""
+        if self.timeframe == "base":
+            return base_timeframe.lower()
+        return self.timeframe
+
+
+# набор, который использует StrategyState (имена — ключи в handle_kline)
+DEFAULT_INDICATORS = [
+    IndicatorSpec(name="ema60_5", kind="ema", timeframe="base", window=60),
+    IndicatorSpec(name="ema163_5", kind="ema", timeframe="base", window=163),
+    IndicatorSpec(name="ema1h", kind="ema", timeframe="1h", window=60),
+    IndicatorSpec(name="rsi1d", kind="rsi", timeframe="1d", window=14),
+    IndicatorSpec(name="atr1h", kind="atr", timeframe="1h", window=14),
+]
+
+
+class WalkForwardConfig(BaseModel):
+    # локальная история базового ТФ (CSV/Parquet с колонками ts,o,h,l,c,v)
+    history_path: Optional[Path] = None
+    in_sample_bars: int = 8640  # 30 дней 5m
+    out_sample_bars: int = 2016  # 7 дней 5m
+    step_bars: Optional[int] = None  # по умолчанию = out_sample_bars
+    workers: Optional[int] = None  # None -> os.cpu_count()
+    objective: Literal["return", "calmar"] = "return"
+    start_balance: float = 1000.0
+
+    # 1m история под базовыми барами: выходы трейлинга внутри бара (intrabar.py)
+    sub_bars_path: Optional[Path] = None
+    # путь цены внутри подбара: close — только close, ohlc — o→ближний→дальний→c
+    intrabar_path: Literal["close", "ohlc"] = "ohlc"
+
+    # сетка параметров WebsocketConfig, перебираемая на in-sample окне
+    grid: dict[str, list[Any]] = {
+        "retest_pct": [0.002, 0.003, 0.005],
+        "trailing_pct": [0.005, 0.01, 0.02],
+        "take_profit_pct": [None, 0.02],
+    }
+
+    cache_dir: Path = BASE_DIR / "data" / "cache"
+    report_path: Path = BASE_DIR / "data" / "walkforward_report.csv"
+
+    @field_validator("in_sample_bars", "out_sample_bars")
+    @classmethod
+    def validate_window(cls, bars: int) -> int:
+        if bars < 1:
+            raise ValueError("размер окна должен быть >= 1")
+        return bars
+
+    @field_validator("grid")
+    @classmethod
+    def validate_grid(cls, grid: dict[str, list[Any]]) -> dict[str, list[Any]]:
+        unknown = set(grid) - set(WebsocketConfig.model_fields)
+        if unknown:
+            raise ValueError(f"неизвестные параметры в grid: {sorted(unknown)}")
+        if any(not values for values in grid.values()):
+            raise ValueError(
+                "у каждого параметра grid должно быть хотя бы одно значение"
+            )
+        return grid
+
+
+class MonteCarloConfig(BaseModel):
+    # журнал сделок (CSV/Parquet), напр. *_trades.csv из walk-forward
+    ledger_path: Optional[Path] = None
+    paths: int = 100_000
+    method: Literal["bootstrap", "shuffle", "block"] = "bootstrap"
+    block_size: int = 10
+    seed: Optional[int] = None
+    report_path: Path = BASE_DIR / "data" / "montecarlo_report.csv"
+
+    @field_validator("paths", "block_size")
+    @classmethod
+    def validate_positive(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+
+class RateLimitConfig(BaseModel):
+    # общий token bucket для всех REST-клиентов (публичный + приватный)
+    rate_per_sec: float = 50.0  # токенов в секунду
+    burst: float = 50.0  # ёмкость ведра
+    # токены, которые фоновые классы (балансы/история) не могут выбрать:
+    # запас под выходы и входы
+    reserve: float = 10.0
+    # вес запроса в токенах; при rate_per_sec=50 вес 5 = 10 req/s (лимит Bybit
+    # на create/cancel), вес 1 = 50 req/s (order/realtime, wallet, position)
+    weights: dict[str, float] = {
+        "create_order": 5.0,
+        "create_market_order": 5.0,
+        "cancel_order": 5.0,
+        "fetch_order": 1.0,
+        "fetch_balance": 1.0,
+        "fetch_positions": 1.0,
+        "fetch_markets": 1.0,
+        "fetch_ohlcv": 1.0,
+    }
+
+    @field_validator("rate_per_sec", "burst")
+    @classmethod
+    def validate_positive(cls, value: float, info: FieldValidationInfo) -> float:
+        if value <= 0:
+            raise ValueError(f"{info.field_name} должен быть > 0")
+        return value
+
+    @field_validator("reserve")
+    @classmethod
+    def validate_reserve(cls, value: float, info: FieldValidationInfo) -> float:
+        burst = info.data.get("burst")
+        if value < 0 or (burst is not None and value >= burst):
+            raise ValueError("reserve должен быть в [0, burst)")
+        return value
+
+    @field_validator("weights")
+    @classmethod
+    def validate_weights(
+        cls, weights: dict[str, float], info: FieldValidationInfo
+    ) -> dict[str, float]:
+        burst = info.data.get("burst")
+        for name, weight in weights.items():
+            if weight <= 0 or (burst is not None and weight > burst):
+                raise ValueError(f"вес {name} должен быть в (0, burst]")
+        return weights
+
+
+class HttpConfig(BaseModel):
+    # один aiohttp-коннектор на процесс: DataWS + оба ccxt-клиента
+    limit: int = 100  # всего соединений
+    limit_per_host: int = 20
+    dns_ttl: int = 300  # сек, кэш DNS
+    keepalive_timeout: float = 75.0  # сек простоя до закрытия keep-alive
+    # за сколько секунд до закрытия бара прогревать соединения; None — выкл.
+    prewarm_lead_sec: Optional[float] = 3.0
+    prewarm_path: str = "/v5/market/time"
+
+    @field_validator("limit", "limit_per_host", "dns_ttl")
+    @classmethod
+    def validate_positive(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+    @field_validator("keepalive_timeout", "prewarm_lead_sec")
+    @classmethod
+    def validate_seconds(
+        cls, value: Optional[float], info: FieldValidationInfo
+    ) -> Optional[float]:
+        if value is not None and value <= 0:
+            raise ValueError(f"{info.field_name} должен быть > 0")
+        return value
+
+
+class ProfileConfig(BaseModel):
+    # режим --profile (python src/main.py --profile deterministic|sampling)
+    output_dir: Path = BASE_DIR / "data" / "profile"
+    sample_interval_ms: float = 5.0  # период сэмплера стеков
+    tracemalloc_interval_sec: Optional[float] = 30.0  # None — без tracemalloc
+    tracemalloc_frames: int = 10
+    slow_callback_ms: float = 50.0  # порог asyncio debug для шагов задач
+    top: int = 40  # строк в секциях отчёта
+
+    @field_validator(
+        "sample_interval_ms", "tracemalloc_interval_sec", "slow_callback_ms"
+    )
+    @classmethod
+    def validate_positive(
+        cls, value: Optional[float], info: FieldValidationInfo
+    ) -> Optional[float]:
+        if value is not None and value <= 0:
+            raise ValueError(f"{info.field_name} должен быть > 0")
+        return value
+
+    @field_validator("tracemalloc_frames", "top")
+    @classmethod
+    def validate_count(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+
+class BusConfig(BaseModel):
+    # общая шина свечей в shared memory (/dev/shm): mode=ingest пишет,
+    # live с enabled=True читает вместо собственного DataWS.
+    # В docker контейнерам нужен общий IPC (ipc: host / shareable).
+    enabled: bool = False
+    name_prefix: str = "trader"
+    symbols: list[str] = []  # для ingest; пусто — только ws.symbol
+    capacity: int = 8640  # баров в кольце на символ (30 дней 5m)
+    poll_interval: float = 0.05  # сек, опрос кольца читателем
+
+    @field_validator("capacity")
+    @classmethod
+    def validate_capacity(cls, value: int) -> int:
+        if value < 2:
+            raise ValueError("capacity должен быть >= 2")
+        return value
+
+    @field_validator("poll_interval")
+    @classmethod
+    def validate_poll_interval(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("poll_interval должен быть > 0")
+        return value
+
+
+class SoakConfig(BaseModel):
+    # mode=soak: live-путь handle_kline на синтетике с бумажной биржей
+    bars: int = 2_000_000
+    seed: int = 0
+    start_balance: float = 1000.0
+    sample_every: int = 50_000  # баров между замерами RSS/объектов/латентности
+    warmup_bars: int = 100_000  # не учитываются в трендах
+    # провал, если RSS растёт быстрее (МБ на миллион баров) ...
+    max_rss_growth_mb_per_mbar: float = 16.0
+    # ... или медиана латентности бара в последнем окне выросла в N раз
+    max_latency_ratio: float = 2.0
+    order_poll_interval: float = 0.001  # опрос OrderManager в ускоренном времени
+    log_level: str = "WARNING"  # SIGNAL-логи на каждый бар глушим
+    report_path: Path = BASE_DIR / "data" / "soak_report.csv"
+
+    @field_validator("bars", "sample_every")
+    @classmethod
+    def validate_positive(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+    @field_validator("max_latency_ratio")
+    @classmethod
+    def validate_ratio(cls, value: float) -> float:
+        if value <= 1:
+            raise ValueError("max_latency_ratio должен быть > 1")
+        return value
+
+
+class ResultsConfig(BaseModel):
+    # колоночное хранилище прогонов replay/walk-forward (trade/results.py)
+    enabled: bool = False
+    dir: Path = BASE_DIR / "data" / "results"
+    run_name: Optional[str] = None  # по умолчанию <mode>_<symbol>_<tf>
+    start_balance: float = 1000.0  # бумажный счёт replay
+    chunk_rows: int = 65_536
+
+    @field_validator("chunk_rows")
+    @classmethod
+    def validate_chunk_rows(cls, chunk_rows: int) -> int:
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows должен быть >= 1")
+        return chunk_rows
+
+
+class TracingConfig(BaseModel):
+    # tick-to-trade трассы баров в live (trade/tracing.py)
+    enabled: bool = False
+    capacity: int = 4096  # трасс в кольце для перцентилей
+    budget_ms: float = 1000.0  # от границы бара; дольше — slow bar
+    summary_every: int = 12  # баров между строками p50/p99 в логе (0 — выкл.)
+    slow_path: Optional[Path] = BASE_DIR / "data" / "slow_bars.jsonl"
+
+    @field_validator("capacity")
+    @classmethod
+    def validate_capacity(cls, capacity: int) -> int:
+        if capacity < 1:
+            raise ValueError("capacity должен быть >= 1")
+        return capacity
+
+
+class FeatureStoreConfig(BaseModel):
+    # ряды индикаторов на диске для replay/batch/walk-forward (trade/feature_store.py)
+    enabled: bool = False
+    dir: Path = BASE_DIR / "data" / "features"
+    budget_mb: float = 2048.0  # сверх бюджета удаляются давно не нужные ряды
+
+    @field_validator("budget_mb")
+    @classmethod
+    def validate_budget(cls, budget_mb: float) -> float:
+        if budget_mb <= 0:
+            raise ValueError("budget_mb должен быть > 0")
+        return budget_mb
+
+
+class ShadowConfig(BaseModel):
+    # теневые варианты параметров на общем графе индикаторов (trade/shadow.py)
+    enabled: bool = False
+    # имя варианта -> переопределения полей ws; торгует только основной ws
+    variants: dict[str, dict[str, Any]] = {}
+    start_balance: float = 1000.0  # бумажный счёт каждого варианта
+    summary_every: int = 288  # баров между строками [SHADOW] в логе (0 — выкл.)
+
+    @field_validator("variants")
+    @classmethod
+    def validate_variants(
+        cls, variants: dict[str, dict[str, Any]]
+    ) -> dict[str, dict[str, Any]]:
+        for name, overrides in variants.items():
+            unknown = set(overrides) - set(WebsocketConfig.model_fields)
+            if unknown:
+                raise ValueError(
+                    f"неизвестные параметры в варианте {name}: {sorted(unknown)}"
+                )
+        return variants
+
+
+class SinkConfig(BaseModel):
+    # журнал SQLite (WAL) баров, сигналов, ордеров и баланса (trade/sink.py)
+    enabled: bool = False
+    path: Path = BASE_DIR / "data" / "journal.sqlite"
+    batch_rows: int = 5000  # строк в одной транзакции, не больше
+    flush_interval: float = 0.5  # с: сколько копить строки перед записью
+    # предел очереди: replay ждёт запись, live сверх него строки теряет
+    max_backlog: int = 100_000
+
+    @field_validator("batch_rows", "flush_interval")
+    @classmethod
+    def validate_positive(cls, value: float, info: FieldValidationInfo) -> float:
+        if value <= 0:
+            raise ValueError(f"{info.field_name} должен быть > 0")
+        return value
+
+    @field_validator("max_backlog")
+    @classmethod
+    def validate_max_backlog(cls, value: int, info: FieldValidationInfo) -> int:
+        batch_rows = info.data.get("batch_rows")
+        if batch_rows is not None and value < 4 * batch_rows:
+            raise ValueError("max_backlog должен быть >= 4 * batch_rows")
+        return value
+
+
+class BatchConfig(BaseModel):
+    # пакетный replay в пуле процессов (trade/batch.py)
+    symbols: list[str] = []  # пусто — все активные линейные USDT-перпетуалы
+    max_symbols: Optional[int] = None  # ограничение для пустого symbols
+    timeframes: list[Literal["1m", "3m", "5m", "15m", "1h"]] = ["5m"]
+    workers: Optional[int] = None  # None -> os.cpu_count()
+    worker_log_level: str = "CRITICAL"  # ошибки воркеров логирует родитель
+
+    # общий кэш истории: недостающие файлы один раз качаются по REST
+    cache_dir: Path = BASE_DIR / "data" / "history"
+    path_template: str = "{symbol}_{timeframe}.bin"
+    total_bars: int = 50_000  # баров на символ при первой загрузке
+    chunk_bars: int = 100_000
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    run_name: str = "batch"
+    report_path: Optional[Path] = None  # по умолчанию <run_dir>/report.csv
+
+    @field_validator("total_bars", "chunk_bars")
+    @classmethod
+    def validate_positive(cls, value: int, info: FieldValidationInfo) -> int:
+        if value < 1:
+            raise ValueError(f"{info.field_name} должен быть >= 1")
+        return value
+
+    @field_validator("path_template")
+    @classmethod
+    def validate_path_template(cls, template: str) -> str:
+        if not template.endswith(".bin"):
+            raise ValueError("кэш batch хранится в .bin (trade/history.py)")
+        return template
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=str(BASE_DIR / ".env"),
@@ -104,6 +572,21 @@ class Settings(BaseSettings):
 
     api: ApiConfig
     ws: WebsocketConfig
+    indicators: list[IndicatorSpec] = DEFAULT_INDICATORS
+    replay: ReplayConfig = ReplayConfig()
+    walkforward: WalkForwardConfig = WalkForwardConfig()
+    montecarlo: MonteCarloConfig = MonteCarloConfig()
+    ratelimit: RateLimitConfig = RateLimitConfig()
+    http: HttpConfig = HttpConfig()
+    profile: ProfileConfig = ProfileConfig()
+    bus: BusConfig = BusConfig()
+    soak: SoakConfig = SoakConfig()
+    results: ResultsConfig = ResultsConfig()
+    batch: BatchConfig = BatchConfig()
+    tracing: TracingConfig = TracingConfig()
+    shadow: ShadowConfig = ShadowConfig()
+    features: FeatureStoreConfig = FeatureStoreConfig()
+    sink: SinkConfig = SinkConfig()
 
 
 settings = Settings()
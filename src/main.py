@@ -1,21 +1,50 @@
+import argparse
 import asyncio
 import logging
 import os
 from datetime import datetime, timezone
-from typing import Optional
+from typing import AsyncIterator, Callable, Iterator, Optional
 
 import pandas as pd
 import ccxt.async_support as ccxt
-from ta.trend import EMAIndicator
-from ta.momentum import RSIIndicator
 
 from core.config import settings
+from trade.connections import HttpPool
 from trade.data_ws import DataWS
-from trade.indicators import Indicators
-from trade.strategy import StrategyState
+from trade.engine import Action, BarSignals, StrategyCore
 from trade.execution import Executor
-from trade.buffer import BarBuffer
-from trade.utils import normalize_kline, aggregate_ohlcv, to_ccxt_linear_symbol
+from trade.orders import OrderManager
+from trade.profiling import run_profiled
+from trade.ratelimit import Priority, rest_scheduler
+from trade.results import (
+    ReplayRecorder,
+    ResultsWriter,
+    new_run_dir,
+    replay_bars,
+    write_ledger,
+)
+from trade.soak import run_soak
+from trade.shadow import ShadowBook
+from trade.feature_store import FeatureSet, FeatureStore
+from trade.sink import SqliteSink
+from trade import tracing
+from trade.tracing import LatencyTracer
+from trade.history import OHLCVFileSource, write_binary
+from trade.batch import missing_history, run_batch_replay, usdt_perps
+from trade.marketbus import (
+    MarketBusReader,
+    MarketBusWriter,
+    record_to_kline,
+    segment_name,
+)
+from trade.utils import (
+    normalize_kline,
+    to_ccxt_linear_symbol,
+    read_ohlcv_file,
+    tf_to_ms,
+)
+from trade.walkforward import run_walkforward
+from trade.montecarlo import simulate
 
 LOG_LEVEL = os.getenv("APP_LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -37,7 +66,7 @@ class TradingApp:
         # Публичный REST только для REPLAY (история 5m) — всегда prod, чтобы была история
         self.public_rest = ccxt.bybit(
             {
-                "enableRateLimit": True,
+                "enableRateLimit": False,  # темп задаёт rest_scheduler
                 "options": {"defaultType": "linear"},  # ВАЖНО
                 "urls": {
                     "api": {
@@ -48,27 +77,42 @@ class TradingApp:
             }
         )
 
-        # Состояние/буферы
-        self.state = StrategyState()
-        self.base_tf_buffer = BarBuffer(
-            maxlen=settings.ws.base_buffer_maxlen,
+        # Решения: буфер, индикаторы, стратегия, трейлинги, cooldown (без I/O)
+        self.core = StrategyCore(
+            self.base_timeframe,
+            native_htf=settings.ws.native_htf_enabled and self.mode == "live",
+        )
+        # журнал SQLite: бары, сигналы, ордера, баланс (live и replay)
+        self.sink: Optional[SqliteSink] = None
+        if settings.sink.enabled and self.mode in ("live", "replay"):
+            cfg = settings.sink
+            self.sink = SqliteSink(
+                cfg.path,
+                self.symbol,
+                self.base_timeframe,
+                self.mode,
+                batch_rows=cfg.batch_rows,
+                flush_interval=cfg.flush_interval,
+                max_backlog=cfg.max_backlog,
+            )
+        # PostOnly-входы сопровождаются в фоне (статус, cancel/replace)
+        self.order_manager = OrderManager(
+            self.executor, on_fill=self.core.on_entry_filled, sink=self.sink
         )
         self.ws_client: Optional[DataWS] = None
-
-    @staticmethod
-    def _tf_ms(timeframe: str) -> int:
-        tf = timeframe.lower()
-        if tf == "1m":
-            return 60_000
-        if tf == "3m":
-            return 180_000
-        if tf == "5m":
-            return 300_000
-        if tf == "15m":
-            return 900_000
-        if tf == "1h":
-            return 3_600_000
-        raise ValueError(f"Unsupported timeframe: {timeframe}")
+        # tick-to-trade трассы баров (только live)
+        self.tracer: Optional[LatencyTracer] = None
+        if settings.tracing.enabled and self.mode == "live":
+            cfg = settings.tracing
+            self.tracer = LatencyTracer(
+                tf_to_ms(self.base_timeframe),
+                capacity=cfg.capacity,
+                budget_ms=cfg.budget_ms,
+                summary_every=cfg.summary_every,
+                slow_path=cfg.slow_path,
+            )
+        # один keep-alive коннектор на DataWS и оба ccxt-клиента
+        self.http = HttpPool(settings.http)
 
     @staticmethod
     def latest_num(df: Optional[pd.DataFrame], col: str) -> Optional[float]:
@@ -77,26 +121,17 @@ class TradingApp:
         s = pd.to_numeric(df[col], errors="coerce").dropna()
         return float(s.iloc[-1]) if not s.empty else None
 
-    async def fetch_df_bars(self, timeframe: str, total_bars: int) -> pd.DataFrame:
+    async def fetch_df_bars(
+        self, timeframe: str, total_bars: int, symbol: Optional[str] = None
+    ) -> pd.DataFrame:
         """
         Вытягивает total_bars OHLCV с прод-паблика порциями по 1000,
         начиная с (now - horizon) и двигаясь ВПЕРЁД по времени.
         """
 
-        ccxt_symbol = to_ccxt_linear_symbol(self.symbol)
+        ccxt_symbol = to_ccxt_linear_symbol(symbol or self.symbol)
 
-        # размер бара в мс
-        def tf_ms(tf: str) -> int:
-            tf = tf.lower()
-            return {
-                "1m": 60_000,
-                "3m": 180_000,
-                "5m": 300_000,
-                "15m": 900_000,
-                "1h": 3_600_000,
-            }[tf]
-
-        ms_per_bar = tf_ms(timeframe)
+        ms_per_bar = tf_to_ms(timeframe)
         now_ms = self.public_rest.milliseconds()
 
         # Горизонт + запас на прогрев индикаторов (ещё 10%)
@@ -108,7 +143,10 @@ class TradingApp:
 
         while len(result) < total_bars:
             limit = min(1000, total_bars - len(result))
-            ohlcv = await self.public_rest.fetch_ohlcv(
+            ohlcv = await rest_scheduler.call(
+                Priority.HISTORY,
+                "fetch_ohlcv",
+                self.public_rest.fetch_ohlcv,
                 ccxt_symbol,
                 timeframe,
                 since=since,
@@ -150,181 +188,211 @@ class TradingApp:
 
         return df
 
-    async def handle_kline(self, raw_kline: dict) -> None:
-        kline = normalize_kline(raw_kline)
-        bar_time = datetime.fromtimestamp(kline["start_at"] / 1000, timezone.utc)
-        price = float(kline["close"])
-
-        # 1) обновляем буфер базового ТФ и считаем EMA60/163 на истории
-        self.base_tf_buffer.add(kline)
-        df_base = self.base_tf_buffer.to_df()
-        if df_base.empty:
-            return
-        if len(df_base) % 500 == 0:
-            logger.info("Replay progress: %d bars processed", len(df_base))
-
-        ema60_5 = Indicators.ema(df_base["c"], window=60)
-        ema163_5 = Indicators.ema(df_base["c"], window=163)
-        if ema60_5 is None or ema163_5 is None:
-            logger.debug("Warmup EMA in progress; skip bar")
-            return
-
-        # 2) HTF: агрегируем из 5m (универсально для live/replay)
-        df_1h = aggregate_ohlcv(df_base, "1h")
-        df_1d = aggregate_ohlcv(df_base, "1d")
-
-        # индикаторы HTF
-        if df_1h is None or df_1h.empty or len(df_1h) < 60:
-            ema1h = None
-        else:
-            _ema = EMAIndicator(
-                close=df_1h["c"],
-                window=60,
-                fillna=False,
-            ).ema_indicator()
-            _ema = _ema.dropna()
-            ema1h = float(_ema.iloc[-1]) if not _ema.empty else None
-
-        # RSI14@1d
-        if df_1d is None or df_1d.empty or len(df_1d) < 14:
-            rsi1d = None
-        else:
-            _rsi = RSIIndicator(
-                close=df_1d["c"],
-                window=14,
-                fillna=False,
-            ).rsi()
-            _rsi = _rsi.dropna()
-            rsi1d = float(_rsi.iloc[-1]) if not _rsi.empty else None
-
-        if ema1h is None or rsi1d is None:
-            logger.debug("Warmup HTF (agg) in progress; skip bar")
+    async def handle_kline(self, raw_kline: dict, backfill: bool = False) -> None:
+        """
+        Асинхронная оболочка над StrategyCore: решения принимает ядро,
+        здесь только I/O (баланс, ордера, закрытия, lock-файл).
+        backfill=True — бар догружен по REST после разрыва: обновляет буфер
+        и состояние стратегии, но торговых действий по нему нет.
+        """
+        try:
+            await self._trade_bar(normalize_kline(raw_kline), backfill)
+        finally:
+            # теневые варианты — после исполнения, вне пути tick-to-trade
+            self.core.step_shadows()
+
+    async def _trade_bar(self, kline: dict, backfill: bool) -> None:
+        tracing.mark("handler_start")
+        signals = self.core.on_bar(kline)
+        if self.sink is not None:
+            self.sink.bar(kline)
+            if signals is not None:
+                self.sink.signal(signals)
+        if signals is None or backfill:
             return
 
-        # ATR@1h
-        atr_1h = Indicators.atr(df_1h)
-        if atr_1h is not None and atr_1h <= 1e-9:
-            atr_1h = None
-        min_atr = settings.ws.min_atr_1h
-        if min_atr is not None and (atr_1h is None or atr_1h < min_atr):
-            logger.info(
-                "[SKIP] ATR too low (%s < %s) — skipping trade",
-                atr_1h,
-                min_atr,
-            )
+        # Торговые действия / баланс — только в LIVE (никаких приватных вызовов в REPLAY)
+        if self.mode != "live":
+            actions = self.core.decide(signals, None)
+            self._log_dry_run(actions)
+            self._journal_intents(actions, signals.ts)
             return
 
-        # 3) StrategyState — компактные df
-        df_for_strategy_5 = pd.DataFrame(
-            [
-                {
-                    "c": float(df_base["c"].iat[-1]),
-                    "ema60_5": ema60_5,
-                    "ema163_5": ema163_5,
-                }
-            ]
-        )
-        df_for_strategy_1h = pd.DataFrame([{"ema60": ema1h}])
-        df_for_strategy_1d = pd.DataFrame([{"rsi": rsi1d}])
-
-        long_signal, short_signal = self.state.on_new_bar(
-            {"start_at": kline["start_at"], "close": kline["close"]},
-            df_for_strategy_5,
-            df_for_strategy_1h,
-            df_for_strategy_1d,
+        self.order_manager.on_bar(signals.price)
+        bal = await rest_scheduler.call(
+            Priority.ACCOUNT,
+            "fetch_balance",
+            self.executor.exchange.fetch_balance,
         )
-
-        logger.info(
-            "[SIGNAL] Long=%s | Short=%s | price=%.6f | ema1h=%.6f | rsi=%.2f",
-            long_signal,
-            short_signal,
-            price,
-            ema1h,
-            rsi1d,
-        )
-
-        # 4) Торговые действия / баланс — только в LIVE (никаких приватных вызовов в REPLAY)
-        if self.mode == "live":
-            bal = await self.executor.exchange.fetch_balance()
-            usdt_total = (bal.get("total") or {}).get("USDT")
-            if usdt_total is None:
-                logger.warning("No USDT balance info, skip bar")
-                return
-            balance = float(usdt_total)
-
-            if self.executor.start_balance == 0.0:
-                self.executor.start_balance = balance
-                logger.info(
-                    "[BALANCE] Start balance: %.4f USDT",
-                    balance,
-                )
-
-            drawdown_limit = self.executor.start_balance * (
-                1 - settings.ws.balance_drawdown_limit_pct
-            )
-            if balance < drawdown_limit:
-                if not self.executor.is_stopped_due_to_drawdown:
-                    logger.critical(
-                        "[STOP] Balance drawdown! %.4f < %.4f",
-                        balance,
-                        drawdown_limit,
+        tracing.mark("balance_ready")
+        usdt_total = (bal.get("total") or {}).get("USDT")
+        if usdt_total is None:
+            logger.warning("No USDT balance info, skip bar")
+            return
+        if self.sink is not None:
+            self.sink.balance(float(usdt_total))
+        await self.execute(self.core.decide(signals, float(usdt_total)))
+
+    async def execute(self, actions: list[Action]) -> None:
+        for action in actions:
+            if action.kind == "enter":
+                self.order_manager.submit(action.side, action.price, action.balance)
+            elif action.kind == "exit":
+                if self.sink is not None:
+                    self.sink.order(
+                        action.side,
+                        "exit",
+                        action.price,
+                        status="sent",
+                        reason=action.reason,
                     )
-                    self.executor.is_stopped_due_to_drawdown = True
-                    lock_path = os.getenv("LOCK_PATH", "stopped_due_to_drawdown.lock")
-                    with open(lock_path, "w") as f:
-                        f.write(
-                            f"Stopped at {datetime.now(timezone.utc).isoformat()}\n"
-                        )
-                        f.write(f"Balance: {balance:.4f} USDT\n")
-                        f.write(f"Drawdown limit: {drawdown_limit:.4f} USDT\n")
-                return
-
-            if (
-                self.executor.is_stopped_due_to_drawdown
-                and balance >= self.executor.start_balance
-            ):
+                await self.executor.close_position(action.side, action.price)
+            elif action.kind == "pause":
+                logger.critical(
+                    "[STOP] Balance drawdown! %.4f < %.4f",
+                    action.balance,
+                    action.limit,
+                )
+                lock_path = os.getenv("LOCK_PATH", "stopped_due_to_drawdown.lock")
+                with open(lock_path, "w") as f:
+                    f.write(f"Stopped at {datetime.now(timezone.utc).isoformat()}\n")
+                    f.write(f"Balance: {action.balance:.4f} USDT\n")
+                    f.write(f"Drawdown limit: {action.limit:.4f} USDT\n")
+            elif action.kind == "resume":
                 logger.info("[RESUME] Balance recovered. Resuming trading.")
-                self.executor.is_stopped_due_to_drawdown = False
                 try:
                     os.remove(os.getenv("LOCK_PATH", "stopped_due_to_drawdown.lock"))
                     logger.info("[FILE] Lock file removed")
                 except FileNotFoundError:
                     pass
 
-            if self.executor.cooldown_bars > 0:
-                self.executor.cooldown_bars -= 1
+    @staticmethod
+    def _log_dry_run(actions: list[Action]) -> None:
+        # REPLAY: только логируем намерения, никаких приватных запросов
+        for action in actions:
+            if action.kind == "enter":
                 logger.info(
-                    "[PAUSE] Cooldown active (%d bars left)",
-                    self.executor.cooldown_bars,
-                )
-                return
-
-            if long_signal:
-                await self.executor.order(
-                    "long",
-                    price,
-                    balance,
+                    "[DRY-RUN] Would place %s at %.6f", action.side, action.price
                 )
-            if short_signal:
-                await self.executor.order(
-                    "short",
-                    price,
-                    balance,
-                )
-            await self.executor.check_trailing_stops(price)
-        else:
-            # REPLAY: только логируем намерения, никаких приватных запросов
-            if long_signal or short_signal:
+            elif action.kind == "exit":
                 logger.info(
-                    "[DRY-RUN] Would place %s at %.6f",
-                    "long" if long_signal else "short",
-                    price,
+                    "[DRY-RUN] Would close %s at %.6f (%s)",
+                    action.side,
+                    action.price,
+                    action.reason,
+                )
+
+    def _journal_intents(
+        self, actions: list[Action], ts: int, status: str = "dry_run"
+    ) -> None:
+        """Входы/выходы без биржи (replay) — в журнал с ts бара."""
+        if self.sink is None:
+            return
+        for action in actions:
+            if action.kind in ("enter", "exit"):
+                self.sink.order(
+                    action.side,
+                    action.kind,
+                    action.price,
+                    status=status,
+                    reason=action.reason,
+                    ts=ts,
                 )
-            await self.executor.check_trailing_stops(price)
+
+    async def _open_http(self) -> None:
+        await self.http.open()
+        self.http.attach(self.executor.exchange)
+        self.http.attach(self.public_rest)
+
+    async def _consume_bus(self) -> None:
+        """Источник live из shared memory вместо собственного DataWS."""
+        name = segment_name(settings.bus.name_prefix, self.symbol, self.base_timeframe)
+        reader = MarketBusReader(name)
+        logger.info("[BUS] Attached to %s (seq=%d)", name, reader.write_seq)
+        try:
+            # всё, что уже в кольце, — прогрев без торговых действий
+            for rec in reader.read():
+                await self.handle_kline(record_to_kline(rec), backfill=True)
+            while True:
+                await asyncio.sleep(settings.bus.poll_interval)
+                for rec in reader.read():
+                    kline = record_to_kline(rec)
+                    with tracing.bar_scope(
+                        self.tracer, int(kline["start_at"]), tracing.now_ms()
+                    ):
+                        await self.handle_kline(kline)
+        finally:
+            reader.close()
+
+    async def _seed_native_htf(self) -> None:
+        """
+        Прогрев по REST для native_htf: свечи старших ТФ (последняя —
+        формирующаяся) и закрытые базовые бары на глубину прогрева.
+        """
+        symbol = to_ccxt_linear_symbol(self.symbol)
+        graph = self.core.indicators
+        for tf in (*self.core.native_htf, self.base_timeframe):
+            rows = await rest_scheduler.call(
+                Priority.HISTORY,
+                "fetch_ohlcv",
+                self.public_rest.fetch_ohlcv,
+                symbol,
+                tf,
+                limit=graph.warmup_bars(tf),
+            )
+            candles = [
+                {
+                    "start_at": int(row[0]),
+                    "open": float(row[1]),
+                    "high": float(row[2]),
+                    "low": float(row[3]),
+                    "close": float(row[4]),
+                    "volume": float(row[5] or 0.0),
+                }
+                for row in rows
+            ]
+            if tf != self.base_timeframe:
+                for candle in candles:
+                    self.core.on_htf_candle(tf, candle)
+            else:
+                now = self.public_rest.milliseconds()
+                tf_ms = tf_to_ms(tf)
+                for candle in candles:
+                    if candle["start_at"] + tf_ms <= now:
+                        await self.handle_kline(candle, backfill=True)
+            logger.info("[HTF] Seeded %d %s bar(s) via REST", len(candles), tf)
 
     async def run_live(self) -> None:
-        self.ws_client = DataWS(self.handle_kline)
-        task = asyncio.create_task(self.ws_client.start())
+        await self._open_http()
+        self._attach_shadows()
+        if self.sink is not None:
+            await self.sink.start()
+        if self.core.native_htf:
+            if settings.bus.enabled:
+                raise RuntimeError(
+                    "ws.native_htf_enabled needs its own WS feed (bus.enabled=false)"
+                )
+            await self._seed_native_htf()
+        if settings.bus.enabled:
+            task = asyncio.create_task(self._consume_bus())
+        else:
+            self.ws_client = DataWS(
+                self.handle_kline,
+                rest=self.public_rest,
+                last_ts=lambda: self.core.buffer.last_ts,
+                session=self.http.session,
+                book=self.executor.book,
+                early_close=settings.ws.early_close_enabled,
+                htf=self.core.native_htf,
+                htf_handler=self.core.on_htf_candle,
+                tracer=self.tracer,
+            )
+            task = asyncio.create_task(self.ws_client.start())
+        self.http.start_prewarm(
+            {self.executor.api_url, self.public_rest.urls["api"]["public"]},
+            tf_to_ms(self.base_timeframe),
+        )
+        self.order_manager.start()
         try:
             await task
         except asyncio.CancelledError:
@@ -332,46 +400,434 @@ class TradingApp:
         finally:
             if self.ws_client:
                 await self.ws_client.stop()
+            await self.order_manager.stop()
+            if self.tracer is not None:
+                self.tracer.log_summary()
+            self._close_shadows()
+            if self.sink is not None:
+                await self.sink.stop()
+            rest_scheduler.log_summary()
+            await rest_scheduler.close()
             await self.executor.close()
             await self.public_rest.close()
+            await self.http.close()
             logger.info("Live stopped")
 
+    async def run_ingest(self) -> None:
+        """
+        Единственный процесс с WS-подключениями: подтверждённые свечи по всем
+        bus.symbols пишутся в кольца shared memory для стратегий на хосте.
+        """
+        cfg = settings.bus
+        symbols = [s.upper() for s in (cfg.symbols or [self.symbol])]
+        tf_ms = tf_to_ms(self.base_timeframe)
+        await self._open_http()
+
+        writers: dict[str, MarketBusWriter] = {}
+        clients: list[DataWS] = []
+        try:
+            for symbol in symbols:
+                writer = MarketBusWriter(
+                    segment_name(cfg.name_prefix, symbol, self.base_timeframe),
+                    cfg.capacity,
+                    tf_ms,
+                )
+                writers[symbol] = writer
+
+                async def publish(candle: dict, backfill: bool = False, w=writer):
+                    w.publish(candle)
+
+                clients.append(
+                    DataWS(
+                        publish,
+                        rest=self.public_rest,
+                        last_ts=lambda w=writer: w.last_ts,
+                        session=self.http.session,
+                        symbol=symbol,
+                    )
+                )
+            logger.info("[BUS] Ingesting %s %s", ",".join(symbols), self.base_timeframe)
+            await asyncio.gather(*(client.start() for client in clients))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for client in clients:
+                await client.stop()
+            for writer in writers.values():
+                writer.close()
+                writer.unlink()
+            await self.executor.close()
+            await self.public_rest.close()
+            await self.http.close()
+            logger.info("Ingest stopped")
+
+    async def _replay_source(self) -> Callable[[], Iterator[pd.DataFrame]]:
+        """
+        Источник replay: локальные файлы кусками или последние бары по REST.
+        Каждый вызов результата заново отдаёт куски по порядку.
+        """
+        cfg = settings.replay
+        if cfg.source == "file":
+            source = OHLCVFileSource(cfg.data_dir, cfg.path_template, cfg.chunk_bars)
+            logger.info(
+                "Replay source: %s [%s .. %s)",
+                source.path_for(self.symbol, self.base_timeframe),
+                cfg.start,
+                cfg.end,
+            )
+            return lambda: source.iter_chunks(
+                self.symbol, self.base_timeframe, cfg.start, cfg.end
+            )
+
+        df_base = await self.fetch_df_bars(
+            self.base_timeframe,
+            total_bars=cfg.total_bars,
+        )
+        chunks = [] if df_base.empty else [df_base[["ts", "o", "h", "l", "c", "v"]]]
+        return lambda: iter(chunks)
+
+    async def _replay_feed(
+        self,
+    ) -> AsyncIterator[tuple[pd.DataFrame, Optional[Iterator[dict]]]]:
+        """
+        Куски replay; с settings.features — и готовые значения индикаторов
+        по барам из FeatureStore (граф ядра тогда не считается). История
+        читается кусками и на хэш/расчёт рядов, и на сам прогон.
+        """
+        chunks = await self._replay_source()
+        features: Optional[FeatureSet] = None
+        if settings.features.enabled:
+            try:
+                features = FeatureStore.from_config(settings.features).load_chunks(
+                    self.symbol, self.base_timeframe, chunks, self.core.specs
+                )
+            except ValueError as e:
+                logger.warning("Feature store skipped, indicators via graph: %s", e)
+        offset = 0
+        for chunk in chunks():
+            rows = (
+                features.rows(offset, offset + len(chunk))
+                if features is not None
+                else None
+            )
+            offset += len(chunk)
+            yield chunk, rows
+
+    def _results_writer(self) -> ResultsWriter:
+        cfg = settings.results
+        name = cfg.run_name or f"{self.mode}_{self.symbol}_{self.base_timeframe}"
+        return ResultsWriter(
+            new_run_dir(cfg.dir, name),
+            meta={
+                "mode": self.mode,
+                "symbol": self.symbol,
+                "timeframe": self.base_timeframe,
+                "tf_ms": tf_to_ms(self.base_timeframe),
+                "start_balance": cfg.start_balance,
+                "params": settings.ws.model_dump(mode="json"),
+            },
+            chunk_rows=cfg.chunk_rows,
+        )
+
+    def _attach_shadows(self) -> None:
+        """Теневые варианты settings.shadow на графе ядра, каждый — свой прогон."""
+        cfg = settings.shadow
+        if not cfg.enabled or not cfg.variants:
+            return
+        variants = {
+            name: settings.ws.model_copy(update=overrides)
+            for name, overrides in cfg.variants.items()
+        }
+        prefix = f"{self.mode}_{self.symbol}_{self.base_timeframe}"
+        writers = {
+            name: ResultsWriter(
+                new_run_dir(settings.results.dir, f"{prefix}_shadow_{name}"),
+                meta={
+                    "mode": self.mode,
+                    "shadow": name,
+                    "symbol": self.symbol,
+                    "timeframe": self.base_timeframe,
+                    "tf_ms": tf_to_ms(self.base_timeframe),
+                    "start_balance": cfg.start_balance,
+                    "params": params.model_dump(mode="json"),
+                },
+                chunk_rows=settings.results.chunk_rows,
+            )
+            for name, params in variants.items()
+        }
+        self.core.shadows = ShadowBook(
+            variants,
+            start_balance=cfg.start_balance,
+            writers=writers,
+            max_consecutive_losses=self.core.max_consecutive_losses,
+            cooldown_bars_after_losses=self.core.cooldown_bars_after_losses,
+            summary_every=cfg.summary_every,
+        )
+        logger.info("Shadow variants: %s", ", ".join(variants))
+
+    def _close_shadows(self) -> None:
+        if self.core.shadows is not None:
+            self.core.shadows.close()
+            self.core.shadows = None
+
     async def run_replay(self) -> None:
         logger.info(
             "Starting replay mode (TF=%s)",
             self.base_timeframe,
         )
+        writer: Optional[ResultsWriter] = None
         try:
-            df_base = await self.fetch_df_bars(
+            await self._open_http()
+            core = self.core
+            self._attach_shadows()
+            sink = self.sink
+            if sink is not None:
+                await sink.start()
+
+            def on_fill(side: str, price: float) -> None:
+                core.on_entry_filled(side, price)
+                if sink is not None:
+                    sink.fill(side, price, ts=core.buffer.last_ts)
+
+            recorder: Optional[ReplayRecorder] = None
+            if settings.results.enabled:
+                # бумажный счёт: входы по close, баланс для просадки/cooldown
+                writer = self._results_writer()
+                recorder = ReplayRecorder(
+                    writer,
+                    on_fill=on_fill,
+                    start_balance=settings.results.start_balance,
+                    order_percent=settings.ws.order_percent,
+                    max_order_cost=settings.ws.max_order_cost_usdt,
+                )
+
+            def journal(
+                kline: dict, signals: Optional[BarSignals], actions: list[Action]
+            ) -> None:
+                bar_ts = kline["start_at"]
+                if sink is not None:
+                    sink.bar(kline)
+                    if signals is not None:
+                        sink.signal(signals)
+                self._log_dry_run(actions)
+                if recorder is None:
+                    self._journal_intents(actions, bar_ts)
+                elif actions:
+                    self._journal_intents(actions, bar_ts, "paper")
+                    if sink is not None:
+                        sink.balance(recorder.balance, ts=bar_ts)
+
+            # с журналом бары идут порциями: очередь не обгоняет запись
+            step = max(sink.batch_rows // 4, 1) if sink is not None else None
+            processed = 0
+            async for chunk, rows in self._replay_feed():
+                parts = (
+                    (chunk,)
+                    if step is None
+                    else (
+                        chunk.iloc[lo : lo + step] for lo in range(0, len(chunk), step)
+                    )
+                )
+                for part in parts:
+                    processed += replay_bars(core, recorder, (part,), rows, journal)
+                    if sink is not None:
+                        # обратное давление: ждём запись накопленного
+                        await sink.drain()
+                logger.info("Replay progress: %d bars processed", processed)
+                await asyncio.sleep(0)
+            logger.info(
+                "Replay dataset: %d bars %s",
+                processed,
                 self.base_timeframe,
-                total_bars=5000,
             )
+        finally:
+            if writer is not None:
+                writer.close()
+            self._close_shadows()
+            if self.sink is not None:
+                await self.sink.stop()
+            rest_scheduler.log_summary()
+            await rest_scheduler.close()
+            await self.executor.close()
+            await self.public_rest.close()
+            await self.http.close()
+            logger.info("Replay finished")
+
+    async def run_walkforward(self) -> None:
+        cfg = settings.walkforward
+        logger.info(
+            "Starting walk-forward mode (TF=%s, IS=%d, OOS=%d bars)",
+            self.base_timeframe,
+            cfg.in_sample_bars,
+            cfg.out_sample_bars,
+        )
+        try:
+            if cfg.history_path is None:
+                logger.error("Walk-forward: APP__WALKFORWARD__HISTORY_PATH is not set")
+                return
+            df_base = read_ohlcv_file(cfg.history_path)
             logger.info(
-                "Replay dataset: %d bars %s",
+                "Walk-forward dataset: %d bars %s",
                 len(df_base),
                 self.base_timeframe,
             )
-            if df_base.empty:
+            df_sub = None
+            if cfg.sub_bars_path is not None:
+                df_sub = read_ohlcv_file(cfg.sub_bars_path)
+                logger.info(
+                    "Walk-forward intrabar exits: %d sub-bars, path=%s",
+                    len(df_sub),
+                    cfg.intrabar_path,
+                )
+            report = await asyncio.to_thread(
+                run_walkforward,
+                df_base,
+                settings.ws,
+                cfg,
+                df_sub,
+                tf_to_ms(self.base_timeframe),
+                (
+                    FeatureStore.from_config(settings.features)
+                    if settings.features.enabled
+                    else None
+                ),
+                self.symbol,
+                self.base_timeframe,
+            )
+            for key, value in report.summary.items():
+                logger.info("[WF] %s = %s", key, value)
+            if settings.results.enabled and not report.folds.empty:
+                # сделки всех OOS-окон подряд; equity — реализованная
+                ts = df_base["ts"].to_numpy()
+                with self._results_writer() as writer:
+                    writer.meta["start_balance"] = cfg.start_balance
+                    write_ledger(
+                        writer,
+                        report.trades,
+                        ts[ts >= report.folds["oos_start_ts"].min()],
+                        cfg.start_balance,
+                    )
+        finally:
+            await self.executor.close()
+            await self.public_rest.close()
+            logger.info("Walk-forward finished")
+
+    async def run_montecarlo(self) -> None:
+        cfg = settings.montecarlo
+        logger.info(
+            "Starting Monte Carlo mode (%d paths, method=%s)",
+            cfg.paths,
+            cfg.method,
+        )
+        try:
+            if cfg.ledger_path is None:
+                logger.error("Monte Carlo: APP__MONTECARLO__LEDGER_PATH is not set")
                 return
+            path = str(cfg.ledger_path)
+            ledger = (
+                pd.read_parquet(path)
+                if path.endswith(".parquet")
+                else pd.read_csv(path)
+            )
+            logger.info("Monte Carlo ledger: %d trades", len(ledger))
+            result = await asyncio.to_thread(
+                simulate,
+                ledger,
+                n_paths=cfg.paths,
+                method=cfg.method,
+                bar_ms=tf_to_ms(self.base_timeframe),
+                block_size=cfg.block_size,
+                seed=cfg.seed,
+            )
+            summary = result.summary()
+            for key, value in summary.items():
+                logger.info("[MC] %s = %.6f", key, value)
+            cfg.report_path.parent.mkdir(parents=True, exist_ok=True)
+            pd.DataFrame([summary]).to_csv(cfg.report_path, index=False)
+            logger.info("Monte Carlo report written to %s", cfg.report_path)
+        finally:
+            await self.executor.close()
+            await self.public_rest.close()
+            logger.info("Monte Carlo finished")
 
-            cols = ["ts", "o", "h", "l", "c", "v"]
-
-            for i, (ts, o, h, l, c, v) in enumerate(
-                df_base[cols].itertuples(index=False, name=None),
-                start=1,
-            ):
-                k = {"ts": ts, "o": o, "h": h, "l": l, "c": c, "v": v}
-                await self.handle_kline(k)
-                if i % 500 == 0:
-                    logger.info(
-                        "Replay progress: %d/%d bars processed",
-                        i,
-                        len(df_base),
-                    )
+    async def run_soak(self) -> bool:
+        """Soak-тест live-пути на синтетике; False — обнаружен дрейф."""
+        try:
+            return await run_soak(self, settings.soak)
+        finally:
+            await self.executor.close()
+            logger.info("Soak finished")
+
+    async def _fill_history_cache(self, symbols: list[str]) -> list[str]:
+        """Докачивает в кэш batch недостающие пары; возвращает символы с историей."""
+        cfg = settings.batch
+        missing = missing_history(symbols, cfg)
+        logger.info(
+            "Batch cache: %d/%d files to download into %s",
+            len(missing),
+            len(symbols) * len(cfg.timeframes),
+            cfg.cache_dir,
+        )
+        if not missing:
+            return symbols
+        cfg.cache_dir.mkdir(parents=True, exist_ok=True)
+        # рынки один раз, а не в каждом fetch_ohlcv параллельных загрузок
+        await rest_scheduler.call(
+            Priority.HISTORY, "load_markets", self.public_rest.load_markets
+        )
+
+        async def download(symbol: str, timeframe: str, path) -> bool:
+            try:
+                df = await self.fetch_df_bars(timeframe, cfg.total_bars, symbol)
+            except Exception as e:
+                logger.error("Batch cache: %s %s failed: %s", symbol, timeframe, e)
+                return False
+            if df.empty:
+                return False
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.unlink(missing_ok=True)
+            write_binary(df, tmp)
+            os.replace(tmp, path)
+            return True
+
+        # темп запросов держит rest_scheduler (HISTORY)
+        ok = await asyncio.gather(*(download(*item) for item in missing))
+        failed = {symbol for (symbol, _, _), done in zip(missing, ok) if not done}
+        if failed:
+            logger.warning("Batch cache: no history for %s", sorted(failed))
+        return [symbol for symbol in symbols if symbol not in failed]
+
+    async def run_batch(self) -> None:
+        cfg = settings.batch
+        logger.info("Starting batch replay mode (TF=%s)", ",".join(cfg.timeframes))
+        try:
+            await self._open_http()
+            symbols = [s.upper() for s in cfg.symbols]
+            if not symbols:
+                markets = await rest_scheduler.call(
+                    Priority.HISTORY,
+                    "load_markets",
+                    self.public_rest.load_markets,
+                )
+                symbols = usdt_perps(list(markets.values()), cfg.max_symbols)
+            symbols = await self._fill_history_cache(symbols)
+            report = await asyncio.to_thread(
+                run_batch_replay,
+                symbols,
+                cfg,
+                settings.ws,
+                settings.results,
+                settings.features if settings.features.enabled else None,
+            )
+            with pd.option_context("display.width", 200):
+                logger.info("[BATCH] top runs:\n%s", report.head(10).to_string())
         finally:
+            rest_scheduler.log_summary()
+            await rest_scheduler.close()
             await self.executor.close()
             await self.public_rest.close()
-            logger.info("Replay finished")
+            await self.http.close()
+            logger.info("Batch replay finished")
 
     async def run(self) -> None:
         logger.info(
@@ -382,9 +838,48 @@ class TradingApp:
         )
         if self.mode == "live":
             await self.run_live()
+        elif self.mode == "walkforward":
+            await self.run_walkforward()
+        elif self.mode == "montecarlo":
+            await self.run_montecarlo()
+        elif self.mode == "ingest":
+            await self.run_ingest()
+        elif self.mode == "batch":
+            await self.run_batch()
+        elif self.mode == "soak":
+            if not await self.run_soak():
+                raise SystemExit(1)
         else:
             await self.run_replay()
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bybit EMA/RSI trader")
+    parser.add_argument(
+        "--profile",
+        choices=["deterministic", "sampling"],
+        help="run the configured mode under a profiler (see settings.profile)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="stop the run after N seconds (for profiling live sessions)",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    app = TradingApp()
+    if args.profile:
+        await run_profiled(app, args.profile, settings.profile, args.duration)
+        return
+    try:
+        await asyncio.wait_for(app.run(), timeout=args.duration)
+    except asyncio.TimeoutError:
+        logger.info("Time limit of %.0fs reached", args.duration)
+
+
 if __name__ == "__main__":
-    asyncio.run(TradingApp().run())
+    asyncio.run(main())
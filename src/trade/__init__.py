@@ -2,6 +2,8 @@ __all__ = (
     "DataWS",
     "Indicators",
     "StrategyState",
+    "BatchStrategyState",
+    "StrategyCore",
     "Executor",
 )
 
@@ -9,4 +11,5 @@ __all__ = (
 from .data_ws import DataWS
 from .indicators import Indicators
 from .execution import Executor
-from .strategy import StrategyState
+from .strategy import StrategyState, BatchStrategyState
+from .engine import StrategyCore
@@ -0,0 +1,137 @@
+"""
+Векторные метрики по прогонам из колоночного хранилища (trade/results.py).
+
+Всё считается numpy по memmap-колонкам без циклов по строкам:
+  equity — доходность, Sharpe (годовой, 24/7 по таймфрейму прогона),
+           максимальная просадка, время в рынке и средняя экспозиция;
+  exits  — число сделок, hit rate, profit factor, средние выигрыш/проигрыш,
+           длительность сделки в барах и те же цифры по причинам выхода.
+
+Сравнение прогонов из src/:
+  python -m trade.analytics ../data/results/replay_LTCUSDT_5m_* [--reasons]
+"""
+
+import argparse
+from pathlib import Path
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+from trade.results import EXIT_REASONS, RunResults, open_run
+
+YEAR_MS = 365 * 86_400_000
+
+
+def equity_stats(equity: dict[str, np.ndarray], tf_ms: int) -> dict[str, float]:
+    eq = np.asarray(equity["equity"], dtype=float)
+    if len(eq) < 2 or eq[0] <= 0:
+        return {"bars": float(len(eq))}
+    returns = np.diff(eq) / eq[:-1]
+    std = returns.std()
+    sharpe = float(returns.mean() / std * np.sqrt(YEAR_MS / tf_ms)) if std > 0 else 0.0
+    downside = returns[returns < 0]
+    down_std = np.sqrt(np.mean(downside**2)) if len(downside) else 0.0
+    sortino = (
+        float(returns.mean() / down_std * np.sqrt(YEAR_MS / tf_ms))
+        if down_std > 0
+        else 0.0
+    )
+    peak = np.maximum.accumulate(eq)
+    exposure = np.asarray(equity["exposure"], dtype=float)
+    return {
+        "bars": float(len(eq)),
+        "total_return": float(eq[-1] / eq[0] - 1),
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "max_drawdown": float(np.max(1 - eq / peak)),
+        "time_in_market": float(np.mean(exposure > 0)),
+        "mean_exposure": float(exposure.mean()),
+        "max_exposure": float(exposure.max()),
+    }
+
+
+def trade_stats(exits: dict[str, np.ndarray], tf_ms: int) -> dict[str, float]:
+    pnl = np.asarray(exits["pnl"], dtype=float)
+    if not len(pnl):
+        return {"trades": 0.0}
+    wins = pnl > 0
+    gross_win = pnl[wins].sum()
+    gross_loss = -pnl[~wins].sum()
+    held = (np.asarray(exits["ts"]) - np.asarray(exits["entry_ts"])) / tf_ms
+    return {
+        "trades": float(len(pnl)),
+        "hit_rate": float(wins.mean()),
+        "pnl": float(pnl.sum()),
+        "profit_factor": float(gross_win / gross_loss) if gross_loss > 0 else np.inf,
+        "avg_win": float(pnl[wins].mean()) if wins.any() else 0.0,
+        "avg_loss": float(pnl[~wins].mean()) if (~wins).any() else 0.0,
+        "mean_bars_held": float(held.mean()),
+    }
+
+
+def exit_reason_stats(exits: dict[str, np.ndarray], tf_ms: int) -> pd.DataFrame:
+    """Сделки, hit rate и PnL по причинам выхода (TP / TRAIL / TRAIL-BE)."""
+    codes = np.asarray(exits["reason"], dtype=np.intp)
+    pnl = np.asarray(exits["pnl"], dtype=float)
+    held = (np.asarray(exits["ts"]) - np.asarray(exits["entry_ts"])) / tf_ms
+    k = len(EXIT_REASONS)
+    count = np.bincount(codes, minlength=k)
+    wins = np.bincount(codes, weights=pnl > 0, minlength=k)
+    total = np.bincount(codes, weights=pnl, minlength=k)
+    bars = np.bincount(codes, weights=held, minlength=k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = pd.DataFrame(
+            {
+                "trades": count,
+                "hit_rate": wins / count,
+                "pnl": total,
+                "mean_pnl": total / count,
+                "mean_bars_held": bars / count,
+            },
+            index=pd.Index(EXIT_REASONS, name="reason"),
+        )
+    return out[out["trades"] > 0]
+
+
+def summarize(run: RunResults) -> dict[str, float]:
+    tf_ms = run.tf_ms or 300_000
+    signals = run.table("signals")
+    out = {
+        "signal_bars": float(len(signals["ts"])),
+        "long_signals": float(np.count_nonzero(signals["long"])),
+        "short_signals": float(np.count_nonzero(signals["short"])),
+        "orders": float(run.meta["rows"]["orders"]),
+    }
+    out.update(equity_stats(run.table("equity"), tf_ms))
+    out.update(trade_stats(run.table("exits"), tf_ms))
+    return out
+
+
+def compare(paths: Iterable[Union[str, Path]]) -> pd.DataFrame:
+    """Метрики по строкам, прогоны по колонкам."""
+    runs = [open_run(p) for p in paths]
+    return pd.DataFrame({run.name: summarize(run) for run in runs})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare replay/backtest runs")
+    parser.add_argument("runs", nargs="+", help="results run directories")
+    parser.add_argument(
+        "--reasons", action="store_true", help="also print per exit reason stats"
+    )
+    args = parser.parse_args()
+
+    with pd.option_context(
+        "display.width", 200, "display.float_format", "{:.6g}".format
+    ):
+        print(compare(args.runs).to_string())
+        if args.reasons:
+            for path in args.runs:
+                run = open_run(path)
+                print(f"\n== {run.name} ==")
+                print(exit_reason_stats(run.table("exits"), run.tf_ms or 300_000))
+
+
+if __name__ == "__main__":
+    main()
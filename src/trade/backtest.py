@@ -0,0 +1,274 @@
+"""
+Бумажный прогон стратегии по предрасчитанным индикаторам (см. features.py).
+
+Решения на баре принимает DecisionCore.decide — то же ядро, что в live и
+replay: стоп по просадке баланса → cooldown → трейлинг-выходы → входы по
+сигналам. Действия исполняются по порядку, как в ReplayRecorder:
+ордера — по цене закрытия бара, выход закрывает всю позицию стороны,
+комиссии не учитываются.
+
+С sub_bars (см. intrabar.py) трейлинг проверяется не по close бара, а по пути
+1m подбаров: выходы всех входов по сигналам ищутся одним векторным сканом
+до прогона, при (пере)активации трейлинга позиция берёт выход своего входа;
+выход исполняется по цене точки срабатывания в начале своего бара —
+до проверок просадки и cooldown, как сработавший внутри бара стоп.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import WebsocketConfig
+from trade.engine import BarSignals, DecisionCore
+from trade.features import tradable_mask
+from trade.intrabar import SCAN_REASONS, SubBarPath
+from trade.strategy import StrategyState
+
+LEDGER_COLUMNS = [
+    "side",
+    "entry_ts",
+    "exit_ts",
+    "entry_price",
+    "exit_price",
+    "qty",
+    "pnl",
+    "reason",
+]
+
+
+@dataclass(slots=True)
+class Trade:
+    side: str
+    entry_ts: int
+    exit_ts: int
+    entry_price: float
+    exit_price: float
+    qty: float
+    pnl: float
+    reason: str
+
+
+@dataclass(slots=True)
+class BacktestResult:
+    start_balance: float
+    final_balance: float
+    max_drawdown: float  # доля от пика реализованного баланса
+    bars: int
+    signals: int
+    trades: list[Trade] = field(default_factory=list)
+
+    @property
+    def total_return(self) -> float:
+        if self.start_balance <= 0:
+            return 0.0
+        return self.final_balance / self.start_balance - 1
+
+    def ledger(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [
+                (
+                    t.side,
+                    t.entry_ts,
+                    t.exit_ts,
+                    t.entry_price,
+                    t.exit_price,
+                    t.qty,
+                    t.pnl,
+                    t.reason,
+                )
+                for t in self.trades
+            ],
+            columns=LEDGER_COLUMNS,
+        )
+
+
+@dataclass(slots=True)
+class _PaperPosition:
+    qty: float = 0.0
+    cost: float = 0.0
+    entry_ts: int = 0
+
+
+def run_backtest(
+    features: Mapping[str, Any],
+    params: WebsocketConfig,
+    start: int = 0,
+    stop: Optional[int] = None,
+    start_balance: float = 1000.0,
+    max_consecutive_losses: int = 3,
+    cooldown_bars_after_losses: int = 10,
+    sub_bars: Optional[SubBarPath] = None,
+) -> BacktestResult:
+    """
+    Прогоняет StrategyState + DecisionCore на барах [start, stop).
+    features: DataFrame из compute_features или словарь массивов (в т.ч. mmap).
+    sub_bars: путь подбаров для выходов внутри бара (индексы — как у features).
+    Состояние стратегии на старте окна пустое, индикаторы уже прогреты.
+    """
+    ts = np.asarray(features["ts"])
+    close = np.asarray(features["c"], dtype=float)
+    ema60_5 = np.asarray(features["ema60_5"], dtype=float)
+    ema163_5 = np.asarray(features["ema163_5"], dtype=float)
+    ema1h = np.asarray(features["ema1h"], dtype=float)
+    rsi1d = np.asarray(features["rsi1d"], dtype=float)
+    stop = len(ts) if stop is None else min(stop, len(ts))
+
+    window = {
+        col: np.asarray(features[col])[start:stop]
+        for col in ("ts", "ema60_5", "ema163_5", "ema1h", "rsi1d", "atr1h")
+    }
+    mask = tradable_mask(window, params.min_atr_1h)
+    state = StrategyState(
+        params.retest_pct,
+        params.max_bars_wait,
+        params.rsi_long_max,
+        params.rsi_short_min,
+    )
+    tp_pct = params.take_profit_pct or None
+    core = DecisionCore(
+        params, max_consecutive_losses, cooldown_bars_after_losses, log=False
+    )
+    positions = {"long": _PaperPosition(), "short": _PaperPosition()}
+    # выходы, найденные по подбарам: side -> (бар, цена, причина)
+    scheduled: dict[str, Optional[tuple[int, float, str]]] = {
+        "long": None,
+        "short": None,
+    }
+    next_exit = stop  # ближайший бар из scheduled
+
+    balance = start_balance
+    peak = start_balance
+    max_drawdown = 0.0
+    signals = 0
+    trades: list[Trade] = []
+
+    def open_position(side: str, entry_ts: int, price: float) -> bool:
+        qty = (balance * params.order_percent) / max(price, 1e-12)
+        if qty <= 0:
+            return False
+        if (
+            params.max_order_cost_usdt is not None
+            and qty * price > params.max_order_cost_usdt
+        ):
+            return False
+        pos = positions[side]
+        if pos.qty == 0.0:
+            pos.entry_ts = entry_ts
+        pos.qty += qty
+        pos.cost += qty * price
+        return True
+
+    def close_position(side: str, exit_ts: int, price: float, reason: str) -> None:
+        nonlocal balance, peak, max_drawdown
+        pos = positions[side]
+        if pos.qty <= 0:
+            return
+        avg_entry = pos.cost / pos.qty
+        pnl = (
+            pos.qty * (price - avg_entry)
+            if side == "long"
+            else pos.qty * (avg_entry - price)
+        )
+        trades.append(
+            Trade(
+                side,
+                pos.entry_ts,
+                exit_ts,
+                avg_entry,
+                price,
+                pos.qty,
+                pnl,
+                reason,
+            )
+        )
+        positions[side] = _PaperPosition()
+        balance += pnl
+        peak = max(peak, balance)
+        max_drawdown = max(max_drawdown, 1 - balance / peak)
+
+    def close_scheduled(upto: int) -> None:
+        nonlocal next_exit
+        due = sorted(
+            (exit_, side)
+            for side, exit_ in scheduled.items()
+            if exit_ is not None and exit_[0] <= upto
+        )
+        for (bar, price, reason), side in due:
+            scheduled[side] = None
+            core.on_exit(side, price)
+            close_position(side, int(ts[bar]), price, reason)
+        next_exit = min(
+            (e[0] for e in scheduled.values() if e is not None), default=stop
+        )
+
+    # сигналы не зависят от баланса и позиций — считаются заранее, чтобы
+    # выходы всех возможных входов по подбарам найти одним векторным сканом
+    bars = np.flatnonzero(mask) + start
+    updates = [
+        state.update(
+            int(ts[i]),
+            float(close[i]),
+            price5=float(close[i]),
+            ema60_5=float(ema60_5[i]),
+            ema163_5=float(ema163_5[i]),
+            ema1h=float(ema1h[i]),
+            rsi1d=float(rsi1d[i]),
+        )
+        for i in bars
+    ]
+    exits: dict[tuple[int, str], tuple[int, float, str]] = {}
+    if sub_bars is not None and len(bars):
+        flags = np.array([(bool(ls), bool(ss)) for ls, ss in updates], dtype=bool)
+        entry_bar = np.concatenate([bars[flags[:, 0]], bars[flags[:, 1]]])
+        is_long = np.arange(len(entry_bar)) < np.count_nonzero(flags[:, 0])
+        exit_bar, exit_price, code = sub_bars.exits(
+            entry_bar,
+            close[entry_bar],
+            is_long,
+            params.trailing_pct,
+            tp_pct,
+            stop,
+        )
+        for k in np.flatnonzero(exit_bar >= 0):
+            side = "long" if is_long[k] else "short"
+            exits[int(entry_bar[k]), side] = (
+                int(exit_bar[k]),
+                float(exit_price[k]),
+                SCAN_REASONS[code[k]],
+            )
+
+    for i, (long_signal, short_signal) in zip(bars, updates):
+        bar_ts = int(ts[i])
+        price = float(close[i])
+        if i >= next_exit:
+            close_scheduled(i)
+        signals += bool(long_signal) + bool(short_signal)
+
+        bar = BarSignals(bar_ts, price, bool(long_signal), bool(short_signal))
+        for action in core.decide(bar, balance):
+            if action.kind == "exit":
+                close_position(action.side, bar_ts, price, action.reason)
+                continue
+            if action.kind != "enter" or not open_position(action.side, bar_ts, price):
+                continue
+            # с подбарами трейлинг ядра не нужен: выход входа уже найден сканом
+            core.on_entry_filled(action.side, price, trailing=sub_bars is None)
+            if sub_bars is not None:
+                exit_ = exits.get((int(i), action.side))
+                scheduled[action.side] = exit_
+                if exit_ is not None:
+                    next_exit = min(next_exit, exit_[0])
+
+    if next_exit < stop:
+        close_scheduled(stop - 1)
+
+    return BacktestResult(
+        start_balance=start_balance,
+        final_balance=balance,
+        max_drawdown=max_drawdown,
+        bars=stop - start,
+        signals=signals,
+        trades=trades,
+    )
@@ -0,0 +1,138 @@
+"""
+Раннее закрытие бара по часам вместо ожидания confirm от биржи.
+
+Bybit присылает confirm=true для свечи через сотни миллисекунд (а иногда
+секунды) после границы бара. EarlyBarCloser собирает формирующийся бар из
+неподтверждённых обновлений того же топика и закрывает его локально, как
+только по оценке часов биржи наступила граница (+ grace_ms на последние
+сделки в пути):
+
+  offset — EWMA (ts сообщения биржи - локальное время получения); включает
+           и расхождение часов, и задержку доставки, поэтому локальный
+           дедлайн boundary - offset сдвинут на одну задержку в безопасную
+           сторону.
+
+Когда приходит официальная свеча, она сверяется с ранней:
+  matched — OHLC совпали, повторно не отдаётся;
+  revised — расходятся (поздние сделки): отдаётся обработчику ещё раз, тот же
+            start_at — BarBuffer заменяет бар на месте, StrategyCore уточняет
+            индикаторы (см. StrategyCore.on_bar); сигналы по раннему бару
+            уже отработаны и не пересматриваются;
+  missed  — confirm пришёл раньше дедлайна: бар идёт обычным путём.
+
+Первое обновление следующего бара раньше дедлайна (часы отстают сильнее
+оценки) — граница уже прошла: текущий бар закрывается сразу (rolled), не
+дожидаясь часов, и так же ждёт confirm.
+"""
+
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_OHLC = ("open", "high", "low", "close")
+
+
+class EarlyBarCloser:
+    def __init__(self, tf_ms: int, grace_ms: int = 150, skew_alpha: float = 0.1):
+        self.tf_ms = tf_ms
+        self.grace_ms = grace_ms
+        self.skew_alpha = skew_alpha
+        self.offset_ms: Optional[float] = None
+        self.forming: Optional[dict] = None
+        self.last_closed: Optional[int] = None  # start_at последнего отданного бара
+        # рано закрытые бары, ждущие confirm
+        self.pending: dict[int, dict] = {}
+        self.stats: dict[str, int] = {
+            "early": 0,
+            "matched": 0,
+            "revised": 0,
+            "missed": 0,
+            "rolled": 0,
+        }
+
+    # ---------- часы ----------
+
+    def observe_clock(self, server_ms: int, local_ms: int) -> None:
+        sample = float(server_ms - local_ms)
+        if self.offset_ms is None:
+            self.offset_ms = sample
+        else:
+            self.offset_ms += self.skew_alpha * (sample - self.offset_ms)
+
+    def deadline_ms(self) -> Optional[float]:
+        """Локальное время (мс), когда формирующийся бар можно закрыть."""
+        if self.forming is None:
+            return None
+        boundary = self.forming["start_at"] + self.tf_ms
+        return boundary - (self.offset_ms or 0.0) + self.grace_ms
+
+    # ---------- свечи ----------
+
+    def update(self, candle: dict) -> Optional[dict]:
+        """
+        Неподтверждённое обновление. Если оно начинает следующий бар, а
+        текущий ещё не закрыт по часам, — возвращает текущий (снят с учёта,
+        как в close_due): его нужно отдать обработчику.
+        """
+        ts = candle["start_at"]
+        if self.last_closed is not None and ts <= self.last_closed:
+            return None  # поздняя сделка по уже закрытому бару — сверит confirm
+        rolled = None
+        if self.forming is not None and self.forming["start_at"] < ts:
+            rolled = self._close()
+            self.stats["rolled"] += 1
+        self.forming = candle
+        return rolled
+
+    def close_due(self, now_ms: float) -> Optional[dict]:
+        """Формирующийся бар, если его дедлайн наступил (и он снят с учёта)."""
+        deadline = self.deadline_ms()
+        if deadline is None or now_ms < deadline:
+            return None
+        return self._close()
+
+    def _close(self) -> dict:
+        bar = self.forming
+        self.forming = None
+        self.last_closed = bar["start_at"]
+        self.pending[bar["start_at"]] = bar
+        # confirm может не прийти (разрыв): старые ожидания не копим
+        for ts in [ts for ts in self.pending if ts < bar["start_at"] - self.tf_ms]:
+            del self.pending[ts]
+        self.stats["early"] += 1
+        return bar
+
+    def confirm(self, candle: dict) -> bool:
+        """Официальная свеча; True — её нужно отдать обработчику."""
+        ts = candle["start_at"]
+        early = self.pending.pop(ts, None)
+        if early is None:
+            if self.forming is not None and self.forming["start_at"] <= ts:
+                self.forming = None
+            if self.last_closed is None or ts > self.last_closed:
+                self.last_closed = ts
+                self.stats["missed"] += 1
+            return True
+
+        if all(early[k] == candle[k] for k in _OHLC):
+            self.stats["matched"] += 1
+            return False
+
+        self.stats["revised"] += 1
+        logger.info(
+            "[EARLY] bar %d revised by confirm: close %.6f -> %.6f, "
+            "high %.6f -> %.6f, low %.6f -> %.6f",
+            ts,
+            early["close"],
+            candle["close"],
+            early["high"],
+            candle["high"],
+            early["low"],
+            candle["low"],
+        )
+        return True
+
+    def reset(self) -> None:
+        """Разрыв соединения: формирующийся бар догрузит backfill/confirm."""
+        self.forming = None
@@ -0,0 +1,233 @@
+"""
+Пакетный replay списка символов (скрининг) в пуле процессов.
+
+История берётся из общего локального кэша cache_dir/<path_template> (.bin,
+читается через memmap): родитель один раз докачивает недостающие файлы по
+REST (см. TradingApp.run_batch), воркеры только читают, так что каждый символ
+скачивается ровно один раз и страницы файла делятся через page cache.
+
+Каждая пара (символ, ТФ) прогоняется в отдельном процессе тем же циклом
+replay_bars, что run_replay с включённым results: StrategyCore + бумажный
+ReplayRecorder, прогон пишется в колоночное хранилище (trade/results.py). Итоговые метрики
+analytics.summarize по всем прогонам сводятся в один отчёт, одна строка на пару.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from core.config import (
+    BatchConfig,
+    FeatureStoreConfig,
+    IndicatorSpec,
+    ResultsConfig,
+    WebsocketConfig,
+    settings,
+)
+from trade.analytics import summarize
+from trade.engine import STRATEGY_INDICATORS, StrategyCore
+from trade.feature_store import FeatureStore
+from trade.history import OHLCVFileSource
+from trade.indicator_graph import IndicatorGraph
+from trade.results import (
+    ReplayRecorder,
+    ResultsWriter,
+    new_run_dir,
+    open_run,
+    replay_bars,
+)
+from trade.utils import tf_to_ms
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class BatchJob:
+    symbol: str
+    timeframe: str
+    run_dir: Path
+
+
+def _init_worker(log_level: str) -> None:
+    logging.getLogger().setLevel(log_level)
+
+
+def replay_job(
+    job: BatchJob,
+    cfg: BatchConfig,
+    params: WebsocketConfig,
+    results: ResultsConfig,
+    features: Optional[FeatureStoreConfig] = None,
+) -> dict[str, Any]:
+    """
+    Replay одной пары из кэша; возвращает строку отчёта. С features
+    индикаторы берутся из FeatureStore (граф ядра не считается).
+    """
+    row: dict[str, Any] = {"symbol": job.symbol, "timeframe": job.timeframe}
+    try:
+        core = StrategyCore(job.timeframe, params=params)
+        source = OHLCVFileSource(cfg.cache_dir, cfg.path_template, cfg.chunk_bars)
+        # история читается кусками: на ряды FeatureStore и на сам прогон
+        chunks = partial(
+            source.iter_chunks, job.symbol, job.timeframe, cfg.start, cfg.end
+        )
+        meta = {
+            "mode": "batch",
+            "symbol": job.symbol,
+            "timeframe": job.timeframe,
+            "tf_ms": tf_to_ms(job.timeframe),
+            "start_balance": results.start_balance,
+            "params": params.model_dump(mode="json"),
+        }
+        with ResultsWriter(job.run_dir, meta, results.chunk_rows) as writer:
+            recorder = ReplayRecorder(
+                writer,
+                on_fill=core.on_entry_filled,
+                start_balance=results.start_balance,
+                order_percent=params.order_percent,
+                max_order_cost=params.max_order_cost_usdt,
+            )
+            rows = None
+            if features is not None:
+                rows = _feature_rows(features, job, chunks, core.specs)
+            replay_bars(core, recorder, chunks(), rows)
+        row.update(summarize(open_run(job.run_dir)))
+        row["final_balance"] = recorder.balance
+    except Exception as e:
+        logger.exception("[BATCH] %s %s failed: %s", job.symbol, job.timeframe, e)
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _feature_rows(
+    features: FeatureStoreConfig,
+    job: BatchJob,
+    chunks: Callable[[], Iterable[pd.DataFrame]],
+    specs: list[IndicatorSpec],
+) -> Optional[Iterator[dict]]:
+    """Значения индикаторов по барам всех кусков из FeatureStore (None — графом)."""
+    try:
+        stored = FeatureStore.from_config(features).load_chunks(
+            job.symbol, job.timeframe, chunks, specs
+        )
+    except ValueError as e:
+        logger.warning(
+            "[BATCH] %s %s: feature store skipped: %s", job.symbol, job.timeframe, e
+        )
+        return None
+    return stored.rows(0, stored.bars)
+
+
+def check_timeframes(timeframes: Iterable[str], specs: Iterable[IndicatorSpec]) -> None:
+    """
+    Граф индикаторов стратегии строится на каждом ТФ — иначе ValueError
+    до запуска пула, а не ошибка в каждом воркере.
+    """
+    specs = list(specs)
+    for tf in timeframes:
+        try:
+            IndicatorGraph(specs, tf, require=STRATEGY_INDICATORS)
+        except ValueError as e:
+            raise ValueError(f"Batch replay: таймфрейм {tf} не подходит: {e}") from e
+
+
+def run_batch_replay(
+    symbols: list[str],
+    cfg: BatchConfig,
+    params: WebsocketConfig,
+    results: ResultsConfig,
+    features: Optional[FeatureStoreConfig] = None,
+) -> pd.DataFrame:
+    """Прогоняет все пары символ x ТФ в пуле и пишет сводный отчёт."""
+    root = new_run_dir(results.dir, cfg.run_name)
+    jobs = [
+        BatchJob(symbol, tf, root / f"{symbol}_{tf}")
+        for symbol in symbols
+        for tf in cfg.timeframes
+    ]
+    if not jobs:
+        raise ValueError("Batch replay: пустой список символов")
+    check_timeframes(cfg.timeframes, settings.indicators)
+    workers = min(cfg.workers or os.cpu_count() or 1, len(jobs))
+    logger.info(
+        "Batch replay: %d symbols x %d timeframes on %d workers -> %s",
+        len(symbols),
+        len(cfg.timeframes),
+        workers,
+        root,
+    )
+
+    rows: list[dict[str, Any]] = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(cfg.worker_log_level,),
+    ) as pool:
+        futures = [
+            pool.submit(replay_job, job, cfg, params, results, features) for job in jobs
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows.append(row)
+            if "error" in row:
+                logger.error(
+                    "[BATCH] %d/%d %s %s failed: %s",
+                    done,
+                    len(jobs),
+                    row["symbol"],
+                    row["timeframe"],
+                    row["error"],
+                )
+                continue
+            logger.info(
+                "[BATCH] %d/%d %s %s: return=%s trades=%s",
+                done,
+                len(jobs),
+                row["symbol"],
+                row["timeframe"],
+                row.get("total_return", "-"),
+                row.get("trades", "-"),
+            )
+
+    report = pd.DataFrame(rows)
+    if "total_return" in report:
+        report = report.sort_values("total_return", ascending=False)
+    report = report.reset_index(drop=True)
+    report_path = Path(cfg.report_path or root / "report.csv")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+    logger.info("Batch report written to %s (%d runs)", report_path, len(report))
+    return report
+
+
+def missing_history(
+    symbols: list[str], cfg: BatchConfig
+) -> list[tuple[str, str, Path]]:
+    """Пары (символ, ТФ), которых ещё нет в кэше, и пути их файлов."""
+    source = OHLCVFileSource(cfg.cache_dir, cfg.path_template)
+    out = []
+    for symbol in symbols:
+        for tf in cfg.timeframes:
+            path = source.path_for(symbol, tf)
+            if not path.exists():
+                out.append((symbol, tf, path))
+    return out
+
+
+def usdt_perps(markets: list[dict], limit: Optional[int] = None) -> list[str]:
+    """Активные линейные USDT-перпетуалы из load_markets (id вида BTCUSDT)."""
+    symbols = sorted(
+        m["id"]
+        for m in markets
+        if m.get("swap")
+        and m.get("linear")
+        and m.get("quote") == "USDT"
+        and m.get("active", True)
+    )
+    return symbols[:limit] if limit else symbols
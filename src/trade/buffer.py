@@ -1,15 +1,48 @@
 from collections import deque
+from typing import Optional
+
 import pandas as pd
 
 
 class BarBuffer:
     def __init__(self, maxlen: int = 1000):
         self._buf = deque(maxlen=maxlen)
+        # ts -> порядковый номер бара; позиция в deque = seq - номер самого старого
+        self._index: dict[int, int] = {}
+        self._seq: int = 0
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def __contains__(self, ts: int) -> bool:
+        return ts in self._index
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return self._buf[-1][0] if self._buf else None
+
+    def add(self, k: dict) -> bool:
+        """
+        Добавляет бар. Повтор уже известного start_at заменяет бар на месте,
+        бар старше последнего (и не из буфера) игнорируется.
+        Возвращает True, только если бар новый и встал в конец.
+        """
+        bar = (k["start_at"], k["open"], k["high"], k["low"], k["close"], k["volume"])
+        ts = bar[0]
+
+        seq = self._index.get(ts)
+        if seq is not None:
+            self._buf[seq - (self._seq - len(self._buf))] = bar
+            return False
+        if self._buf and ts < self._buf[-1][0]:
+            return False
 
-    def add(self, k: dict) -> None:
-        self._buf.append(
-            (k["start_at"], k["open"], k["high"], k["low"], k["close"], k["volume"])
-        )
+        if self._buf.maxlen is not None and len(self._buf) == self._buf.maxlen:
+            del self._index[self._buf[0][0]]
+        self._buf.append(bar)
+        self._index[ts] = self._seq
+        self._seq += 1
+        return True
 
     def to_df(self) -> pd.DataFrame:
         if not self._buf:
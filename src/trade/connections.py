@@ -0,0 +1,102 @@
+"""
+Общий HTTP/WS-пул процесса: один aiohttp.TCPConnector с keep-alive и
+кэшем DNS, одна ClientSession для DataWS и обоих ccxt-клиентов.
+
+Перед закрытием каждого бара пул прогревает соединения лёгким GET
+(prewarm_path), чтобы ордера по сигналу шли по уже открытому TLS.
+"""
+
+import asyncio
+import logging
+import ssl
+import time
+from typing import Any, Iterable, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+
+from core.config import HttpConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _ssl_context() -> ssl.SSLContext:
+    try:
+        import certifi  # ставится вместе с ccxt
+    except ImportError:
+        return ssl.create_default_context()
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+class HttpPool:
+    def __init__(self, cfg: HttpConfig) -> None:
+        self.cfg = cfg
+        self._session: Optional[ClientSession] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HttpPool is not open")
+        return self._session
+
+    async def open(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                limit=self.cfg.limit,
+                limit_per_host=self.cfg.limit_per_host,
+                ttl_dns_cache=self.cfg.dns_ttl,
+                keepalive_timeout=self.cfg.keepalive_timeout,
+                ssl=_ssl_context(),
+                enable_cleanup_closed=True,
+            )
+            self._session = ClientSession(connector=connector)
+        return self._session
+
+    def attach(self, exchange: Any) -> None:
+        """Подключает ccxt-клиент к общей сессии (ccxt её не закрывает)."""
+        exchange.session = self.session
+        exchange.own_session = False
+
+    async def warm(self, urls: Iterable[str]) -> None:
+        timeout = ClientTimeout(total=5)
+
+        async def hit(url: str) -> None:
+            try:
+                async with self.session.get(url, timeout=timeout) as resp:
+                    await resp.read()
+            except (ClientError, asyncio.TimeoutError) as e:
+                logger.debug("[HTTP] prewarm %s failed: %s", url, e)
+
+        await asyncio.gather(*(hit(url) for url in urls))
+
+    def start_prewarm(self, hosts: Iterable[str], tf_ms: int) -> None:
+        if self.cfg.prewarm_lead_sec is None:
+            return
+        urls = sorted({host.rstrip("/") + self.cfg.prewarm_path for host in hosts})
+        if self._prewarm_task is None or self._prewarm_task.done():
+            self._prewarm_task = asyncio.create_task(
+                self._prewarm_loop(urls, tf_ms), name="http-prewarm"
+            )
+
+    async def _prewarm_loop(self, urls: list[str], tf_ms: int) -> None:
+        lead = self.cfg.prewarm_lead_sec
+        while True:
+            now = time.time()
+            next_close = (int(now * 1000) // tf_ms + 1) * tf_ms / 1000
+            await asyncio.sleep(max(next_close - lead - now, 0.0))
+            await self.warm(urls)
+            logger.debug("[HTTP] prewarmed %d host(s)", len(urls))
+            # не прогревать повторно в том же окне
+            await asyncio.sleep(max(next_close - time.time(), 0.0) + 0.5)
+
+    async def close(self) -> None:
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            try:
+                await self._prewarm_task
+            except asyncio.CancelledError:
+                pass
+            self._prewarm_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -1,18 +1,106 @@
 import asyncio
 import json
 import logging
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Mapping, Iterator
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Mapping,
+    Iterator,
+)
 from aiohttp import ClientSession, WSMsgType, ClientError
 
 from core.config import settings
+from trade import tracing
+from trade.barclock import EarlyBarCloser
+from trade.orderbook import TopOfBook
+from trade.ratelimit import Priority, rest_scheduler
+from trade.tracing import LatencyTracer
+from trade.utils import tf_to_ms, to_ccxt_linear_symbol
 
 logger = logging.getLogger(__name__)
 
+# Bybit v5 /market/kline отдаёт не больше 1000 свечей за запрос
+BACKFILL_CHUNK_BARS = 1000
+# сколько ключей (topic, start) помнить для дедупликации между соединениями
+SEEN_CANDLES = 512
+
+
+@dataclass(slots=True)
+class Feed:
+    """Одно соединение WS из нескольких параллельных (settings.ws.feeds)."""
+
+    index: int
+    url: str
+    ws: Any = None  # текущее соединение aiohttp
+    connected_ms: Optional[float] = None  # подписка подтверждена (локальные мс)
+    attempt: int = 0  # номер попытки для backoff
+    last_start: Optional[int] = None  # последняя подтверждённая базовая свеча
+    struck_start: Optional[int] = None  # свеча, за которую уже был штраф
+    strikes: int = 0  # баров подряд с опозданием/пропуском
+    recycle: bool = False  # соединение закрыто как отстающее
+    wins: int = 0  # свечей доставлено первым
+    late: int = 0  # свечей доставлено позже feed_max_lag_ms
+    recycles: int = 0
+    lag_ms: float = 0.0  # опоздание последней свечи, пришедшей не первой
+
+
+class RestOHLCVClient(Protocol):
+    async def fetch_ohlcv(
+        self,
+        symbol: str,
+        timeframe: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> list[list[Any]]: ...
+
 
 class DataWS:
-    def __init__(self, handler):
+    """
+    Поток свечей Bybit по WS. С settings.ws.feeds > 1 (или feed_urls)
+    держит несколько соединений: подтверждённая свеча обрабатывается от
+    первого доставившего (дедуп по topic + start), повторы только меряют
+    опоздание остальных. Соединение, которое feed_lag_strikes баров подряд
+    опаздывает больше feed_max_lag_ms или не доставляет свечу вовсе,
+    переподключается — задержку бара задаёт самое быстрое соединение.
+    """
+
+    def __init__(
+        self,
+        handler,
+        rest: Optional[RestOHLCVClient] = None,
+        last_ts: Optional[Callable[[], Optional[int]]] = None,
+        session: Optional[ClientSession] = None,
+        symbol: Optional[str] = None,
+        book: Optional[TopOfBook] = None,
+        early_close: bool = False,
+        htf: Sequence[str] = (),
+        htf_handler: Optional[Callable[[str, Dict[str, float]], None]] = None,
+        tracer: Optional[LatencyTracer] = None,
+    ):
         self.url: str = settings.ws.url
-        self.symbol: str = settings.ws.symbol
+        urls = [self.url, *settings.ws.feed_urls]
+        self.feeds: List[Feed] = [
+            Feed(i, urls[i % len(urls)])
+            for i in range(max(settings.ws.feeds, len(urls)))
+        ]
+        self.max_lag_ms: int = settings.ws.feed_max_lag_ms
+        self.lag_strikes: int = settings.ws.feed_lag_strikes
+        # первая доставка подтверждённых свечей: (topic, start) -> локальные мс
+        self._seen: OrderedDict[tuple[str, int], float] = OrderedDict()
+        # ts последнего принятого сообщения по topic: отсекает устаревшие
+        # обновления формирующихся свечей от отстающих соединений
+        self._msg_ts: Dict[str, int] = {}
+        self.symbol: str = (symbol or settings.ws.symbol).upper()
         self.timeframe: str = settings.ws.timeframe  # "1m","5m","1h"
         self.topic: str = self._make_topic(
             self.url,
@@ -20,10 +108,40 @@ class DataWS:
             self.symbol,
         )
         self.handler = handler
+        # нативные свечи старших ТФ (kline.60 / kline.D): topic -> tf
+        self.htf_topics: Dict[str, str] = {
+            self._make_topic(self.url, tf, self.symbol): tf for tf in htf
+        }
+        self.htf_handler = htf_handler
+        for feed in self.feeds:
+            if self._make_topic(feed.url, self.timeframe, self.symbol) != self.topic:
+                raise ValueError(f"WS feed {feed.url} uses a different kline topic")
+        # лучший bid/ask из orderbook.1 по тому же соединению (опционально)
+        self.book = book
         self.reconnect_delay: int = settings.ws.reconnect_delay
-        self._session: Optional[ClientSession] = None
+        self.reconnect_max_delay: int = settings.ws.reconnect_max_delay
+        # общая сессия (HttpPool) не закрывается здесь; своя — закрывается
+        self._session: Optional[ClientSession] = session
+        self._own_session: bool = session is None
         self._running: bool = False
 
+        # догрузка пропущенных баров: REST-клиент (ccxt) и последний бар в буфере
+        self.rest = rest
+        self.last_ts = last_ts
+        self.tf_ms: int = tf_to_ms(self.timeframe)
+
+        # закрытие бара по часам до confirm (см. trade/barclock.py)
+        self.closer: Optional[EarlyBarCloser] = (
+            EarlyBarCloser(self.tf_ms, settings.ws.early_close_grace_ms)
+            if early_close
+            else None
+        )
+        self._forming = asyncio.Event()
+        # бары из цикла WS и из таймера раннего закрытия — строго по очереди
+        self._handler_lock = asyncio.Lock()
+        # tick-to-trade трассы баров (см. trade/tracing.py)
+        self.tracer = tracer
+
     @staticmethod
     def _make_topic(
         url: str,
@@ -37,6 +155,7 @@ class DataWS:
                 "5m": "5",
                 "15m": "15",
                 "1h": "60",
+                "1d": "D",
             }
             interval = tf_map.get(timeframe)
             if not interval:
@@ -48,63 +167,403 @@ class DataWS:
         if self._running:
             return
         self._running = True
-        self._session = ClientSession()
+        if self._session is None or self._session.closed:
+            self._session = ClientSession()
+            self._own_session = True
+        closer_task = (
+            asyncio.create_task(self._early_close_loop(), name="early-close")
+            if self.closer is not None
+            else None
+        )
 
-        while self._running:
-            try:
+        try:
+            await asyncio.gather(*(self._run_feed(feed) for feed in self.feeds))
+        finally:
+            if closer_task is not None:
+                closer_task.cancel()
+                try:
+                    await closer_task
+                except asyncio.CancelledError:
+                    pass
                 logger.info(
-                    "Connecting to WS %s …",
-                    self.url,
+                    "[EARLY] %s, clock offset %.1f ms",
+                    ", ".join(f"{k}={v}" for k, v in self.closer.stats.items()),
+                    self.closer.offset_ms or 0.0,
                 )
-                async with self._session.ws_connect(
-                    self.url,
+            if len(self.feeds) > 1:
+                for feed in self.feeds:
+                    logger.info(
+                        "[FEEDS] #%d %s: first=%d late=%d recycled=%d",
+                        feed.index,
+                        feed.url,
+                        feed.wins,
+                        feed.late,
+                        feed.recycles,
+                    )
+            await self._close_session()
+
+    async def _run_feed(self, feed: Feed) -> None:
+        """Цикл одного соединения: подключение, подписка, приём, переподключение."""
+        tag = f"#{feed.index} " if len(self.feeds) > 1 else ""
+        while self._running:
+            try:
+                logger.info("Connecting to WS %s%s …", tag, feed.url)
+                ws = await self._session.ws_connect(
+                    feed.url,
                     heartbeat=30,
                     timeout=60,
-                ) as ws:
+                )
+                try:
+                    topics = [self.topic, *self.htf_topics]
+                    # стакан — только из первого соединения: снапшоты разных
+                    # соединений не упорядочены между собой
+                    book = self.book if feed.index == 0 else None
+                    if book is not None:
+                        book.reset()  # после разрыва ждём новый снапшот
+                        topics.append(book.topic)
+                    if self.closer is not None and not self._connected_peers(feed):
+                        self.closer.reset()
                     await ws.send_json(
-                        {"op": "subscribe", "args": [self.topic]},
+                        {"op": "subscribe", "args": topics},
                     )
-                    logger.info("Subscribed to topic %s", self.topic)
+                    logger.info("Subscribed %sto topics %s", tag, ", ".join(topics))
+                    feed.ws = ws
+                    feed.connected_ms = tracing.now_ms()
+                    feed.attempt = 0
+                    feed.strikes = 0
+                    feed.struck_start = None
+
+                    # всё, что закрылось, пока не было соединения
+                    async with self._handler_lock:
+                        await self._backfill(self._current_bar_start())
 
                     async for msg in ws:
                         if not self._running:
                             break
                         if msg.type == WSMsgType.TEXT:
-                            try:
-                                message = json.loads(msg.data)
-                            except json.JSONDecodeError:
-                                continue
-                            if message.get("op") in {"subscribe", "pong"}:
-                                continue
-                            if message.get("topic") != self.topic:
-                                continue
-                            payload = message.get("data")
-                            if payload is None:
-                                continue
-                            for candle in self._iter_confirmed_candles(payload):
-                                # приводим к start_at/open/high/low/close/volume
-                                await self.handler(candle)
-
+                            await self._on_message(feed, msg.data, book)
                         elif msg.type in (
                             WSMsgType.CLOSED,
                             WSMsgType.ERROR,
                         ):
-                            logger.warning("WS closed/error, reconnecting")
+                            if not feed.recycle:
+                                logger.warning("WS %sclosed/error, reconnecting", tag)
                             break
+                finally:
+                    feed.ws = None
+                    feed.connected_ms = None
+                    if feed.recycle:
+                        await self._drop(ws)
+                    else:
+                        await ws.close()
 
             except asyncio.CancelledError:
                 logger.info("WS task cancelled; shutting down")
                 break
             except ClientError as err:
-                logger.warning("WS client error: %s", err)
+                logger.warning("WS %sclient error: %s", tag, err)
             except Exception as err:
                 logger.exception("WS unexpected error: %s", err)
 
-            if self._running:
-                logger.info("Reconnecting in %ds …", self.reconnect_delay)
-                await asyncio.sleep(self.reconnect_delay)
+            if not self._running:
+                break
+            if feed.recycle:
+                # отстающее соединение: сразу новое, без backoff
+                feed.recycle = False
+                feed.recycles += 1
+                continue
+            delay = self._next_delay(feed)
+            logger.info("Reconnecting %sin %.1fs …", tag, delay)
+            await asyncio.sleep(delay)
 
-        await self._close_session()
+    async def _on_message(
+        self, feed: Feed, data: str, book: Optional[TopOfBook]
+    ) -> None:
+        recv_ms = tracing.now_ms()
+        try:
+            message = json.loads(data)
+        except json.JSONDecodeError:
+            return
+        if message.get("op") in {"subscribe", "pong"}:
+            return
+        topic = message.get("topic")
+        if book is not None and topic == book.topic:
+            book.apply(message)
+            return
+        payload = message.get("data")
+        if payload is None:
+            return
+        htf = self.htf_topics.get(topic)
+        if htf is None and topic != self.topic:
+            return
+        # подтверждённые свечи дедуплицируются по (topic, start) в _first,
+        # формирующиеся от отстающего соединения — отсекаются по ts сообщения
+        stale = self._stale(topic, message.get("ts"))
+
+        if htf is not None:
+            for candle, confirmed in self._iter_candles(payload):
+                if confirmed:
+                    if not self._first(feed, topic, candle, recv_ms):
+                        continue
+                elif stale:
+                    continue
+                self.htf_handler(htf, candle)
+            return
+        if self.closer is not None:
+            await self._on_candles(feed, message, payload, recv_ms, stale)
+            return
+        for candle in self._iter_confirmed_candles(payload):
+            if self._first(feed, topic, candle, recv_ms):
+                # приводим к start_at/open/high/low/close/volume
+                await self._emit(candle, recv_ms, message.get("ts"))
+
+    def _stale(self, topic: str, ts: Any) -> bool:
+        """Сообщение старше уже принятого по topic (от отстающего соединения)."""
+        if len(self.feeds) == 1 or not ts:
+            return False
+        ts = int(ts)
+        if ts < self._msg_ts.get(topic, 0):
+            return True
+        self._msg_ts[topic] = ts
+        return False
+
+    def _first(
+        self, feed: Feed, topic: str, candle: Mapping[str, float], recv_ms: float
+    ) -> bool:
+        """
+        Подтверждённая свеча: True — доставлена первой, её и обрабатываем.
+        Повторы от других соединений отбрасываются; их опоздание копит
+        штрафы соединению (см. _strike).
+        """
+        start = int(candle["start_at"])
+        key = (topic, start)
+        base = topic == self.topic
+        if base:
+            feed.last_start = max(feed.last_start or start, start)
+        first_ms = self._seen.get(key)
+        if first_ms is None:
+            self._seen[key] = recv_ms
+            if len(self._seen) > SEEN_CANDLES:
+                self._seen.popitem(last=False)
+            if base and len(self.feeds) > 1:
+                feed.wins += 1
+                feed.strikes = 0
+                # кто не доставил свечу за max_lag_ms — тоже отстаёт
+                asyncio.get_running_loop().call_later(
+                    self.max_lag_ms / 1000, self._check_feeds, start, recv_ms
+                )
+            return True
+        # опоздание считается, только если соединение уже было, когда свеча
+        # пришла первой: после переподключения повтор истории — не отставание
+        if base and feed.connected_ms is not None and feed.connected_ms <= first_ms:
+            feed.lag_ms = recv_ms - first_ms
+            if feed.lag_ms > self.max_lag_ms:
+                feed.late += 1
+                self._strike(feed, start, f"{feed.lag_ms:.0f} ms behind")
+            elif feed.struck_start != start:
+                feed.strikes = 0
+        return False
+
+    def _check_feeds(self, start: int, first_ms: float) -> None:
+        """Соединения, подключённые до первой доставки свечи start, но без неё."""
+        for feed in self.feeds:
+            if feed.connected_ms is None or feed.ws is None:
+                continue
+            if feed.connected_ms > first_ms or (feed.last_start or 0) >= start:
+                continue
+            self._strike(feed, start, f"no candle {start} after {self.max_lag_ms} ms")
+
+    def _strike(self, feed: Feed, start: int, reason: str) -> None:
+        # не больше одного штрафа за свечу: пропуск и позднее прибытие — одно
+        if feed.struck_start == start:
+            return
+        feed.struck_start = start
+        feed.strikes += 1
+        logger.info(
+            "[FEEDS] #%d %s: %s (%d/%d)",
+            feed.index,
+            feed.url,
+            reason,
+            feed.strikes,
+            self.lag_strikes,
+        )
+        if feed.strikes < self.lag_strikes or feed.ws is None or feed.recycle:
+            return
+        logger.warning(
+            "[FEEDS] #%d %s lags for %d bars, recycling connection",
+            feed.index,
+            feed.url,
+            feed.strikes,
+        )
+        feed.recycle = True
+        asyncio.get_running_loop().create_task(self._drop(feed.ws))
+
+    @staticmethod
+    async def _drop(ws: Any) -> None:
+        """
+        Закрывает отстающее соединение, не дожидаясь ответа сервера дольше
+        секунды: по отмене close() aiohttp обрывает транспорт (обычный close
+        ждёт close-фрейм до timeout ws_connect).
+        """
+        try:
+            async with asyncio.timeout(1.0):
+                await ws.close()
+        except TimeoutError:
+            pass
+
+    def _connected_peers(self, feed: Feed) -> bool:
+        return any(f is not feed and f.ws is not None for f in self.feeds)
+
+    async def _emit(
+        self,
+        candle: Dict[str, float],
+        recv_ms: Optional[float] = None,
+        exchange_ms: Optional[float] = None,
+    ) -> None:
+        async with self._handler_lock:
+            await self._backfill(candle["start_at"])
+            with tracing.bar_scope(
+                self.tracer, int(candle["start_at"]), recv_ms, exchange_ms
+            ):
+                await self.handler(candle)
+
+    async def _on_candles(
+        self,
+        feed: Feed,
+        message: Mapping[str, Any],
+        payload: Any,
+        recv_ms: float,
+        stale: bool = False,
+    ) -> None:
+        """Режим раннего закрытия: учёт формирующегося бара и сверка confirm."""
+        closer = self.closer
+        local_ms = int(recv_ms)
+        # смещение часов — только по свежим сообщениям: отстающее соединение
+        # сдвинуло бы оценку на своё опоздание
+        if message.get("ts") and not stale:
+            closer.observe_clock(int(message["ts"]), local_ms)
+        for candle, confirmed in self._iter_candles(payload):
+            if not confirmed:
+                rolled = None if stale else closer.update(candle)
+                if rolled is not None:
+                    # следующий бар пришёл раньше дедлайна — граница прошла
+                    await self._emit(rolled, recv_ms, message.get("ts"))
+                continue
+            if not self._first(feed, self.topic, candle, recv_ms):
+                continue
+            if closer.confirm(candle):
+                await self._emit(candle, recv_ms, message.get("ts"))
+        # граница могла пройти, пока ждали сообщение
+        self._forming.set()
+
+    async def _early_close_loop(self) -> None:
+        closer = self.closer
+        while True:
+            deadline = closer.deadline_ms()
+            if deadline is None:
+                self._forming.clear()
+                await self._forming.wait()
+                continue
+            delay = (deadline - time.time() * 1000) / 1000
+            if delay > 0:
+                # новое сообщение может сдвинуть дедлайн (новый бар/смещение)
+                self._forming.clear()
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._forming.wait()
+                except TimeoutError:
+                    pass
+                continue
+            bar = closer.close_due(time.time() * 1000)
+            if bar is None:
+                continue
+            logger.debug(
+                "[EARLY] bar %d closed by clock (offset %.1f ms)",
+                bar["start_at"],
+                closer.offset_ms or 0.0,
+            )
+            try:
+                await self._emit(bar, tracing.now_ms())
+            except Exception as err:
+                logger.exception("[EARLY] handler failed: %s", err)
+
+    def _next_delay(self, feed: Feed) -> float:
+        """Экспоненциальный backoff с джиттером: U(d/2, d), d = base * 2^attempt."""
+        delay = min(
+            self.reconnect_max_delay,
+            self.reconnect_delay * 2**feed.attempt,
+        )
+        feed.attempt += 1
+        return random.uniform(delay / 2, delay)
+
+    def _current_bar_start(self) -> int:
+        """Начало формирующегося бара по локальным часам (мс)."""
+        return int(time.time() * 1000) // self.tf_ms * self.tf_ms
+
+    async def _backfill(self, until: int) -> None:
+        """
+        Догружает по REST закрытые бары в (last_ts, until), если есть разрыв,
+        и отдаёт их обработчику по возрастанию start_at с backfill=True.
+        """
+        if self.rest is None or self.last_ts is None:
+            return
+        last = self.last_ts()
+        if last is None or until - last <= self.tf_ms:
+            return
+
+        missing = (until - last) // self.tf_ms - 1
+        logger.warning(
+            "[GAP] %d bar(s) missing after %d, backfilling via REST",
+            missing,
+            last,
+        )
+        candles = await self._fetch_range(last + self.tf_ms, until)
+        for candle in candles:
+            await self.handler(candle, backfill=True)
+        logger.info("[GAP] Backfilled %d/%d bar(s)", len(candles), missing)
+
+    async def _fetch_range(self, since: int, until: int) -> List[Dict[str, float]]:
+        """Параллельные запросы кусками по BACKFILL_CHUNK_BARS, слияние по ts."""
+        symbol = to_ccxt_linear_symbol(self.symbol)
+        chunk_ms = BACKFILL_CHUNK_BARS * self.tf_ms
+        starts = range(since, until, chunk_ms)
+        results = await asyncio.gather(
+            *(
+                rest_scheduler.call(
+                    Priority.HISTORY,
+                    "fetch_ohlcv",
+                    self.rest.fetch_ohlcv,
+                    symbol,
+                    self.timeframe,
+                    since=start,
+                    limit=min(BACKFILL_CHUNK_BARS, (until - start) // self.tf_ms),
+                )
+                for start in starts
+            ),
+            return_exceptions=True,
+        )
+
+        bars: Dict[int, list] = {}
+        for start, result in zip(starts, results):
+            if isinstance(result, BaseException):
+                logger.warning("[GAP] REST backfill from %d failed: %s", start, result)
+                continue
+            for row in result or []:
+                ts = int(row[0])
+                if since <= ts < until:
+                    bars[ts] = row
+
+        return [
+            {
+                "start_at": ts,
+                "open": float(row[1]),
+                "high": float(row[2]),
+                "low": float(row[3]),
+                "close": float(row[4]),
+                "volume": float(row[5] or 0.0),
+            }
+            for ts, row in sorted(bars.items())
+        ]
 
     async def stop(self):
         self._running = False
@@ -112,17 +571,27 @@ class DataWS:
         logger.info("WS stopped")
 
     async def _close_session(self):
-        if self._session and not self._session.closed:
+        if self._own_session and self._session and not self._session.closed:
             try:
                 await self._session.close()
             except Exception:
                 pass
         self._session = None
 
-    @staticmethod
+    @classmethod
     def _iter_confirmed_candles(
+        cls,
         payload: Any,
     ) -> Iterator[Dict[str, float]]:
+        for candle, confirmed in cls._iter_candles(payload):
+            if confirmed:
+                yield candle
+
+    @staticmethod
+    def _iter_candles(
+        payload: Any,
+    ) -> Iterator[tuple[Dict[str, float], bool]]:
+        """Все свечи сообщения с признаком confirm."""
         if isinstance(payload, Mapping):
             items: Sequence[Mapping[str, Any]] = [payload]
         elif isinstance(payload, Sequence):
@@ -133,10 +602,9 @@ class DataWS:
         for raw in items:
             if not isinstance(raw, Mapping):
                 continue
-            if not (raw.get("is_confirmed") or raw.get("confirm")):
-                continue
+            confirmed = bool(raw.get("is_confirmed") or raw.get("confirm"))
             try:
-                yield {
+                candle = {
                     "start_at": int(raw["start"]),
                     "open": float(raw["open"]),
                     "high": float(raw["high"]),
@@ -146,3 +614,4 @@ class DataWS:
                 }
             except (KeyError, TypeError, ValueError):
                 continue
+            yield candle, confirmed
@@ -0,0 +1,363 @@
+"""
+Синхронное ядро торговых решений без I/O (sans-IO).
+
+Ядро получает бары (и, в live, баланс) и возвращает намерения — Action:
+  enter  — войти по сигналу (side, price, balance);
+  exit   — закрыть позицию по трейлингу/TP (side, price, reason);
+  pause  — остановка по просадке баланса (balance, limit);
+  resume — баланс восстановился.
+
+Всё состояние решений живёт здесь: буфер баров, граф индикаторов,
+StrategyState, трейлинги, серия убытков и cooldown, стоп по просадке.
+Асинхронный слой (TradingApp) только исполняет действия: ставит ордера,
+закрывает позиции, пишет lock-файл; подтверждённые исполнения сообщает
+обратно через on_entry_filled. Replay гоняет то же ядро в простом цикле.
+Решения по сигналам (DecisionCore) общие с backtest.run_backtest и
+теневыми вариантами (ShadowBook) — порядок шагов бара задан только здесь.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Literal, Optional
+
+from core.config import IndicatorSpec, WebsocketConfig, settings
+from trade import tracing
+from trade.buffer import BarBuffer
+from trade.indicator_graph import IndicatorGraph
+from trade.strategy import StrategyState
+from trade.trailing import TrailingStopManager
+
+if TYPE_CHECKING:
+    from trade.shadow import ShadowBook
+
+logger = logging.getLogger(__name__)
+
+# узлы графа индикаторов, которые читает ядро
+STRATEGY_INDICATORS = ("ema60_5", "ema163_5", "ema1h", "rsi1d", "atr1h")
+
+ActionKind = Literal["enter", "exit", "pause", "resume"]
+
+
+@dataclass(slots=True, frozen=True)
+class Action:
+    kind: ActionKind
+    side: Optional[str] = None  # "long" / "short" для enter/exit
+    price: float = 0.0
+    reason: str = ""
+    balance: Optional[float] = None
+    limit: Optional[float] = None  # порог просадки для pause
+
+
+@dataclass(slots=True, frozen=True)
+class BarSignals:
+    ts: int
+    price: float
+    long: bool
+    short: bool
+
+
+class DecisionCore:
+    """
+    Решения по готовым сигналам бара: стоп по просадке баланса → cooldown →
+    выходы по трейлингу (серия убытков) → входы. Одна реализация на все
+    пути: live/replay (StrategyCore), backtest.run_backtest, теневые
+    варианты (ShadowBook). log=False — без журнала (бумажные прогоны).
+    """
+
+    def __init__(
+        self,
+        params: WebsocketConfig,
+        max_consecutive_losses: int = 3,
+        cooldown_bars_after_losses: int = 10,
+        log: bool = True,
+    ) -> None:
+        self.params = params
+        # бумажные прогоны (backtest, теневые варианты) — без журнала
+        self.log: Optional[logging.Logger] = logger if log else None
+        tp_pct = params.take_profit_pct or None
+        self.trailing = {
+            "long": TrailingStopManager("long", params.trailing_pct, tp_pct),
+            "short": TrailingStopManager("short", params.trailing_pct, tp_pct),
+        }
+        self.entry_prices: dict[str, float] = {"long": 0.0, "short": 0.0}
+
+        # PnL / cooldown / просадка
+        self.consecutive_losses: int = 0
+        self.max_consecutive_losses = max_consecutive_losses
+        self.cooldown_bars_after_losses = cooldown_bars_after_losses
+        self.cooldown_bars: int = 0
+        self.start_balance: float = 0.0
+        self.is_stopped_due_to_drawdown: bool = False
+
+    # ---------- сигналы -> действия ----------
+
+    def decide(self, signals: BarSignals, balance: Optional[float]) -> list[Action]:
+        """
+        balance=None — счёта нет (replay): без проверок просадки и cooldown,
+        как и раньше в dry-run.
+        """
+        price = signals.price
+        actions: list[Action] = []
+
+        if balance is not None:
+            if self.start_balance == 0.0:
+                self.start_balance = balance
+                if self.log:
+                    self.log.info("[BALANCE] Start balance: %.4f USDT", balance)
+
+            drawdown_limit = self.start_balance * (
+                1 - self.params.balance_drawdown_limit_pct
+            )
+            if balance < drawdown_limit:
+                if not self.is_stopped_due_to_drawdown:
+                    self.is_stopped_due_to_drawdown = True
+                    actions.append(
+                        Action(
+                            "pause",
+                            price=price,
+                            reason="drawdown",
+                            balance=balance,
+                            limit=drawdown_limit,
+                        )
+                    )
+                return actions
+
+            if self.is_stopped_due_to_drawdown and balance >= self.start_balance:
+                self.is_stopped_due_to_drawdown = False
+                actions.append(Action("resume", price=price, balance=balance))
+
+            if self.cooldown_bars > 0:
+                self.cooldown_bars -= 1
+                if self.log:
+                    self.log.info(
+                        "[PAUSE] Cooldown active (%d bars left)",
+                        self.cooldown_bars,
+                    )
+                return actions
+
+        # выходы раньше входов: трейлинг закрывает прежнюю позицию стороны,
+        # а не вход этого же бара (исполнители применяют действия по порядку)
+        actions.extend(self.check_trailing_stops(price))
+        if signals.long:
+            actions.append(Action("enter", "long", price, balance=balance))
+        if signals.short:
+            actions.append(Action("enter", "short", price, balance=balance))
+        return actions
+
+    # ---------- позиции ----------
+
+    def on_entry_filled(
+        self, side: str, fill_price: float, trailing: bool = True
+    ) -> None:
+        """
+        Подтверждённое исполнение входа: трейлинг от фактической цены.
+        trailing=False — выход ищется вне ядра (backtest по подбарам), ядро
+        только помнит цену входа для серии убытков (см. on_exit).
+        """
+        if trailing:
+            self.trailing[side].activate(fill_price)
+        self.entry_prices[side] = fill_price
+        if self.log:
+            self.log.info(
+                "[FILLED] %s entry at %.6f%s",
+                side,
+                fill_price,
+                ", trailing active" if trailing else "",
+            )
+
+    def check_trailing_stops(self, price: float) -> list[Action]:
+        exits: list[Action] = []
+        for side, manager in self.trailing.items():
+            if not manager.active:
+                continue
+
+            manager.update_price(price)
+            exit_reason = manager.should_exit(price)
+            if not exit_reason:
+                continue
+
+            if self.log:
+                self.log.warning(
+                    "[EXIT] Trailing stop | side=%s | price=%.6f | reason=%s",
+                    side,
+                    price,
+                    exit_reason,
+                )
+            manager.clear()
+            exits.append(Action("exit", side, price, reason=exit_reason))
+            self.on_exit(side, price)
+        return exits
+
+    def on_exit(self, side: str, price: float) -> None:
+        """Серия убытков по цене последнего входа стороны; порог — cooldown."""
+        entry_price = self.entry_prices.get(side) or 0.0
+        if entry_price <= 0:
+            return
+        pnl = (price - entry_price) if side == "long" else (entry_price - price)
+        if pnl > 0:
+            self.consecutive_losses = 0
+            return
+        self.consecutive_losses += 1
+        if self.log:
+            self.log.warning("[LOSS] Consecutive losses: %d", self.consecutive_losses)
+        if self.consecutive_losses >= self.max_consecutive_losses:
+            self.cooldown_bars = self.cooldown_bars_after_losses
+            if self.log:
+                self.log.error(
+                    "[PAUSE] Max losses reached. Skipping new trades for %d bars.",
+                    self.cooldown_bars,
+                )
+
+
+class StrategyCore(DecisionCore):
+    def __init__(
+        self,
+        base_timeframe: str,
+        params: Optional[WebsocketConfig] = None,
+        indicators: Optional[Iterable[IndicatorSpec]] = None,
+        max_consecutive_losses: int = 3,
+        cooldown_bars_after_losses: int = 10,
+        native_htf: bool = False,
+    ) -> None:
+        super().__init__(
+            params or settings.ws, max_consecutive_losses, cooldown_bars_after_losses
+        )
+        specs = list(indicators if indicators is not None else settings.indicators)
+        self.specs = specs
+        base = base_timeframe.lower()
+        # native_htf: старшие ТФ приходят своими потоками (on_htf_candle),
+        # базовый буфер нужен только на прогрев базовых индикаторов
+        self.native_htf: tuple[str, ...] = (
+            tuple(sorted({s.timeframe_for(base) for s in specs} - {base}))
+            if native_htf
+            else ()
+        )
+        self.indicators = IndicatorGraph(
+            specs,
+            base_timeframe,
+            require=STRATEGY_INDICATORS,
+            native=self.native_htf,
+        )
+        self.buffer = BarBuffer(
+            maxlen=(
+                self.indicators.warmup_bars(base)
+                if native_htf
+                else self.params.base_buffer_maxlen
+            )
+        )
+        # свечи старших ТФ, ещё не поданные в граф: tf -> start_at -> свеча
+        self._htf_pending: dict[str, dict[int, dict]] = {
+            tf: {} for tf in self.native_htf
+        }
+        self.state = StrategyState(
+            self.params.retest_pct,
+            self.params.max_bars_wait,
+            self.params.rsi_long_max,
+            self.params.rsi_short_min,
+        )
+
+        # теневые варианты параметров на том же графе (только запись);
+        # бар для них ждёт step_shadows — после исполнения основных действий
+        self.shadows: Optional["ShadowBook"] = None
+        self._shadow_bar: Optional[tuple[int, float, dict]] = None
+
+    # ---------- бар -> сигналы ----------
+
+    def on_bar(
+        self, kline: dict, values: Optional[dict[str, Optional[float]]] = None
+    ) -> Optional[BarSignals]:
+        """
+        kline в формате normalize_kline. None — бар не даёт решения
+        (повтор/старый бар, прогрев индикаторов, низкий ATR).
+        values — готовые значения индикаторов бара (FeatureSet.rows в replay):
+        граф тогда не считается.
+        """
+        if not self.buffer.add(kline):
+            if values is None and kline["start_at"] == self.buffer.last_ts:
+                # повтор последнего бара (confirm после раннего закрытия):
+                # BarBuffer уже заменил его, уточняем формирующиеся значения графа
+                self.indicators.on_bar(kline)
+            logger.debug("Duplicate/out-of-order bar %d ignored", kline["start_at"])
+            return None
+        if len(self.buffer) % 500 == 0:
+            logger.info("Replay progress: %d bars processed", len(self.buffer))
+        if self.native_htf:
+            self._apply_htf(kline["start_at"])
+
+        # граф индикаторов (5m + агрегированные HTF) — один проход на бар
+        if values is None:
+            values = self.indicators.on_bar(kline)
+        tracing.mark("indicators_done")
+        if self.shadows is not None:
+            self._shadow_bar = (kline["start_at"], float(kline["close"]), values)
+        ema60_5 = values["ema60_5"]
+        ema163_5 = values["ema163_5"]
+        if ema60_5 is None or ema163_5 is None:
+            logger.debug("Warmup EMA in progress; skip bar")
+            return None
+
+        ema1h = values["ema1h"]
+        rsi1d = values["rsi1d"]
+        if ema1h is None or rsi1d is None:
+            logger.debug("Warmup HTF (agg) in progress; skip bar")
+            return None
+
+        atr_1h = values["atr1h"]
+        min_atr = self.params.min_atr_1h
+        if min_atr is not None and (atr_1h is None or atr_1h < min_atr):
+            logger.info(
+                "[SKIP] ATR too low (%s < %s) — skipping trade",
+                atr_1h,
+                min_atr,
+            )
+            return None
+
+        price = float(kline["close"])
+        long_signal, short_signal = self.state.update(
+            kline["start_at"],
+            price,
+            price5=price,
+            ema60_5=ema60_5,
+            ema163_5=ema163_5,
+            ema1h=ema1h,
+            rsi1d=rsi1d,
+        )
+        tracing.mark("strategy_done")
+        logger.info(
+            "[SIGNAL] Long=%s | Short=%s | price=%.6f | ema1h=%.6f | rsi=%.2f",
+            long_signal,
+            short_signal,
+            price,
+            ema1h,
+            rsi1d,
+        )
+        return BarSignals(kline["start_at"], price, long_signal, short_signal)
+
+    def step_shadows(self) -> None:
+        """
+        Шаг теневых вариантов по последнему новому бару. Вызывается после
+        исполнения действий основной конфигурации (handle_kline, replay_bars),
+        чтобы варианты не стояли на пути tick-to-trade.
+        """
+        if self._shadow_bar is not None:
+            bar, self._shadow_bar = self._shadow_bar, None
+            if self.shadows is not None:
+                self.shadows.on_bar(*bar)
+
+    def on_htf_candle(self, timeframe: str, candle: dict) -> None:
+        """
+        Свеча нативного потока старшего ТФ. В граф попадает на ближайшем
+        базовом баре с start_at >= её начала — как при агрегации из базовых.
+        """
+        self._htf_pending[timeframe][int(candle["start_at"])] = candle
+
+    def _apply_htf(self, ts: int) -> None:
+        for tf, pending in self._htf_pending.items():
+            if not pending:
+                continue
+            for start in sorted(s for s in pending if s <= ts):
+                self.indicators.update_htf(tf, pending.pop(start))
+
+    def step(self, kline: dict, balance: Optional[float] = None) -> list[Action]:
+        signals = self.on_bar(kline)
+        return [] if signals is None else self.decide(signals, balance)
@@ -5,7 +5,9 @@ from typing import Optional, Dict
 import ccxt.async_support as ccxt
 
 from core.config import settings
-from trade.trailing import TrailingStopManager
+from trade import tracing
+from trade.orderbook import TopOfBook
+from trade.ratelimit import Priority, rest_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -57,15 +59,17 @@ class Executor:
             if settings.api.testnet
             else "https://api.bybit.com"
         )
+        self.api_url: str = api_url
         self.exchange = ccxt.bybit(
             {
                 "apiKey": settings.api.key,
                 "secret": settings.api.secret,
-                "enableRateLimit": True,
+                # темп запросов задаёт общий rest_scheduler (trade/ratelimit.py)
+                "enableRateLimit": False,
                 "options": {"defaultType": "linear"},  # linear USDT perps
                 "urls": {"api": {"public": api_url, "private": api_url}},
             }
-        )
+        )  # сессию подключает HttpPool.attach (общий коннектор процесса)
 
         # Sizing & risk
         self.order_percent: float = getattr(settings.ws, "order_percent", 0.4)
@@ -73,29 +77,19 @@ class Executor:
             settings.ws, "max_order_cost_usdt", None
         )
 
+        # Best bid/ask cache (fed by DataWS from orderbook.1); None -> bar price
+        self.book: Optional[TopOfBook] = (
+            TopOfBook(self.symbol_ws, settings.ws.orderbook_max_age_ms)
+            if settings.ws.orderbook_enabled
+            else None
+        )
+
         # Market filters (lazy-loaded)
         self.market: Optional[Dict] = None
         self.qty_step: float = 0.0
         self.tick_size: float = 0.0
         self.min_notional: float = 0.0
 
-        # PnL / cooldown state
-        self.consecutive_losses: int = 0
-        self.max_consecutive_losses: int = 3
-        self.entry_prices: Dict[str, float] = {"long": 0.0, "short": 0.0}
-        self.cooldown_bars: int = 0
-        self.start_balance: float = 0.0
-        self.is_stopped_due_to_drawdown: bool = False
-
-        # Trailing stops
-        tp_pct = settings.ws.take_profit_pct or None
-        self.trailing_long = TrailingStopManager(
-            "long", settings.ws.trailing_pct, tp_pct
-        )
-        self.trailing_short = TrailingStopManager(
-            "short", settings.ws.trailing_pct, tp_pct
-        )
-
         logger.info(
             "Executor initialized for %s (TESTNET=%s)",
             self.symbol_ws,
@@ -109,7 +103,9 @@ class Executor:
         if self.market is not None:
             return
 
-        markets = await self.exchange.fetch_markets()
+        markets = await rest_scheduler.call(
+            Priority.ACCOUNT, "fetch_markets", self.exchange.fetch_markets
+        )
         m = next((m for m in markets if m.get("symbol") == self.symbol_cx), None)
         if not m:
             raise RuntimeError(f"Market not found for {self.symbol_cx}")
@@ -168,25 +164,52 @@ class Executor:
             )
             return None
 
-        side = "Buy" if action == "long" else "Sell"
+        return await self.place_entry(action, qty, price)
+
+    def entry_price(self, action: str, price: float) -> float:
+        """
+        Passive PostOnly price: join the best bid (Buy) / best ask (Sell) from
+        the top-of-book cache; if it is missing or stale, one tick away from
+        the given (bar) price.
+        """
+        tick = self.tick_size or 0.0
+        quote = self.book.quote() if self.book is not None else None
+        if quote is not None:
+            bid, ask = quote
+            if action == "long":
+                return round_to_tick(bid, self.tick_size)
+            # Sell: ceil the ask to tick so the order never crosses the bid
+            lp = round_to_tick(ask, self.tick_size)
+            return lp if lp >= ask else lp + tick
 
-        # price: round to tick & make passive (PostOnly)
         lp = round_to_tick(price, self.tick_size)
-        if side == "Buy":
-            limit_price = max(self.tick_size or 0.0, lp - (self.tick_size or 0.0))
-        else:
-            limit_price = lp + (self.tick_size or 0.0)
+        if action == "long":
+            return max(tick, lp - tick)
+        return lp + tick
+
+    async def place_entry(self, action: str, qty: float, price: float):
+        """
+        Place a passive PostOnly limit (see entry_price).
+        Trailing is NOT activated here — see StrategyCore.on_entry_filled (OrderManager).
+        """
+        await self._load_market()
+        side = "Buy" if action == "long" else "Sell"
+        limit_price = self.entry_price(action, price)
 
         logger.info(
             "[ENTRY] side=%s | qty=%.6f | price=%.6f | notional=%.6f",
             side,
             qty,
             limit_price,
-            notional,
+            qty * limit_price,
         )
 
         try:
-            order = await self.exchange.create_order(
+            order = await rest_scheduler.call(
+                Priority.ENTRY,
+                "create_order",
+                tracing.traced_call,
+                self.exchange.create_order,
                 self.symbol_cx,
                 "limit",
                 side,
@@ -195,65 +218,51 @@ class Executor:
                 {"timeInForce": "PostOnly", "postOnly": True},
             )
             logger.info("Order placed: %s", order)
-
-            # activate trailing based on entry limit price
-            if action == "long":
-                self.trailing_long.activate(limit_price)
-            else:
-                self.trailing_short.activate(limit_price)
-            self.entry_prices[action] = limit_price
-
             return order
         except Exception as e:
             logger.error("Failed to place order: %s", e)
             return None
 
-    # ---------- trailing / exits ----------
-
-    async def check_trailing_stops(self, price: float) -> None:
-        """Call each bar/tick to update trailing stops and exit if needed."""
-        for manager, side in (
-            (self.trailing_long, "long"),
-            (self.trailing_short, "short"),
-        ):
-            if not manager.active:
-                continue
-
-            manager.update_price(price)
-            exit_reason = manager.should_exit(price)
-            if not exit_reason:
-                continue
+    async def fetch_order(self, order_id: str) -> Optional[Dict]:
+        try:
+            return await rest_scheduler.call(
+                Priority.ENTRY,
+                "fetch_order",
+                self.exchange.fetch_order,
+                order_id,
+                self.symbol_cx,
+                {"acknowledged": True},
+            )
+        except Exception as e:
+            logger.error("Failed to fetch order %s: %s", order_id, e)
+            return None
 
-            logger.warning(
-                "[EXIT] Trailing stop | side=%s | price=%.6f | reason=%s",
-                side,
-                price,
-                exit_reason,
+    async def cancel_order(self, order_id: str) -> bool:
+        try:
+            await rest_scheduler.call(
+                Priority.ENTRY,
+                "cancel_order",
+                self.exchange.cancel_order,
+                order_id,
+                self.symbol_cx,
             )
-            await self.close_position(side, price)
-            manager.clear()
-
-            entry_price = self.entry_prices.get(side) or 0.0
-            if entry_price > 0:
-                pnl = (price - entry_price) if side == "long" else (entry_price - price)
-                if pnl > 0:
-                    self.consecutive_losses = 0
-                else:
-                    self.consecutive_losses += 1
-                    logger.warning(
-                        "[LOSS] Consecutive losses: %d", self.consecutive_losses
-                    )
-                    if self.consecutive_losses >= self.max_consecutive_losses:
-                        self.cooldown_bars = 10
-                        logger.error(
-                            "[PAUSE] Max losses reached. Skipping new trades for 10 bars."
-                        )
+            return True
+        except Exception as e:
+            logger.error("Failed to cancel order %s: %s", order_id, e)
+            return False
+
+    # ---------- exits ----------
 
     async def close_position(self, side: str, price: float) -> None:
         """Close an open position on the given side using a reduceOnly market order."""
         await self._load_market()
         try:
-            positions = await self.exchange.fetch_positions([self.symbol_cx])
+            positions = await rest_scheduler.call(
+                Priority.EXIT,
+                "fetch_positions",
+                self.exchange.fetch_positions,
+                [self.symbol_cx],
+            )
             pos = None
 
             # Prefer explicit side match if available
@@ -286,7 +295,11 @@ class Executor:
                 "Closing %s position: qty=%.6f at market (reduceOnly)", side, qty
             )
 
-            await self.exchange.create_market_order(
+            await rest_scheduler.call(
+                Priority.EXIT,
+                "create_market_order",
+                tracing.traced_call,
+                self.exchange.create_market_order,
                 self.symbol_cx,
                 close_side,
                 qty,
@@ -0,0 +1,373 @@
+"""
+Персистентное хранилище рядов индикаторов для replay, batch и walk-forward.
+
+Запись — ряд одного индикатора на одной истории:
+
+  <root>/<SYMBOL>_<tf>/<name>-<digest>/values.f8 + meta.json
+
+digest — от параметров спецификации (kind, timeframe, window) и ts первого
+бара; meta.json хранит число баров, content hash истории (ts,o,h,l,c
+построчно, sha1) и IndicatorSeed для дозаписи. values.f8 — сырой float64,
+открывается через np.memmap при первом обращении к колонке (FeatureSet).
+
+load() на тех же барах ничего не считает. Если бары продолжают
+сохранённые (хэш префикса совпал), ряд дописывается: compute_indicator
+пересчитывает только хвост с seed.start — последний, возможно ещё
+формировавшийся HTF-бар, — и файл переписывается с этого места.
+Иначе ряд считается заново. Значения совпадают с IndicatorGraph бит в бит.
+load_chunks() делает то же по истории кусками (replay, batch): хэш и расчёт
+идут потоково, вся история в память не собирается.
+
+Диск ограничен budget_bytes: после load самые давно использованные записи
+(mtime meta.json, обновляется при каждом обращении) удаляются, пока размер
+не уложится в бюджет. Записи, тронутые последние grace_s секунд, не
+трогаются — их могут читать параллельные процессы batch.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from core.config import FeatureStoreConfig, IndicatorSpec
+from trade.features import IndicatorSeed, compute_indicator
+
+logger = logging.getLogger(__name__)
+
+_ROW = np.dtype([("ts", "<i8"), ("o", "<f8"), ("h", "<f8"), ("l", "<f8"), ("c", "<f8")])
+_VALUES = "values.f8"
+_META = "meta.json"
+
+
+class FeatureSet(Mapping):
+    """Ряды индикаторов по имени; файл открывается при первом обращении."""
+
+    def __init__(self, paths: Mapping[str, Path], bars: int) -> None:
+        self.paths = dict(paths)
+        self.bars = bars
+        self._open: dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        arr = self._open.get(name)
+        if arr is None:
+            path = self.paths[name]  # KeyError для неизвестных имён
+            arr = (
+                np.memmap(path, dtype="<f8", mode="r", shape=(self.bars,))
+                if self.bars
+                else np.empty(0)
+            )
+            self._open[name] = arr
+        return arr
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # в воркеры уходят пути, а не содержимое
+        return FeatureSet, (self.paths, self.bars)
+
+    def rows(
+        self, start: int, stop: int, block: int = 65_536
+    ) -> Iterator[dict[str, Optional[float]]]:
+        """
+        Значения баров [start, stop) в формате IndicatorGraph.on_bar; колонки
+        читаются блоками по block баров.
+        """
+        names = list(self.paths)
+        for lo in range(start, stop, block):
+            hi = min(lo + block, stop)
+            columns = [np.asarray(self[name][lo:hi]).tolist() for name in names]
+            for values in zip(*columns):
+                yield {name: (None if v != v else v) for name, v in zip(names, values)}
+
+
+class FeatureStore:
+    def __init__(
+        self,
+        root: Union[str, Path],
+        budget_bytes: Optional[int] = None,
+        grace_s: float = 300.0,
+    ) -> None:
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self.grace_s = grace_s
+
+    @classmethod
+    def from_config(cls, cfg: FeatureStoreConfig) -> "FeatureStore":
+        return cls(cfg.dir, budget_bytes=int(cfg.budget_mb * 2**20))
+
+    def entry_dir(
+        self, symbol: str, timeframe: str, spec: IndicatorSpec, first_ts: int
+    ) -> Path:
+        key = json.dumps(
+            {
+                "kind": spec.kind,
+                "timeframe": spec.timeframe,
+                "window": spec.window,
+                "first_ts": first_ts,
+            },
+            sort_keys=True,
+        )
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        return self.root / f"{symbol}_{timeframe}" / f"{spec.name}-{digest}"
+
+    def load(
+        self,
+        symbol: str,
+        timeframe: str,
+        bars: Mapping[str, Any],
+        specs: Iterable[IndicatorSpec],
+    ) -> FeatureSet:
+        """
+        Ряды specs на барах ['ts','o','h','l','c'] (ts строго по возрастанию):
+        готовые, дописанные или посчитанные заново.
+        """
+        return self.load_chunks(symbol, timeframe, lambda: (bars,), specs)
+
+    def load_chunks(
+        self,
+        symbol: str,
+        timeframe: str,
+        chunks: Callable[[], Iterable[Mapping[str, Any]]],
+        specs: Iterable[IndicatorSpec],
+    ) -> FeatureSet:
+        """
+        То же, что load, по истории кусками: chunks() каждый раз заново
+        отдаёт куски по порядку (например, OHLCVFileSource.iter_chunks).
+        Первый проход считает хэши, второй — только при промахе — считает
+        ряды по кускам, продолжая каждый от IndicatorSeed прошлого куска.
+        В памяти одновременно один кусок, а не вся история.
+        """
+        specs = list(specs)
+        digest = hashlib.sha1()
+        hashes: dict[int, str] = {}
+        marks: list[int] = []
+        entries: dict[str, Path] = {}
+        metas: dict[str, Optional[dict[str, Any]]] = {}
+        first_ts: Optional[int] = None
+        last_ts: Optional[int] = None
+        n = 0
+        for chunk in chunks():
+            records = _records(chunk)
+            if not len(records):
+                continue
+            ts = records["ts"]
+            if (last_ts is not None and ts[0] <= last_ts) or np.any(np.diff(ts) <= 0):
+                raise ValueError("Feature store: ts баров не возрастают строго")
+            if first_ts is None:
+                first_ts = int(ts[0])
+                entries = {
+                    spec.name: self.entry_dir(symbol, timeframe, spec, first_ts)
+                    for spec in specs
+                }
+                metas = {name: _read_meta(path) for name, path in entries.items()}
+                marks = sorted({m["bars"] for m in metas.values() if m})
+            # хэши префиксов длиной bars сохранённых записей — за один проход
+            done = 0
+            while marks and marks[0] <= n + len(records):
+                size = marks.pop(0)
+                digest.update(records[done : size - n].tobytes())
+                done = size - n
+                hashes[size] = digest.hexdigest()
+            digest.update(records[done:].tobytes())
+            n += len(records)
+            last_ts = int(ts[-1])
+        if first_ts is None:
+            raise ValueError("Feature store: пустая история")
+        hashes[n] = digest.hexdigest()
+
+        hit = extended = computed = appended = 0
+        pending: list[_Series] = []
+        for spec in specs:
+            path, meta = entries[spec.name], metas[spec.name]
+            if meta and meta["bars"] == n and meta["content_hash"] == hashes[n]:
+                os.utime(path / _META)
+                hit += 1
+                continue
+
+            seed = None
+            if (
+                meta
+                and meta["bars"] < n
+                and meta["content_hash"] == hashes.get(meta["bars"])
+            ):
+                seed = IndicatorSeed(
+                    **{**meta["seed"], "state": tuple(meta["seed"]["state"])}
+                )
+                if seed.groups <= spec.window:
+                    seed = None  # прогрев: дешевле посчитать заново
+            if seed is not None:
+                extended += 1
+                appended += n - meta["bars"]
+            else:
+                computed += 1
+            pending.append(_Series(spec, path, seed))
+
+        if pending:
+            offset = 0
+            for chunk in chunks():
+                records = _records(chunk)
+                for series in pending:
+                    series.feed(offset, records)
+                offset += len(records)
+            for series in pending:
+                _write_meta(
+                    series.path,
+                    {
+                        "symbol": symbol,
+                        "timeframe": timeframe,
+                        "spec": series.spec.model_dump(),
+                        "first_ts": first_ts,
+                        "bars": n,
+                        "content_hash": hashes[n],
+                        "seed": asdict(series.close(n)),
+                        "updated": datetime.now(timezone.utc).isoformat(),
+                    },
+                )
+
+        logger.info(
+            "[FEATURES] %s %s, %d bars: %d cached, %d extended (+%d bars), "
+            "%d computed",
+            symbol,
+            timeframe,
+            n,
+            hit,
+            extended,
+            appended,
+            computed,
+        )
+        self.evict(keep=entries.values())
+        return FeatureSet({name: path / _VALUES for name, path in entries.items()}, n)
+
+    def evict(self, keep: Iterable[Path] = ()) -> int:
+        """Удаляет давно не использованные записи сверх бюджета; число удалённых."""
+        if self.budget_bytes is None:
+            return 0
+        keep = {Path(p) for p in keep}
+        entries = []
+        total = 0
+        for meta in self.root.glob(f"*/*/{_META}"):
+            entry = meta.parent
+            try:
+                used = meta.stat().st_mtime
+                size = sum(f.stat().st_size for f in entry.iterdir())
+            except FileNotFoundError:
+                continue  # удалена параллельным процессом
+            entries.append((used, size, entry))
+            total += size
+        if total <= self.budget_bytes:
+            return 0
+
+        now = time.time()
+        evicted = 0
+        for used, size, entry in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if entry in keep or now - used < self.grace_s:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            evicted += 1
+        log = logger.warning if total > self.budget_bytes else logger.info
+        log(
+            "[FEATURES] evicted %d entries, %.1f MB of %.1f MB budget in use",
+            evicted,
+            total / 2**20,
+            self.budget_bytes / 2**20,
+        )
+        return evicted
+
+
+class _Series:
+    """
+    Ряд одного индикатора, считаемый по кускам истории. Хвост с seed.start
+    (последний, возможно формирующийся HTF-бар) переходит в следующий кусок
+    и пересчитывается вместе с ним; файл переписывается с этого бара.
+    Пока ряд прогревается (seed.groups <= window), кусок копится целиком.
+    """
+
+    def __init__(
+        self, spec: IndicatorSpec, path: Path, seed: Optional[IndicatorSeed]
+    ) -> None:
+        self.spec = spec
+        self.path = path
+        self.seed = seed  # None — ряд с первого бара истории
+        self.next_seed: Optional[IndicatorSeed] = None
+        self.start = seed.start if seed is not None else 0
+        self.tail = np.empty(0, dtype=_ROW)  # бары [start, конец прошлого куска)
+        self.tmp = path / f"{_VALUES}.tmp"
+        if seed is not None:
+            # копия, а не правка на месте: открытые memmap читают старый inode
+            shutil.copyfile(path / _VALUES, self.tmp)
+            self.file = open(self.tmp, "r+b")
+        else:
+            path.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.tmp, "wb")
+
+    def feed(self, offset: int, records: np.ndarray) -> None:
+        """Кусок истории с абсолютного бара offset."""
+        end = offset + len(records)
+        if end <= self.start:
+            return
+        bars = records[max(self.start - offset, 0) :]
+        if len(self.tail):
+            bars = np.concatenate([self.tail, bars])
+        values, seed = compute_indicator(
+            bars["ts"],
+            np.ascontiguousarray(bars["h"]),
+            np.ascontiguousarray(bars["l"]),
+            np.ascontiguousarray(bars["c"]),
+            self.spec,
+            self.seed,
+        )
+        self.file.seek(self.start * 8)
+        self.file.write(values.astype("<f8").tobytes())
+        self.next_seed = seed
+        if seed.groups > self.spec.window:
+            self.tail = bars[seed.start - self.start :]
+            self.seed, self.start = seed, seed.start
+        else:
+            self.tail = bars
+
+    def close(self, bars: int) -> IndicatorSeed:
+        self.file.truncate(bars * 8)
+        self.file.close()
+        os.replace(self.tmp, self.path / _VALUES)
+        return self.next_seed
+
+
+def _records(bars: Mapping[str, Any]) -> np.ndarray:
+    """Бары ['ts','o','h','l','c'] -> строки _ROW (они же идут в content hash)."""
+    records = np.empty(len(bars["ts"]), dtype=_ROW)
+    records["ts"] = np.asarray(bars["ts"], dtype=np.int64)
+    for col in ("o", "h", "l", "c"):
+        records[col] = np.asarray(bars[col], dtype=float)
+    return records
+
+
+def _read_meta(path: Path) -> Optional[dict[str, Any]]:
+    try:
+        meta = json.loads((path / _META).read_text())
+        size = (path / _VALUES).stat().st_size
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    # запись прервалась между values и meta — запись недействительна
+    return meta if size == meta["bars"] * 8 else None
+
+
+def _write_meta(path: Path, meta: dict[str, Any]) -> None:
+    tmp = path / f"{_META}.tmp"
+    tmp.write_text(json.dumps(meta, indent=2) + "\n")
+    os.replace(tmp, path / _META)
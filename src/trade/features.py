@@ -0,0 +1,336 @@
+"""
+Векторный расчёт индикаторов стратегии сразу по всей истории.
+
+На каждом 5m баре ``TradingApp.handle_kline`` пересчитывает EMA60/163@5m,
+агрегирует буфер в 1h/1d (последний час/день при этом ещё формируется)
+и считает EMA60@1h, RSI14@1d и ATR14@1h. Здесь те же значения получаются
+за один проход по массивам: по закрытым часам/дням индикатор считается
+один раз, а вклад формирующегося бара добавляется одной рекуррентной
+формулой — ровно той, что использует pandas ``ewm(adjust=False)``.
+
+Результат совпадает с ``handle_kline`` при буфере, вмещающем всю историю
+(``base_buffer_maxlen=None``); при усечённом буфере отличия только в
+прогреве.
+
+compute_indicator считает так же ряд произвольной IndicatorSpec и умеет
+продолжать его с IndicatorSeed — с начала последнего HTF-бара, без прохода
+по всей истории (дозапись в feature_store.py).
+"""
+
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import IndicatorSpec
+from trade.utils import tf_to_ms
+
+EMA_FAST_WINDOW = 60
+EMA_SLOW_WINDOW = 163
+EMA_HTF_WINDOW = 60
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+
+FEATURE_COLUMNS = ("ts", "c", "ema60_5", "ema163_5", "ema1h", "rsi1d", "atr1h")
+
+
+def _ewm_alpha(com: float) -> float:
+    # pandas переводит span/alpha в center of mass и обратно — повторяем
+    return 1.0 / (1.0 + com)
+
+
+def _ewm_step(prev: np.ndarray, cur: np.ndarray, alpha: float) -> np.ndarray:
+    """Один шаг ``ewm(adjust=False).mean()`` в той же арифметике, что и pandas."""
+    old_wt = 1.0 - alpha
+    with np.errstate(invalid="ignore"):
+        stepped = (old_wt * prev + alpha * cur) / (old_wt + alpha)
+    return np.where(prev == cur, prev, stepped)
+
+
+def _group_bars(ts: np.ndarray, period_ms: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Номер HTF-бара (часа/дня) для каждого базового бара и маска
+    «последний базовый бар в своём HTF-баре». Пустые периоды пропускаются,
+    как и в ``aggregate_ohlcv`` (resample + dropna).
+    """
+    key = ts // period_ms
+    first = np.empty(len(ts), dtype=bool)
+    first[0] = True
+    first[1:] = key[1:] != key[:-1]
+    last = np.empty(len(ts), dtype=bool)
+    last[:-1] = first[1:]
+    last[-1] = True
+    return np.cumsum(first) - 1, last
+
+
+@dataclass(slots=True, frozen=True)
+class IndicatorSeed:
+    """
+    Точка продолжения ряда (см. compute_indicator). Последний HTF-бар ряда мог
+    ещё формироваться, поэтому дозапись пересчитывает его целиком: с бара
+    start, которому предшествуют groups закрытых HTF-баров. prev_close и
+    state — close и состояние закрытого ряда на последнем из них:
+    ema — (ema,), rsi — (emaup, emadn), atr — (atr,).
+    """
+
+    start: int
+    groups: int
+    prev_close: float
+    state: tuple[float, ...]
+
+
+def _seed_at(
+    base: int,
+    gid: np.ndarray,
+    offset: int,
+    prev_close: np.ndarray,
+    *state: np.ndarray,
+) -> IndicatorSeed:
+    """Seed на начале последнего HTF-бара; prev_* — массивы «значение до группы»."""
+    last_group = int(gid[-1])
+    return IndicatorSeed(
+        start=base + int(np.searchsorted(gid, last_group)),
+        groups=offset + last_group,
+        prev_close=float(prev_close[last_group]),
+        state=tuple(float(arr[last_group]) for arr in state),
+    )
+
+
+def _ema_series(
+    close: np.ndarray,
+    gid: np.ndarray,
+    last: np.ndarray,
+    window: int,
+    seed: Optional[IndicatorSeed] = None,
+) -> tuple[np.ndarray, IndicatorSeed]:
+    alpha = _ewm_alpha((window - 1) / 2)
+    closes = close[last]
+    if seed is None:
+        closed = pd.Series(closes).ewm(span=window, adjust=False).mean().to_numpy()
+        prev = np.r_[np.nan, closed]
+    else:
+        # ewm(adjust=False) хранит только последнее значение: продолжаем от него
+        prev = (
+            pd.Series(np.r_[seed.state[0], closes])
+            .ewm(span=window, adjust=False)
+            .mean()
+            .to_numpy()
+        )
+    offset = seed.groups if seed is not None else 0
+    out = _ewm_step(prev[gid], close, alpha)
+    if seed is None:
+        out[gid == 0] = close[gid == 0]
+    out[gid + offset + 1 < window] = np.nan
+    head_close = seed.prev_close if seed is not None else np.nan
+    return out, _seed_at(
+        seed.start if seed is not None else 0,
+        gid,
+        offset,
+        np.r_[head_close, closes],
+        prev,
+    )
+
+
+def _rsi_series(
+    close: np.ndarray,
+    gid: np.ndarray,
+    last: np.ndarray,
+    window: int,
+    seed: Optional[IndicatorSeed] = None,
+) -> tuple[np.ndarray, IndicatorSeed]:
+    alpha = _ewm_alpha((1 - 1 / window) / (1 / window))
+    closes = close[last]
+    if seed is None:
+        diff = pd.Series(closes).diff(1)
+        up = diff.where(diff > 0, 0.0)
+        dn = -diff.where(diff < 0, 0.0)
+        head = (np.nan, np.nan, np.nan)
+    else:
+        diff = pd.Series(np.r_[seed.prev_close, closes]).diff(1)
+        # первый элемент — состояние ewm на последнем закрытом баре
+        up = diff.where(diff > 0, 0.0)
+        dn = -diff.where(diff < 0, 0.0)
+        up.iloc[0], dn.iloc[0] = seed.state
+        head = ()
+    up_closed = up.ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+    dn_closed = dn.ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+    if seed is None:
+        prev_close = np.r_[head[0], closes]
+        prev_up = np.r_[head[1], up_closed]
+        prev_dn = np.r_[head[2], dn_closed]
+    else:
+        prev_close = np.r_[seed.prev_close, closes]
+        prev_up, prev_dn = up_closed, dn_closed
+
+    cur_diff = close - prev_close[gid]
+    cur_up = np.where(cur_diff > 0, cur_diff, 0.0)
+    cur_dn = -np.where(cur_diff < 0, cur_diff, 0.0)
+
+    emaup = _ewm_step(prev_up[gid], cur_up, alpha)
+    emadn = _ewm_step(prev_dn[gid], cur_dn, alpha)
+    offset = seed.groups if seed is not None else 0
+    if seed is None:
+        first = gid == 0
+        emaup[first] = 0.0
+        emadn[first] = 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(emadn == 0, 100.0, 100 - (100 / (1 + emaup / emadn)))
+    rsi[gid + offset + 1 < window] = np.nan
+    return rsi, _seed_at(
+        seed.start if seed is not None else 0,
+        gid,
+        offset,
+        prev_close,
+        prev_up,
+        prev_dn,
+    )
+
+
+def _atr_series(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    gid: np.ndarray,
+    last: np.ndarray,
+    window: int,
+    seed: Optional[IndicatorSeed] = None,
+) -> tuple[np.ndarray, IndicatorSeed]:
+    # high/low формирующегося бара — накопленные max/min внутри периода
+    run_high = pd.Series(high).groupby(gid).cummax().to_numpy()
+    run_low = pd.Series(low).groupby(gid).cummin().to_numpy()
+
+    closed_close = close[last]
+    closed_high = run_high[last]
+    closed_low = run_low[last]
+
+    head_close = seed.prev_close if seed is not None else np.nan
+    prev_close_closed = np.r_[head_close, closed_close[:-1]]
+    tr_closed = np.fmax(
+        closed_high - closed_low,
+        np.fmax(
+            np.abs(closed_high - prev_close_closed),
+            np.abs(closed_low - prev_close_closed),
+        ),
+    )
+    if seed is None:
+        atr_closed = np.zeros(len(tr_closed))
+        if len(tr_closed) >= window:
+            atr_closed[window - 1] = tr_closed[0:window].mean()
+            for i in range(window, len(tr_closed)):
+                atr_closed[i] = (
+                    atr_closed[i - 1] * (window - 1) + tr_closed[i]
+                ) / float(window)
+        prev_atr = np.r_[np.nan, atr_closed]
+    else:
+        # seed ставится после прогрева (groups > window): только рекурсия
+        prev_atr = np.empty(len(tr_closed) + 1)
+        prev_atr[0] = seed.state[0]
+        for i in range(len(tr_closed)):
+            prev_atr[i + 1] = (prev_atr[i] * (window - 1) + tr_closed[i]) / float(
+                window
+            )
+
+    prev_close = np.r_[head_close, closed_close]
+    pc = prev_close[gid]
+    tr = np.fmax(
+        run_high - run_low,
+        np.fmax(np.abs(run_high - pc), np.abs(run_low - pc)),
+    )
+    offset = seed.groups if seed is not None else 0
+    atr = (prev_atr[gid] * (window - 1) + tr) / float(window)
+    atr[gid + offset + 1 < window + 1] = np.nan
+    atr[atr <= 1e-9] = np.nan
+    return atr, _seed_at(
+        seed.start if seed is not None else 0,
+        gid,
+        offset,
+        prev_close,
+        prev_atr,
+    )
+
+
+def compute_indicator(
+    ts: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    spec: IndicatorSpec,
+    seed: Optional[IndicatorSeed] = None,
+) -> tuple[np.ndarray, IndicatorSeed]:
+    """
+    Ряд индикатора spec на каждом базовом баре — те же значения, что даёт
+    IndicatorGraph. С seed массивы начинаются с бара seed.start прежнего ряда
+    (дозапись): возвращаются значения с этого бара и seed для следующей.
+    """
+    # "base": каждый базовый бар — свой HTF-бар (ts строго возрастают)
+    period_ms = 1 if spec.timeframe == "base" else tf_to_ms(spec.timeframe)
+    gid, last = _group_bars(ts, period_ms)
+    if spec.kind == "ema":
+        return _ema_series(close, gid, last, spec.window, seed)
+    if spec.kind == "rsi":
+        return _rsi_series(close, gid, last, spec.window, seed)
+    if spec.kind == "atr":
+        return _atr_series(high, low, close, gid, last, spec.window, seed)
+    raise ValueError(f"unknown indicator kind: {spec.kind}")
+
+
+def compute_features(df_base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Индикаторы стратегии на каждом баре базового ТФ.
+    df_base: ['ts','o','h','l','c','v'], ts в мс (UTC), по возрастанию.
+    Возвращает колонки FEATURE_COLUMNS; NaN — прогрев (бар пропускается).
+    """
+    if df_base is None or df_base.empty:
+        return pd.DataFrame(columns=list(FEATURE_COLUMNS))
+
+    ts = df_base["ts"].to_numpy(dtype=np.int64)
+    high = pd.to_numeric(df_base["h"], errors="coerce").to_numpy(dtype=float)
+    low = pd.to_numeric(df_base["l"], errors="coerce").to_numpy(dtype=float)
+    c = pd.to_numeric(df_base["c"], errors="coerce")
+    close = c.to_numpy(dtype=float)
+
+    hour_gid, hour_last = _group_bars(ts, HOUR_MS)
+    day_gid, day_last = _group_bars(ts, DAY_MS)
+
+    return pd.DataFrame(
+        {
+            "ts": ts,
+            "c": close,
+            "ema60_5": c.ewm(
+                span=EMA_FAST_WINDOW, min_periods=EMA_FAST_WINDOW, adjust=False
+            )
+            .mean()
+            .to_numpy(),
+            "ema163_5": c.ewm(
+                span=EMA_SLOW_WINDOW, min_periods=EMA_SLOW_WINDOW, adjust=False
+            )
+            .mean()
+            .to_numpy(),
+            "ema1h": _ema_series(close, hour_gid, hour_last, EMA_HTF_WINDOW)[0],
+            "rsi1d": _rsi_series(close, day_gid, day_last, RSI_WINDOW)[0],
+            "atr1h": _atr_series(high, low, close, hour_gid, hour_last, ATR_WINDOW)[0],
+        }
+    )
+
+
+def tradable_mask(
+    features: Mapping[str, Any],
+    min_atr_1h: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Бары, на которых handle_kline доходит до StrategyState (прогрев и ATR-фильтр).
+    features: DataFrame из compute_features или словарь массивов с теми же ключами.
+    """
+    mask = np.ones(len(features["ts"]), dtype=bool)
+    for col in ("ema60_5", "ema163_5", "ema1h", "rsi1d"):
+        mask &= ~np.isnan(np.asarray(features[col], dtype=float))
+    if min_atr_1h is not None:
+        atr = np.asarray(features["atr1h"], dtype=float)
+        with np.errstate(invalid="ignore"):
+            mask &= ~np.isnan(atr) & (atr >= min_atr_1h)
+    return mask
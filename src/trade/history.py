@@ -0,0 +1,172 @@
+"""
+Потоковое чтение локальной истории OHLCV кусками фиксированного размера.
+
+Форматы (по расширению файла):
+  .csv      — колонки ts,o,h,l,c,v (или start_at/open/high/low/close/volume);
+  .parquet  — то же, нужен pyarrow;
+  .bin      — сырые записи OHLCV_DTYPE (см. write_binary), читаются через memmap,
+              диапазон дат ищется бинарным поиском.
+
+Файлы должны быть отсортированы по ts. В памяти одновременно держится
+не больше одного куска, так что длина истории на расход памяти не влияет.
+"""
+
+import heapq
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ["ts", "o", "h", "l", "c", "v"]
+OHLCV_DTYPE = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("o", "<f8"),
+        ("h", "<f8"),
+        ("l", "<f8"),
+        ("c", "<f8"),
+        ("v", "<f8"),
+    ]
+)
+
+_RENAME = {
+    "start_at": "ts",
+    "timestamp": "ts",
+    "open": "o",
+    "high": "h",
+    "low": "l",
+    "close": "c",
+    "volume": "v",
+}
+
+TimeLike = Union[int, datetime, None]
+
+
+def to_ms(value: TimeLike) -> Optional[int]:
+    """datetime (naive = UTC) или мс -> мс."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+def write_binary(df: pd.DataFrame, path: Union[str, Path]) -> None:
+    """Сохраняет ['ts','o','h','l','c','v'] в формате .bin (дописывает в конец)."""
+    records = np.empty(len(df), dtype=OHLCV_DTYPE)
+    for col in OHLCV_COLUMNS:
+        records[col] = df[col].to_numpy()
+    with open(path, "ab") as f:
+        records.tofile(f)
+
+
+class OHLCVFileSource:
+    """
+    Источник истории из каталога data_dir; имя файла строится по шаблону
+    path_template с полями {symbol} и {timeframe}, например "{symbol}_{timeframe}.bin".
+    """
+
+    def __init__(
+        self,
+        data_dir: Union[str, Path],
+        path_template: str = "{symbol}_{timeframe}.csv",
+        chunk_bars: int = 100_000,
+    ) -> None:
+        self.data_dir = Path(data_dir)
+        self.path_template = path_template
+        self.chunk_bars = chunk_bars
+
+    def path_for(self, symbol: str, timeframe: str) -> Path:
+        return self.data_dir / self.path_template.format(
+            symbol=symbol.upper(), timeframe=timeframe
+        )
+
+    def iter_chunks(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Куски ['ts','o','h','l','c','v'] с ts в [start, end)."""
+        path = self.path_for(symbol, timeframe)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        start_ms, end_ms = to_ms(start), to_ms(end)
+
+        suffix = path.suffix.lower()
+        if suffix == ".bin":
+            yield from self._iter_binary(path, start_ms, end_ms)
+            return
+        if suffix == ".parquet":
+            raw = self._iter_parquet(path)
+        else:
+            raw = pd.read_csv(path, chunksize=self.chunk_bars)
+
+        for chunk in raw:
+            chunk = chunk.rename(columns=_RENAME)[OHLCV_COLUMNS]
+            ts = chunk["ts"]
+            if end_ms is not None and len(chunk) and ts.iat[0] >= end_ms:
+                break
+            mask = np.ones(len(chunk), dtype=bool)
+            if start_ms is not None:
+                mask &= (ts >= start_ms).to_numpy()
+            if end_ms is not None:
+                mask &= (ts < end_ms).to_numpy()
+            if mask.any():
+                yield chunk[mask].reset_index(drop=True)
+
+    def _iter_parquet(self, path: Path) -> Iterator[pd.DataFrame]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as err:  # опциональная зависимость
+            raise RuntimeError("Parquet replay requires pyarrow") from err
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunk_bars):
+            yield batch.to_pandas()
+
+    def _iter_binary(
+        self,
+        path: Path,
+        start_ms: Optional[int],
+        end_ms: Optional[int],
+    ) -> Iterator[pd.DataFrame]:
+        records = np.memmap(path, dtype=OHLCV_DTYPE, mode="r")
+        ts = records["ts"]
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, "left"))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, "left"))
+        for offset in range(lo, hi, self.chunk_bars):
+            part = np.array(records[offset : min(offset + self.chunk_bars, hi)])
+            yield pd.DataFrame({col: part[col] for col in OHLCV_COLUMNS})
+
+    def iter_klines(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> Iterator[dict]:
+        """Бары по одному в формате handle_kline ({ts,o,h,l,c,v})."""
+        for chunk in self.iter_chunks(symbol, timeframe, start, end):
+            for ts, o, h, l, c, v in chunk.itertuples(index=False, name=None):
+                yield {"ts": ts, "o": o, "h": h, "l": l, "c": c, "v": v}
+
+    def iter_klines_multi(
+        self,
+        symbols: Iterable[str],
+        timeframe: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> Iterator[tuple[str, dict]]:
+        """Несколько символов, слитые по ts: (symbol, kline) по возрастанию времени."""
+
+        def tagged(symbol: str) -> Iterator[tuple[int, str, dict]]:
+            for kline in self.iter_klines(symbol, timeframe, start, end):
+                yield kline["ts"], symbol, kline
+
+        streams = [tagged(symbol) for symbol in symbols]
+        for _, symbol, kline in heapq.merge(*streams, key=lambda item: item[0]):
+            yield symbol, kline
@@ -0,0 +1,379 @@
+"""
+Декларативный граф индикаторов (список IndicatorSpec из core/config.py).
+
+Узлы:
+  bars@tf  — агрегация базовых баров в tf: закрытые бары + формирующийся;
+  tr@tf    — true range поверх bars@tf, общий для всех ATR этого tf;
+  <name>   — EMA/RSI/ATR из спецификации.
+
+Таймфреймы из native (режим ws.native_htf_enabled) не собираются из базовых
+баров: их bars@tf питает update_htf() свечами нативных потоков биржи
+(kline.60 / kline.D), закрытые и формирующиеся.
+
+Граф считается раз в бар в топологическом порядке; узел пересчитывается,
+только если у какой-то из его зависимостей сменилась версия. Внутри узла
+состояние по закрытым барам обновляется лишь при закрытии HTF-бара, а вклад
+формирующегося бара — одна рекуррентная формула. Значения совпадают с
+pandas/ta на полной истории (как в features.compute_features).
+"""
+
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from core.config import IndicatorSpec
+from trade.utils import tf_to_ms
+
+Bar = tuple[int, float, float, float, float]  # ts, o, h, l, c
+
+
+def _ewm_alpha(com: float) -> float:
+    # как pandas: span/alpha -> center of mass -> alpha
+    return 1.0 / (1.0 + com)
+
+
+def _ewm_step(prev: float, cur: float, alpha: float) -> float:
+    """Один шаг ``ewm(adjust=False).mean()`` в арифметике pandas."""
+    if prev == cur:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * cur) / (old_wt + alpha)
+
+
+class Node(ABC):
+    name: str = ""
+    deps: tuple["Node", ...] = ()
+
+    def __init__(self) -> None:
+        self.version: int = 0
+        self._seen: tuple[int, ...] = ()
+
+    def changed_inputs(self) -> bool:
+        seen = tuple(dep.version for dep in self.deps)
+        if seen == self._seen:
+            return False
+        self._seen = seen
+        return True
+
+    @abstractmethod
+    def evaluate(self) -> None: ...
+
+    @property
+    def value(self) -> Optional[float]:
+        return None
+
+
+class BarsNode(Node):
+    """Базовые бары, собранные в tf. Пустые периоды пропускаются."""
+
+    def __init__(self, timeframe: str) -> None:
+        super().__init__()
+        self.name = f"bars@{timeframe}"
+        self.tf_ms = tf_to_ms(timeframe)
+        self.closed: Optional[Bar] = None  # последний закрытый бар
+        self.closed_count: int = 0
+        self.closed_version: int = 0
+        self.forming: Optional[Bar] = None
+
+    @property
+    def count(self) -> int:
+        return self.closed_count + (self.forming is not None)
+
+    def push(self, ts: int, o: float, h: float, l: float, c: float) -> None:
+        start = ts // self.tf_ms * self.tf_ms
+        f = self.forming
+        if f is not None and f[0] == start:
+            self.forming = (start, f[1], max(f[2], h), min(f[3], l), c)
+        else:
+            if f is not None:
+                self.closed = f
+                self.closed_count += 1
+                self.closed_version += 1
+            self.forming = (start, o, h, l, c)
+        self.version += 1
+
+    def evaluate(self) -> None:
+        pass
+
+
+class _ClosedAware(Node):
+    """Узел поверх bars@tf: отделяет обновление по закрытому бару от частичного."""
+
+    bars: BarsNode
+
+    def __init__(self, bars: BarsNode) -> None:
+        super().__init__()
+        self.bars = bars
+        self._closed_seen: int = 0
+
+    def evaluate(self) -> None:
+        if self.bars.closed_version != self._closed_seen:
+            self._closed_seen = self.bars.closed_version
+            self.on_closed(self.bars.closed)
+        self.on_forming(self.bars.forming)
+        self.version += 1
+
+    @abstractmethod
+    def on_closed(self, bar: Bar) -> None: ...
+
+    @abstractmethod
+    def on_forming(self, bar: Optional[Bar]) -> None: ...
+
+
+class TrueRangeNode(_ClosedAware):
+    def __init__(self, bars: BarsNode) -> None:
+        super().__init__(bars)
+        self.name = f"tr@{bars.name.split('@', 1)[1]}"
+        self.deps = (bars,)
+        self.closed_tr: Optional[float] = None
+        self.forming_tr: Optional[float] = None
+        self._prev_close: Optional[float] = None  # close предыдущего закрытого
+
+    @staticmethod
+    def _tr(bar: Bar, prev_close: Optional[float]) -> float:
+        _, _, h, l, _ = bar
+        if prev_close is None:
+            return h - l
+        return max(h - l, abs(h - prev_close), abs(l - prev_close))
+
+    def on_closed(self, bar: Bar) -> None:
+        self.closed_tr = self._tr(bar, self._prev_close)
+        self._prev_close = bar[4]
+
+    def on_forming(self, bar: Optional[Bar]) -> None:
+        self.forming_tr = None if bar is None else self._tr(bar, self._prev_close)
+
+
+class IndicatorNode(_ClosedAware):
+    def __init__(self, spec: IndicatorSpec, bars: BarsNode) -> None:
+        super().__init__(bars)
+        self.name = spec.name
+        self.window = spec.window
+        self.deps = (bars,)
+        self._value: Optional[float] = None
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+
+class EmaNode(IndicatorNode):
+    def __init__(self, spec: IndicatorSpec, bars: BarsNode) -> None:
+        super().__init__(spec, bars)
+        self.alpha = _ewm_alpha((self.window - 1) / 2)
+        self._closed_ema: Optional[float] = None
+
+    def on_closed(self, bar: Bar) -> None:
+        c = bar[4]
+        self._closed_ema = (
+            c
+            if self._closed_ema is None
+            else _ewm_step(self._closed_ema, c, self.alpha)
+        )
+
+    def on_forming(self, bar: Optional[Bar]) -> None:
+        if bar is None or self.bars.count < self.window:
+            self._value = None
+            return
+        c = bar[4]
+        self._value = (
+            c
+            if self._closed_ema is None
+            else _ewm_step(self._closed_ema, c, self.alpha)
+        )
+
+
+class RsiNode(IndicatorNode):
+    def __init__(self, spec: IndicatorSpec, bars: BarsNode) -> None:
+        super().__init__(spec, bars)
+        self.alpha = _ewm_alpha((1 - 1 / self.window) / (1 / self.window))
+        self._up: Optional[float] = None
+        self._dn: Optional[float] = None
+        self._last_close: Optional[float] = None
+
+    def _step(self, close: float) -> tuple[float, float]:
+        if self._last_close is None:
+            return 0.0, 0.0  # первый diff = NaN -> 0 в up/down
+        diff = close - self._last_close
+        up = diff if diff > 0 else 0.0
+        dn = -diff if diff < 0 else 0.0
+        return (
+            _ewm_step(self._up, up, self.alpha),
+            _ewm_step(self._dn, dn, self.alpha),
+        )
+
+    def on_closed(self, bar: Bar) -> None:
+        self._up, self._dn = self._step(bar[4])
+        self._last_close = bar[4]
+
+    def on_forming(self, bar: Optional[Bar]) -> None:
+        if bar is None or self.bars.count < self.window:
+            self._value = None
+            return
+        up, dn = self._step(bar[4])
+        self._value = 100.0 if dn == 0 else 100 - (100 / (1 + up / dn))
+
+
+class AtrNode(IndicatorNode):
+    def __init__(self, spec: IndicatorSpec, bars: BarsNode, tr: TrueRangeNode):
+        super().__init__(spec, bars)
+        self.tr = tr
+        self.deps = (tr,)
+        self._first: list[float] = []  # TR первых window закрытых баров
+        self._closed_atr: float = 0.0
+
+    def on_closed(self, bar: Bar) -> None:
+        tr = self.tr.closed_tr
+        w = self.window
+        if len(self._first) < w:
+            self._first.append(tr)
+            if len(self._first) == w:
+                self._closed_atr = float(np.asarray(self._first).mean())
+            return
+        self._closed_atr = (self._closed_atr * (w - 1) + tr) / float(w)
+
+    def on_forming(self, bar: Optional[Bar]) -> None:
+        if bar is None or self.bars.count < self.window + 1:
+            self._value = None
+            return
+        w = self.window
+        atr = (self._closed_atr * (w - 1) + self.tr.forming_tr) / float(w)
+        self._value = atr if atr > 1e-9 else None
+
+
+_KINDS = {"ema": EmaNode, "rsi": RsiNode}
+
+
+class IndicatorGraph:
+    def __init__(
+        self,
+        specs: Iterable[IndicatorSpec],
+        base_timeframe: str,
+        require: Sequence[str] = (),
+        native: Iterable[str] = (),
+    ) -> None:
+        self.base_ms = tf_to_ms(base_timeframe)
+        self._windows: dict[str, int] = {}
+        self._bars: dict[str, BarsNode] = {}
+        self._tr: dict[str, TrueRangeNode] = {}
+        self._indicators: dict[str, IndicatorNode] = {}
+
+        for spec in specs:
+            if spec.name in self._indicators:
+                raise ValueError(f"Duplicate indicator name: {spec.name}")
+            timeframe = spec.timeframe_for(base_timeframe)
+            tf_ms = tf_to_ms(timeframe)
+            if tf_ms < self.base_ms or tf_ms % self.base_ms:
+                raise ValueError(
+                    f"{spec.name}: timeframe {timeframe} is not a multiple "
+                    f"of base {base_timeframe}"
+                )
+            bars = self._bars_node(timeframe)
+            key = timeframe.lower()
+            self._windows[key] = max(self._windows.get(key, 0), spec.window)
+            if spec.kind == "atr":
+                node: IndicatorNode = AtrNode(spec, bars, self._tr_node(bars))
+            else:
+                node = _KINDS[spec.kind](spec, bars)
+            self._indicators[spec.name] = node
+
+        missing = set(require) - set(self._indicators)
+        if missing:
+            raise ValueError(f"Indicator graph lacks required nodes: {sorted(missing)}")
+
+        self.native = {tf.lower() for tf in native}
+        unknown = self.native - set(self._bars)
+        if unknown:
+            raise ValueError(f"Native timeframes without indicators: {sorted(unknown)}")
+        self._derived = [b for tf, b in self._bars.items() if tf not in self.native]
+
+        self.order: list[Node] = self._toposort(
+            [*self._bars.values(), *self._tr.values(), *self._indicators.values()]
+        )
+
+    def _bars_node(self, timeframe: str) -> BarsNode:
+        key = timeframe.lower()
+        if key not in self._bars:
+            self._bars[key] = BarsNode(key)
+        return self._bars[key]
+
+    def _tr_node(self, bars: BarsNode) -> TrueRangeNode:
+        if bars.name not in self._tr:
+            self._tr[bars.name] = TrueRangeNode(bars)
+        return self._tr[bars.name]
+
+    @staticmethod
+    def _toposort(nodes: list[Node]) -> list[Node]:
+        order: list[Node] = []
+        done: set[int] = set()
+
+        def visit(node: Node) -> None:
+            if id(node) in done:
+                return
+            for dep in node.deps:
+                visit(dep)
+            done.add(id(node))
+            order.append(node)
+
+        for node in nodes:
+            visit(node)
+        return order
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._indicators)
+
+    @property
+    def timeframes(self) -> list[str]:
+        return list(self._bars)
+
+    def warmup_bars(self, timeframe: str, cap: int = 1000) -> int:
+        """
+        Сколько баров tf подать на старте, чтобы EMA/RSI/ATR сошлись к
+        значениям на полной истории: вес начального значения после 15*window
+        шагов Уайлдера ~e^-15. cap — лимит одного REST-запроса Bybit.
+        """
+        return min(cap, 15 * self._windows.get(timeframe.lower(), 1))
+
+    def update_htf(self, timeframe: str, kline: dict) -> bool:
+        """
+        Свеча нативного потока tf (формирующаяся или закрытая). Старее
+        формирующейся — игнорируется (поздний confirm после начала нового бара).
+        """
+        bars = self._bars[timeframe.lower()]
+        ts = int(kline["start_at"])
+        if bars.forming is not None and ts < bars.forming[0]:
+            return False
+        bars.push(
+            ts,
+            float(kline["open"]),
+            float(kline["high"]),
+            float(kline["low"]),
+            float(kline["close"]),
+        )
+        # сразу: закрытие бара должно дойти до узлов до следующего push
+        self._evaluate()
+        return True
+
+    def on_bar(self, kline: dict) -> dict[str, Optional[float]]:
+        """Прогоняет граф по новому базовому бару и возвращает {имя: значение}."""
+        ts = int(kline["start_at"])
+        o, h, l, c = (
+            float(kline["open"]),
+            float(kline["high"]),
+            float(kline["low"]),
+            float(kline["close"]),
+        )
+        for bars in self._derived:
+            bars.push(ts, o, h, l, c)
+        self._evaluate()
+        return self.values()
+
+    def _evaluate(self) -> None:
+        for node in self.order:
+            if node.deps and node.changed_inputs():
+                node.evaluate()
+
+    def values(self) -> dict[str, Optional[float]]:
+        return {name: node.value for name, node in self._indicators.items()}
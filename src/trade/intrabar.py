@@ -0,0 +1,232 @@
+"""
+Выходы внутри бара по 1m подбарам (см. backtest.run_backtest(sub_bars=...)).
+
+По закрытию 5m TrailingStopManager видит только close и не знает, что
+внутри бара случилось раньше — стоп или тейк. Здесь под каждым базовым
+баром лежит путь цены из подбаров:
+
+  close — close каждого подбара (как если бы трейлинг проверялся раз в минуту);
+  ohlc  — open, затем ближний к open экстремум, дальний, close: для растущего
+          подбара o→l→h→c, для падающего o→h→l→c.
+
+scan_exits проверяет правила TrailingStopManager (TP → TRAIL-BE → TRAIL, та же
+арифметика float) по всем точкам пути сразу: экстремум — накопительный
+max/min, первое срабатывание — argmax по маске. Шорт сводится к лонгу сменой
+знака цены (умножение на -1 точное), так что длинные и короткие позиции
+сканируются одним батчем. Путь читается кусками растущей длины, поэтому цена
+пропорциональна времени удержания, а не длине истории; backtest сканирует
+так сразу все входы окна.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# коды причин выхода в scan_exits; 0 — позиция не закрылась на пути
+SCAN_REASONS = ("", "TP", "TRAIL-BE", "TRAIL")
+
+BREAK_EVEN_LONG = 1.005
+BREAK_EVEN_SHORT = 0.995
+
+_MAX_CHUNK = 16384
+_MAX_BLOCK = 1 << 21  # точек в одном куске батча (позиции x шаг)
+
+
+def scan_exits(
+    prices: np.ndarray,
+    start: Union[np.ndarray, Sequence[int]],
+    end: Union[np.ndarray, Sequence[int]],
+    entry_price: Union[np.ndarray, Sequence[float]],
+    is_long: Union[np.ndarray, Sequence[bool]],
+    trail_pct: float,
+    take_profit_pct: Optional[float] = None,
+    chunk: int = 256,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Первая точка пути prices[start:end], где сработал бы TrailingStopManager,
+    активированный по entry_price, — для каждой позиции батча.
+    Возвращает (индекс точки или -1, код причины из SCAN_REASONS).
+    """
+    start = np.atleast_1d(np.asarray(start, dtype=np.int64))
+    n = len(start)
+    end = np.broadcast_to(np.asarray(end, dtype=np.int64), (n,))
+    entry = np.broadcast_to(np.asarray(entry_price, dtype=float), (n,))
+    is_long = np.broadcast_to(np.asarray(is_long, dtype=bool), (n,))
+
+    sign = np.where(is_long, 1.0, -1.0)
+    base = sign * entry
+    be_level = base * np.where(is_long, BREAK_EVEN_LONG, BREAK_EVEN_SHORT)
+    trail_mult = np.where(is_long, 1 - trail_pct, 1 + trail_pct)
+    tp_level = (
+        base * np.where(is_long, 1 + take_profit_pct, 1 - take_profit_pct)
+        if take_profit_pct
+        else None
+    )
+
+    index = np.full(n, -1, dtype=np.int64)
+    reason = np.zeros(n, dtype=np.uint8)
+    extreme = base.copy()
+    pos = start.copy()
+    live = np.flatnonzero(pos < end)
+    last = len(prices) - 1
+
+    while live.size:
+        offsets = pos[live, None] + np.arange(chunk)
+        valid = offsets < end[live, None]
+        q = prices[np.minimum(offsets, last)] * sign[live, None]
+
+        ext = np.maximum(np.maximum.accumulate(q, axis=1), extreme[live, None])
+        trail_stop = ext * trail_mult[live, None]
+        armed = ext >= be_level[live, None]
+        hit_be = armed & (q <= np.maximum(base[live, None], trail_stop))
+        hit_trail = ~armed & (q <= trail_stop)
+        hit = hit_be | hit_trail
+        if tp_level is not None:
+            hit_tp = q >= tp_level[live, None]
+            hit |= hit_tp
+        hit &= valid
+
+        found = hit.any(axis=1)
+        if found.any():
+            rows = np.flatnonzero(found)
+            first = hit[rows].argmax(axis=1)
+            code = np.where(hit_be[rows, first], 2, 3)
+            if tp_level is not None:
+                code = np.where(hit_tp[rows, first], 1, code)
+            index[live[rows]] = pos[live[rows]] + first
+            reason[live[rows]] = code
+
+        extreme[live] = ext[:, -1]
+        pos[live] += chunk
+        live = live[~found & (pos[live] < end[live])]
+        chunk = max(min(chunk * 2, _MAX_CHUNK, _MAX_BLOCK // max(live.size, 1)), 1)
+
+    return index, reason
+
+
+@dataclass(slots=True)
+class SubBarPath:
+    """
+    Путь цены подбаров под базовыми барами.
+    prices[start_of[i]:start_of[i + 1]] — точки внутри базового бара i.
+    """
+
+    prices: np.ndarray
+    start_of: np.ndarray  # len = число базовых баров + 1
+
+    def exits(
+        self,
+        bars: np.ndarray,
+        entry_price: np.ndarray,
+        is_long: np.ndarray,
+        trail_pct: float,
+        take_profit_pct: Optional[float],
+        stop: int,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Выходы позиций, открытых по close баров bars, на барах (bar, stop) —
+        одним батчем. Возвращает (индекс базового бара выхода или -1,
+        цена точки срабатывания, код причины из SCAN_REASONS).
+        """
+        bars = np.asarray(bars, dtype=np.int64)
+        index, code = scan_exits(
+            self.prices,
+            self.start_of[bars + 1],
+            self.start_of[stop],
+            entry_price,
+            is_long,
+            trail_pct,
+            take_profit_pct,
+        )
+        found = index >= 0
+        exit_bar = np.full(len(bars), -1, dtype=np.int64)
+        exit_bar[found] = np.searchsorted(self.start_of, index[found], side="right") - 1
+        price = np.full(len(bars), np.nan)
+        price[found] = self.prices[index[found]]
+        return exit_bar, price, code
+
+
+def build_path(
+    base_ts: np.ndarray,
+    base_ms: int,
+    df_sub: pd.DataFrame,
+    mode: str = "ohlc",
+) -> SubBarPath:
+    """
+    Раскладывает подбары ['ts','o','h','l','c'] по базовым барам с началом
+    base_ts и длиной base_ms. Подбары вне базовых баров (дыры) отбрасываются.
+    """
+    base_ts = np.asarray(base_ts, dtype=np.int64)
+    ts = df_sub["ts"].to_numpy(dtype=np.int64)
+    bar = np.searchsorted(base_ts, ts, side="right") - 1
+    inside = bar >= 0
+    inside[inside] &= ts[inside] < base_ts[bar[inside]] + base_ms
+    bar = bar[inside]
+
+    c = df_sub["c"].to_numpy(dtype=float)[inside]
+    if mode == "close":
+        prices = c
+        point_bar = bar
+    elif mode == "ohlc":
+        o = df_sub["o"].to_numpy(dtype=float)[inside]
+        h = df_sub["h"].to_numpy(dtype=float)[inside]
+        low = df_sub["l"].to_numpy(dtype=float)[inside]
+        up = c >= o
+        prices = np.column_stack(
+            [o, np.where(up, low, h), np.where(up, h, low), c]
+        ).ravel()
+        point_bar = np.repeat(bar, 4)
+    else:
+        raise ValueError(f"unknown intrabar path mode: {mode}")
+
+    start_of = np.searchsorted(point_bar, np.arange(len(base_ts) + 1), side="left")
+    return SubBarPath(np.ascontiguousarray(prices), start_of.astype(np.int64))
+
+
+def cache_path(
+    df_base: pd.DataFrame,
+    base_ms: int,
+    df_sub: pd.DataFrame,
+    mode: str,
+    feature_dir: Path,
+) -> Path:
+    """
+    Сохраняет путь подбаров рядом с кэшем индикаторов:
+    feature_dir/intrabar_<mode>_<hash подбаров>/{prices,start_of}.npy.
+    """
+    digest = hashlib.sha1()
+    for col in ("ts", "o", "h", "l", "c"):
+        digest.update(np.ascontiguousarray(df_sub[col].to_numpy()).tobytes())
+    path_dir = Path(feature_dir) / f"intrabar_{mode}_{digest.hexdigest()[:16]}"
+
+    if (path_dir / "prices.npy").exists() and (path_dir / "start_of.npy").exists():
+        logger.info("Intrabar path cache hit: %s", path_dir)
+        return path_dir
+
+    path_dir.mkdir(parents=True, exist_ok=True)
+    path = build_path(df_base["ts"].to_numpy(), base_ms, df_sub, mode)
+    np.save(path_dir / "prices.npy", path.prices)
+    np.save(path_dir / "start_of.npy", path.start_of)
+    covered = np.count_nonzero(np.diff(path.start_of))
+    logger.info(
+        "Intrabar path cached: %s (%d points, %d/%d bars covered)",
+        path_dir,
+        len(path.prices),
+        covered,
+        len(df_base),
+    )
+    return path_dir
+
+
+def load_path(path_dir: Path) -> SubBarPath:
+    return SubBarPath(
+        prices=np.load(Path(path_dir) / "prices.npy", mmap_mode="r"),
+        start_of=np.load(Path(path_dir) / "start_of.npy", mmap_mode="r"),
+    )
@@ -0,0 +1,201 @@
+"""
+Шина подтверждённых свечей в shared memory: один процесс (mode=ingest)
+держит WS-подключения и пишет бары, любое число стратегий на хосте читает
+их без сокетов и без копирования.
+
+Сегмент на пару символ/таймфрейм, имя "{prefix}_{SYMBOL}_{tf}":
+
+  header  int64[8]: magic, version, capacity, tf_ms, write_seq, reserved...
+  ring    OHLCV_DTYPE[capacity] (ts,o,h,l,c,v, как .bin в history.py)
+
+Сегменты живут, пока жив процесс ingest (он же их удаляет при остановке);
+после перезапуска ingest стратегии нужно перезапустить.
+
+Писатель один: кладёт бар в слот write_seq % capacity и только потом
+увеличивает write_seq. Читатель помнит свой next_seq, берёт срез колец
+как numpy-view и после чтения проверяет, что писатель не успел обогнать его
+на целое кольцо (иначе хвост считается потерянным и пропускается).
+"""
+
+import logging
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+
+from trade.history import OHLCV_DTYPE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x5452414445425553  # "TRADEBUS"
+VERSION = 1
+HEADER_SLOTS = 8
+HEADER_BYTES = HEADER_SLOTS * 8
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_TF_MS, _H_SEQ = range(5)
+
+# сегменты, которыми владеет писатель в этом процессе
+_owned: set[str] = set()
+
+
+def segment_name(prefix: str, symbol: str, timeframe: str) -> str:
+    return f"{prefix}_{symbol.upper()}_{timeframe.lower()}"
+
+
+def record_to_kline(rec: np.void) -> dict:
+    """Запись кольца -> бар в формате normalize_kline."""
+    return {
+        "start_at": int(rec["ts"]),
+        "open": float(rec["o"]),
+        "high": float(rec["h"]),
+        "low": float(rec["l"]),
+        "close": float(rec["c"]),
+        "volume": float(rec["v"]),
+    }
+
+
+class _Segment:
+    def __init__(self, shm: shared_memory.SharedMemory) -> None:
+        self.shm = shm
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[_H_CAPACITY])
+        self.ring = np.ndarray(
+            (self.capacity,), dtype=OHLCV_DTYPE, buffer=shm.buf, offset=HEADER_BYTES
+        )
+
+    @property
+    def write_seq(self) -> int:
+        return int(self.header[_H_SEQ])
+
+    @property
+    def tf_ms(self) -> int:
+        return int(self.header[_H_TF_MS])
+
+    def close(self) -> None:
+        # numpy-view держат ссылку на буфер: отпускаем до shm.close()
+        del self.header, self.ring
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning("[BUS] segment still referenced by views; left mapped")
+
+
+class MarketBusWriter(_Segment):
+    """Единственный писатель сегмента. Повторный запуск продолжает кольцо."""
+
+    def __init__(self, name: str, capacity: int, tf_ms: int) -> None:
+        size = HEADER_BYTES + capacity * OHLCV_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            fresh = True
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+            fresh = False
+
+        header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        if fresh:
+            header[:] = 0
+            header[_H_CAPACITY] = capacity
+            header[_H_TF_MS] = tf_ms
+            header[_H_VERSION] = VERSION
+            header[_H_MAGIC] = MAGIC
+        elif (
+            header[_H_MAGIC] != MAGIC
+            or header[_H_CAPACITY] != capacity
+            or header[_H_TF_MS] != tf_ms
+        ):
+            del header
+            shm.close()
+            raise RuntimeError(
+                f"Shared memory segment {name} exists with another layout; "
+                "remove it (unlink) or change bus.name_prefix"
+            )
+        del header
+        super().__init__(shm)
+        self.name = name
+        _owned.add(name)
+        logger.info(
+            "[BUS] %s segment %s (capacity=%d, seq=%d)",
+            "created" if fresh else "reattached",
+            name,
+            self.capacity,
+            self.write_seq,
+        )
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        seq = self.write_seq
+        if seq == 0:
+            return None
+        return int(self.ring["ts"][(seq - 1) % self.capacity])
+
+    def publish(self, kline: dict) -> bool:
+        """Пишет подтверждённый бар; повтор/старый бар игнорируется."""
+        ts = int(kline["start_at"])
+        last = self.last_ts
+        if last is not None and ts <= last:
+            return False
+        seq = self.write_seq
+        self.ring[seq % self.capacity] = (
+            ts,
+            float(kline["open"]),
+            float(kline["high"]),
+            float(kline["low"]),
+            float(kline["close"]),
+            float(kline["volume"]),
+        )
+        self.header[_H_SEQ] = seq + 1  # публикация — после записи слота
+        return True
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+        _owned.discard(self.name)
+
+
+class MarketBusReader(_Segment):
+    """Читатель сегмента; не владеет им и не удаляет при выходе."""
+
+    def __init__(self, name: str, from_start: bool = True) -> None:
+        shm = shared_memory.SharedMemory(name=name)
+        # иначе resource_tracker удалит чужой сегмент при выходе читателя
+        if name not in _owned:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        super().__init__(shm)
+        if self.header[_H_MAGIC] != MAGIC or self.header[_H_VERSION] != VERSION:
+            self.close()
+            raise RuntimeError(f"{name} is not a market bus segment")
+        self.name = name
+        seq = self.write_seq
+        self.next_seq = max(0, seq - self.capacity) if from_start else seq
+        self.lost = 0  # баров, пропущенных из-за переполнения кольца
+
+    def read(self) -> np.ndarray:
+        """
+        Новые записи с прошлого вызова. Без заворота кольца — view на shared
+        memory (ноль копий; данные валидны, пока писатель не обогнал на
+        capacity баров), с заворотом — склейка двух кусков.
+        """
+        seq = self.write_seq
+        start = self.next_seq
+        if seq - start > self.capacity:
+            self._skip(start, seq - self.capacity)
+            start = seq - self.capacity
+        if start >= seq:
+            return self.ring[:0]
+
+        lo, hi = start % self.capacity, seq % self.capacity
+        if lo < hi:
+            out = self.ring[lo:hi]
+        else:
+            out = np.concatenate((self.ring[lo:], self.ring[:hi]))
+
+        # писатель мог перезаписать начало среза, пока мы читали
+        oldest = self.write_seq - self.capacity
+        if oldest > start:
+            self._skip(start, oldest)
+            out = out[oldest - start :]
+        self.next_seq = seq
+        return out
+
+    def _skip(self, start: int, to: int) -> None:
+        self.lost += to - start
+        logger.warning("[BUS] %s: reader lagged, %d bar(s) lost", self.name, to - start)
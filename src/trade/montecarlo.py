@@ -0,0 +1,217 @@
+"""
+Monte Carlo по журналу сделок replay/backtest (см. BacktestResult.ledger()).
+
+Каждая сделка сводится к доходности на номинал и длительности в барах;
+последовательности сделок пересобираются (bootstrap / перестановка / блоки),
+и по всем путям сразу, шаг за шагом по сделкам, применяются правила
+StrategyCore: размер позиции order_percent от баланса, стоп по просадке
+balance_drawdown_limit_pct и cooldown после серии убытков.
+
+Чтобы сравнить разные trailing_pct, прогоните backtest с каждым значением
+и подайте сюда соответствующие журналы.
+"""
+
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import settings
+
+Method = Literal["bootstrap", "shuffle", "block"]
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass(slots=True)
+class MonteCarloResult:
+    final_equity: np.ndarray  # относительно стартового баланса (1.0 = без изменений)
+    max_drawdown: np.ndarray  # доля от пика
+    stop_trade: np.ndarray  # номер сделки, после которой сработал стоп; -1 — не было
+    stop_bars: np.ndarray  # баров от старта до стопа; -1 — не было
+    skipped: np.ndarray  # сделок пропущено из-за cooldown
+
+    @property
+    def paths(self) -> int:
+        return len(self.final_equity)
+
+    def summary(self) -> dict[str, float]:
+        stopped = self.stop_trade >= 0
+        out: dict[str, float] = {
+            "paths": float(self.paths),
+            "prob_stop": float(stopped.mean()),
+            "prob_loss": float((self.final_equity < 1.0).mean()),
+            "mean_skipped": float(self.skipped.mean()),
+        }
+        for name, values in (
+            ("final_equity", self.final_equity),
+            ("max_drawdown", self.max_drawdown),
+        ):
+            for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                out[f"{name}_p{q}"] = float(v)
+        if stopped.any():
+            for q, v in zip(
+                PERCENTILES, np.percentile(self.stop_bars[stopped], PERCENTILES)
+            ):
+                out[f"bars_to_stop_p{q}"] = float(v)
+        return out
+
+
+def ledger_to_arrays(
+    ledger: pd.DataFrame,
+    bar_ms: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Из журнала сделок: доходность на номинал, признак убытка (как в
+    DecisionCore.on_exit: pnl <= 0), пауза до входа и длительность
+    сделки в барах.
+    """
+    ledger = ledger.sort_values("entry_ts")
+    entry = ledger["entry_price"].to_numpy(dtype=float)
+    exit_ = ledger["exit_price"].to_numpy(dtype=float)
+    short = (ledger["side"] == "short").to_numpy()
+
+    ret = np.where(short, (entry - exit_) / entry, (exit_ - entry) / entry)
+    loss = ret <= 0
+
+    entry_ts = ledger["entry_ts"].to_numpy(dtype=np.int64)
+    exit_ts = ledger["exit_ts"].to_numpy(dtype=np.int64)
+    duration = np.maximum((exit_ts - entry_ts) // bar_ms, 0)
+    gap = np.zeros(len(ledger), dtype=np.int64)
+    gap[1:] = np.maximum((entry_ts[1:] - exit_ts[:-1]) // bar_ms, 0)
+    return ret, loss, gap, duration
+
+
+def _sample_indices(
+    rng: np.random.Generator,
+    n_paths: int,
+    n_trades: int,
+    n_ledger: int,
+    method: Method,
+    block_size: int,
+) -> np.ndarray:
+    """Матрица (n_paths, n_trades) индексов сделок журнала."""
+    if method == "shuffle":
+        base = np.broadcast_to(np.arange(n_ledger, dtype=np.int32), (n_paths, n_ledger))
+        return rng.permuted(base, axis=1)
+    if method == "block":
+        # стационарные блоки подряд идущих сделок (с заворотом по кругу)
+        n_blocks = -(-n_trades // block_size)
+        starts = rng.integers(0, n_ledger, (n_paths, n_blocks), dtype=np.int32)
+        idx = starts[:, :, None] + np.arange(block_size, dtype=np.int32)
+        return idx.reshape(n_paths, -1)[:, :n_trades] % n_ledger
+    return rng.integers(0, n_ledger, (n_paths, n_trades), dtype=np.int32)
+
+
+def _simulate_batch(
+    idx: np.ndarray,
+    ret: np.ndarray,
+    loss: np.ndarray,
+    gap: np.ndarray,
+    duration: np.ndarray,
+    order_percent: float,
+    drawdown_limit_pct: float,
+    max_consecutive_losses: int,
+    cooldown_bars: int,
+) -> tuple[np.ndarray, ...]:
+    n_paths, n_trades = idx.shape
+    equity = np.ones(n_paths)
+    peak = np.ones(n_paths)
+    max_dd = np.zeros(n_paths)
+    losses = np.zeros(n_paths, dtype=np.int64)
+    cooldown = np.zeros(n_paths, dtype=np.int64)
+    bars = np.zeros(n_paths, dtype=np.int64)
+    stop_trade = np.full(n_paths, -1, dtype=np.int64)
+    stop_bars = np.full(n_paths, -1, dtype=np.int64)
+    skipped = np.zeros(n_paths, dtype=np.int64)
+    live = np.ones(n_paths, dtype=bool)
+    limit = 1.0 - drawdown_limit_pct
+
+    for j in range(n_trades):
+        k = idx[:, j]
+        g = gap[k]
+        d = duration[k]
+
+        bars += g
+        cooldown = np.maximum(cooldown - g, 0)
+        take = live & (cooldown == 0)
+        skip = live & ~take
+        skipped += skip
+        cooldown = np.where(skip, np.maximum(cooldown - d, 0), cooldown)
+        bars += d
+
+        equity = np.where(take, equity * (1.0 + order_percent * ret[k]), equity)
+        peak = np.maximum(peak, equity)
+        max_dd = np.maximum(max_dd, 1.0 - equity / peak)
+
+        is_loss = loss[k]
+        losses = np.where(take, np.where(is_loss, losses + 1, 0), losses)
+        cooldown = np.where(
+            take & is_loss & (losses >= max_consecutive_losses),
+            cooldown_bars,
+            cooldown,
+        )
+
+        stop_now = take & (equity < limit)
+        stop_trade[stop_now] = j
+        stop_bars[stop_now] = bars[stop_now]
+        live &= ~stop_now
+
+    return equity, max_dd, stop_trade, stop_bars, skipped
+
+
+def simulate(
+    ledger: pd.DataFrame,
+    n_paths: int = 100_000,
+    method: Method = "bootstrap",
+    bar_ms: int = 300_000,
+    order_percent: Optional[float] = None,
+    drawdown_limit_pct: Optional[float] = None,
+    max_consecutive_losses: int = 3,
+    cooldown_bars: int = 10,
+    block_size: int = 10,
+    n_trades: Optional[int] = None,
+    seed: Optional[int] = None,
+    batch_paths: int = 20_000,
+) -> MonteCarloResult:
+    """
+    n_trades — длина каждого пути (по умолчанию = числу сделок в журнале).
+    Пути считаются пачками по batch_paths, чтобы индексы не съели память.
+    """
+    if ledger.empty:
+        raise ValueError("ledger is empty")
+
+    ret, loss, gap, duration = ledger_to_arrays(ledger, bar_ms)
+    order_percent = (
+        order_percent if order_percent is not None else settings.ws.order_percent
+    )
+    drawdown_limit_pct = (
+        drawdown_limit_pct
+        if drawdown_limit_pct is not None
+        else settings.ws.balance_drawdown_limit_pct
+    )
+    n_trades = n_trades or len(ret)
+    if method == "shuffle" and n_trades != len(ret):
+        raise ValueError("shuffle keeps the ledger length; n_trades must match")
+
+    rng = np.random.default_rng(seed)
+    parts = []
+    for start in range(0, n_paths, batch_paths):
+        size = min(batch_paths, n_paths - start)
+        idx = _sample_indices(rng, size, n_trades, len(ret), method, block_size)
+        parts.append(
+            _simulate_batch(
+                idx,
+                ret,
+                loss,
+                gap,
+                duration,
+                order_percent,
+                drawdown_limit_pct,
+                max_consecutive_losses,
+                cooldown_bars,
+            )
+        )
+
+    return MonteCarloResult(*(np.concatenate(arrays) for arrays in zip(*parts)))
@@ -0,0 +1,90 @@
+"""
+Кэш лучшей цены (top of book) из потока Bybit v5 ``orderbook.1.<SYMBOL>``.
+
+Сообщения:
+  snapshot — полное состояние уровня 1 (b/a по одной паре [price, size]);
+  delta    — изменения; size "0" — уровень снят.
+Каждое несёт update id ``u``: устаревшие/повторные (u <= текущего)
+отбрасываются, ``u == 1`` означает перезапуск сервиса биржи и трактуется как
+снапшот. До первого снапшота (и после reset при переподключении) кэш пуст.
+Без изменений биржа повторяет снапшот уровня 1 раз в 3 с, поэтому кэш
+старше max_age_ms (по локальному времени получения) считается устаревшим.
+"""
+
+import time
+from typing import Any, Mapping, Optional
+
+
+class TopOfBook:
+    def __init__(self, symbol: str, max_age_ms: int = 5000) -> None:
+        self.symbol = symbol.upper()
+        self.topic = f"orderbook.1.{self.symbol}"
+        self.max_age_ms = max_age_ms
+        self.bid: Optional[float] = None
+        self.bid_size: float = 0.0
+        self.ask: Optional[float] = None
+        self.ask_size: float = 0.0
+        self.update_id: int = 0
+        self.seq: int = 0
+        self.ts: int = 0  # время биржи (мс) последнего применённого сообщения
+        self.received_ms: int = 0  # локальное время получения (для свежести)
+        self.synced: bool = False
+        self.dropped: int = 0  # отброшено сообщений вне порядка/до снапшота
+
+    def reset(self) -> None:
+        """Разрыв потока: ждём новый снапшот."""
+        self.bid = self.ask = None
+        self.bid_size = self.ask_size = 0.0
+        self.update_id = 0
+        self.seq = 0
+        self.synced = False
+
+    @staticmethod
+    def _level(levels: Any) -> Optional[tuple[float, float]]:
+        if not levels:
+            return None
+        price, size = levels[0][0], levels[0][1]
+        return float(price), float(size)
+
+    def apply(self, message: Mapping[str, Any]) -> bool:
+        """Применяет сообщение WS; True — состояние обновилось."""
+        data = message.get("data") or {}
+        try:
+            update_id = int(data.get("u") or 0)
+        except (TypeError, ValueError):
+            return False
+        kind = message.get("type")
+
+        if kind == "snapshot" or update_id == 1:
+            self.reset()
+        elif not self.synced or update_id <= self.update_id:
+            self.dropped += 1
+            return False
+
+        for side, levels in (("bid", data.get("b")), ("ask", data.get("a"))):
+            level = self._level(levels)
+            if level is None:
+                continue
+            price, size = level
+            if size > 0:
+                setattr(self, side, price)
+                setattr(self, f"{side}_size", size)
+            else:
+                setattr(self, side, None)
+                setattr(self, f"{side}_size", 0.0)
+
+        self.update_id = update_id
+        self.seq = int(data.get("seq") or self.seq)
+        self.received_ms = int(time.time() * 1000)
+        self.ts = int(message.get("ts") or self.received_ms)
+        self.synced = True
+        return True
+
+    def quote(self, now_ms: Optional[int] = None) -> Optional[tuple[float, float]]:
+        """(bid, ask), если кэш свежий и не перекрещен; иначе None."""
+        if not self.synced or self.bid is None or self.ask is None:
+            return None
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        if now_ms - self.received_ms > self.max_age_ms or self.bid >= self.ask:
+            return None
+        return self.bid, self.ask
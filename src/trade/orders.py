@@ -0,0 +1,236 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from core.config import settings
+from trade import tracing
+from trade.execution import Executor, floor_to_step
+from trade.sink import SqliteSink
+
+logger = logging.getLogger(__name__)
+
+_DONE_STATUSES = {"closed", "canceled", "cancelled", "rejected", "expired"}
+
+
+@dataclass(slots=True)
+class TrackedOrder:
+    order_id: str
+    action: str  # "long" / "short"
+    qty: float
+    price: float  # лимитная цена
+    bars: int = 0  # закрытых баров с момента выставления
+    replaces: int = 0
+
+
+class OrderManager:
+    """
+    Жизненный цикл PostOnly-входов в фоне, отдельно от handle_kline.
+
+    Обработчик бара только кладёт команды в очередь (submit/on_bar) и никогда
+    не ждёт биржу. Фоновая задача выставляет ордера, опрашивает их статус,
+    снимает и переставляет неисполненные (по числу баров или уходу цены)
+    и включает трейлинг только по подтверждённому исполнению.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        on_fill: Callable[[str, float], None],
+        sink: Optional[SqliteSink] = None,
+    ) -> None:
+        self.executor = executor
+        self.on_fill = on_fill  # StrategyCore.on_entry_filled
+        self.sink = sink  # журнал выставлений и исполнений
+        self.max_bars: int = settings.ws.order_max_bars
+        self.max_drift_pct: Optional[float] = settings.ws.order_max_drift_pct
+        self.max_replaces: int = settings.ws.order_max_replaces
+        self.poll_interval: float = settings.ws.order_poll_interval
+
+        self.open_orders: dict[str, TrackedOrder] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._last_price: Optional[float] = None
+
+    # ---------- API для handle_kline (без await) ----------
+
+    def submit(self, action: str, price: float, balance: float) -> None:
+        # трасса бара продолжается в фоновой задаче до ответа на create_order
+        trace = tracing.current()
+        if trace is not None:
+            trace.hold()
+        self._queue.put_nowait(("place", action, price, balance, trace))
+
+    def on_bar(self, price: float) -> None:
+        self._queue.put_nowait(("bar", price))
+
+    def has_pending(self, action: str) -> bool:
+        return any(o.action == action for o in self.open_orders.values())
+
+    # ---------- фоновая задача ----------
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="order-manager")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for order in list(self.open_orders.values()):
+            await self._cancel(order)
+
+    async def _run(self) -> None:
+        while True:
+            # asyncio.timeout, а не wait_for: в 3.11 wait_for(queue.get()) при
+            # совпадении таймаута и cancel() теряет отмену, и stop() зависает
+            try:
+                async with asyncio.timeout(self.poll_interval):
+                    cmd = await self._queue.get()
+            except TimeoutError:
+                cmd = None
+
+            try:
+                if cmd is not None:
+                    if cmd[0] == "place":
+                        await self._place(*cmd[1:])
+                    elif cmd[0] == "bar":
+                        await self._on_bar(cmd[1])
+                if self.open_orders:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("[ORDERS] unexpected error: %s", e)
+
+    async def _place(
+        self,
+        action: str,
+        price: float,
+        balance: float,
+        trace: Optional[tracing.BarTrace] = None,
+    ) -> None:
+        token = tracing.activate(trace)
+        try:
+            if self.has_pending(action):
+                logger.info(
+                    "[ORDERS] %s entry already pending, skip new signal", action
+                )
+                return
+            order = await self.executor.order(action, price, balance)
+            self._track(order, action)
+            if self.sink is not None:
+                self.sink.order(
+                    action,
+                    "enter",
+                    float((order or {}).get("price") or price),
+                    float((order or {}).get("amount") or 0.0),
+                    str(order["id"]) if order and order.get("id") else None,
+                    status=(order or {}).get("status") or "rejected",
+                )
+        finally:
+            tracing.deactivate(token)
+            if trace is not None:
+                trace.release()
+
+    def _track(self, order: Optional[dict], action: str, replaces: int = 0) -> None:
+        if not order or not order.get("id"):
+            return
+        tracked = TrackedOrder(
+            order_id=str(order["id"]),
+            action=action,
+            qty=float(order.get("amount") or 0.0),
+            price=float(order.get("price") or 0.0),
+            replaces=replaces,
+        )
+        self.open_orders[tracked.order_id] = tracked
+
+    async def _on_bar(self, price: float) -> None:
+        self._last_price = price
+        for order in list(self.open_orders.values()):
+            order.bars += 1
+            drift = abs(price - order.price) / order.price if order.price > 0 else 0.0
+            stale = order.bars >= self.max_bars > 0
+            drifted = self.max_drift_pct is not None and drift > self.max_drift_pct
+            if stale or drifted:
+                logger.info(
+                    "[ORDERS] %s %s unfilled (bars=%d, drift=%.4f) — cancel/replace",
+                    order.action,
+                    order.order_id,
+                    order.bars,
+                    drift,
+                )
+                await self._replace(order)
+
+    async def _poll(self) -> None:
+        for order in list(self.open_orders.values()):
+            info = await self.executor.fetch_order(order.order_id)
+            if info is None:
+                continue
+            status = (info.get("status") or "").lower()
+            if status in _DONE_STATUSES:
+                self.open_orders.pop(order.order_id, None)
+                self._settle(order, info)
+
+    def _settle(self, order: TrackedOrder, info: dict) -> float:
+        """Учитывает итог ордера; возвращает исполненный объём."""
+        filled = float(info.get("filled") or 0.0)
+        if filled > 0:
+            fill_price = float(info.get("average") or info.get("price") or order.price)
+            self.on_fill(order.action, fill_price)
+            if self.sink is not None:
+                self.sink.fill(order.action, fill_price, filled, order.order_id)
+        else:
+            logger.warning(
+                "[ENTRY %s] %s %s not filled",
+                (info.get("status") or "?").upper(),
+                order.action,
+                order.order_id,
+            )
+        return filled
+
+    async def _cancel(self, order: TrackedOrder) -> Optional[dict]:
+        """
+        Снимает ордер и возвращает его итог. None — биржа не подтвердила, что
+        ордер больше не висит (ошибка cancel/fetch): он мог остаться в стакане
+        или исполниться, поэтому остаётся в open_orders до следующей попытки.
+        """
+        cancelled = await self.executor.cancel_order(order.order_id)
+        info = await self.executor.fetch_order(order.order_id)
+        status = ((info or {}).get("status") or "").lower()
+        if status not in _DONE_STATUSES:
+            logger.warning(
+                "[ORDERS] %s %s: cancel %s, status %s — keep tracking",
+                order.action,
+                order.order_id,
+                "sent" if cancelled else "failed",
+                status or "unknown",
+            )
+            return None
+        self.open_orders.pop(order.order_id, None)
+        return info
+
+    async def _replace(self, order: TrackedOrder) -> None:
+        info = await self._cancel(order)
+        if info is None:
+            return  # повтор на следующем баре: ордер всё ещё stale/drifted
+        filled = self._settle(order, info)
+
+        remaining = floor_to_step(order.qty - filled, self.executor.qty_step)
+        if filled > 0 or remaining <= 0 or self._last_price is None:
+            return
+        if order.replaces >= self.max_replaces:
+            logger.info(
+                "[ORDERS] %s entry dropped after %d replace(s)",
+                order.action,
+                order.replaces,
+            )
+            return
+        new_order = await self.executor.place_entry(
+            order.action, remaining, self._last_price
+        )
+        self._track(new_order, order.action, replaces=order.replaces + 1)
@@ -0,0 +1,299 @@
+"""
+Режим --profile: прогон replay или ограниченной по времени live-сессии
+под профилировщиком.
+
+  deterministic — cProfile всего процесса (.prof + топ функций в отчёте);
+  sampling      — только сэмплер стеков (дешевле, без искажений cProfile).
+
+В обоих режимах:
+  * StageTimer оборачивает handle_kline, стадии StrategyCore, DataWS и Executor и
+    пишет по каждой стадии calls/total/mean/max (для корутин — время await);
+  * сэмплер главного потока пишет свёрнутые стеки (*.folded) для
+    flamegraph.pl / speedscope / inferno;
+  * tracemalloc снимает снимки раз в tracemalloc_interval_sec и пишет рост
+    по строкам относительно первого снимка;
+  * asyncio debug логирует шаги задач дольше slow_callback_ms.
+"""
+
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Literal, Optional
+
+from core.config import ProfileConfig
+
+logger = logging.getLogger(__name__)
+
+ProfileMode = Literal["deterministic", "sampling"]
+
+
+@dataclass(slots=True)
+class StageStats:
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class StageTimer:
+    """Подменяет методы объектов/классов обёртками с замером времени."""
+
+    def __init__(self) -> None:
+        self.stats: dict[str, StageStats] = {}
+        self._patched: list[tuple[Any, str, Any]] = []
+
+    def _wrap(self, name: str, fn: Callable) -> Callable:
+        stats = self.stats.setdefault(name, StageStats())
+        clock = time.perf_counter
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                t0 = clock()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    stats.add(clock() - t0)
+
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.add(clock() - t0)
+
+        return timed
+
+    def instrument(self, target: Any, methods: list[str], prefix: str) -> None:
+        """
+        target — экземпляр или класс. Для класса подменяется атрибут класса
+        (нужно, если экземпляр создаётся позже, как DataWS в run_live).
+        """
+        for method in methods:
+            original = inspect.getattr_static(target, method)
+            bound = getattr(target, method)
+            fn = original if isinstance(target, type) else bound
+            self._patched.append((target, method, original))
+            setattr(target, method, self._wrap(f"{prefix}.{method}", fn))
+
+    def restore(self) -> None:
+        for target, method, original in reversed(self._patched):
+            if isinstance(target, type):
+                setattr(target, method, original)
+            else:
+                # обёртка лежала в __dict__ экземпляра — вернуть метод класса
+                target.__dict__.pop(method, None)
+        self._patched.clear()
+
+    def report(self) -> str:
+        lines = [
+            f"{'stage':<44}{'calls':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}"
+        ]
+        for name, st in sorted(
+            self.stats.items(), key=lambda kv: kv[1].total, reverse=True
+        ):
+            if not st.calls:
+                continue
+            lines.append(
+                f"{name:<44}{st.calls:>10}{st.total:>12.3f}"
+                f"{st.total / st.calls * 1e3:>12.3f}{st.max * 1e3:>12.3f}"
+            )
+        return "\n".join(lines)
+
+
+class StackSampler(threading.Thread):
+    """Сэмплер стеков главного потока -> свёрнутые стеки (формат flamegraph.pl)."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.target_id = threading.main_thread().ident
+        self.samples: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def write_folded(self, path: Path) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, top: int) -> str:
+        """Самые частые верхушки стеков (self time)."""
+        leaf: Counter[str] = Counter()
+        for stack, count in self.samples.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaf.values()) or 1
+        lines = [f"{'samples':>10}{'%':>8}  function"]
+        for fn, count in leaf.most_common(top):
+            lines.append(f"{count:>10}{count / total * 100:>8.2f}  {fn}")
+        return "\n".join(lines)
+
+
+class MemorySnapshots:
+    def __init__(self, cfg: ProfileConfig) -> None:
+        self.cfg = cfg
+        self._first: Optional[tracemalloc.Snapshot] = None
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.cfg.tracemalloc_interval_sec is None:
+            return
+        tracemalloc.start(self.cfg.tracemalloc_frames)
+        self._first = self._last = tracemalloc.take_snapshot()
+        self._task = asyncio.create_task(self._loop(), name="tracemalloc")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.cfg.tracemalloc_interval_sec)
+            self._last = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            logger.info(
+                "[PROFILE] traced memory: %.1f MB (peak %.1f MB)",
+                current / 2**20,
+                peak / 2**20,
+            )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._last = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    def report(self, top: int) -> str:
+        if self._first is None or self._last is None:
+            return "(tracemalloc disabled)"
+        diff = self._last.compare_to(self._first, "lineno")
+        return "\n".join(str(stat) for stat in diff[:top])
+
+
+async def run_profiled(
+    app: Any,
+    mode: ProfileMode,
+    cfg: ProfileConfig,
+    duration: Optional[float] = None,
+) -> Path:
+    """Запускает app.run() под профилировщиком; возвращает путь к отчёту."""
+    from trade.data_ws import DataWS
+    from trade.ratelimit import rest_scheduler
+
+    out_dir = Path(cfg.output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    base = out_dir / f"{app.mode}_{mode}_{stamp}"
+
+    timer = StageTimer()
+    timer.instrument(app, ["handle_kline"], "app")
+    timer.instrument(app.core, ["on_bar", "decide"], "core")
+    timer.instrument(app.core.buffer, ["add"], "core.buffer")
+    timer.instrument(app.core.indicators, ["on_bar"], "core.indicators")
+    timer.instrument(app.core.state, ["update"], "core.strategy")
+    timer.instrument(
+        app.executor,
+        [
+            "order",
+            "place_entry",
+            "fetch_order",
+            "cancel_order",
+            "close_position",
+        ],
+        "executor",
+    )
+    timer.instrument(rest_scheduler, ["acquire"], "rest_scheduler")
+    timer.instrument(DataWS, ["_backfill", "_fetch_range"], "data_ws")
+
+    loop = asyncio.get_running_loop()
+    loop.set_debug(True)
+    loop.slow_callback_duration = cfg.slow_callback_ms / 1000
+
+    sampler = StackSampler(cfg.sample_interval_ms / 1000)
+    memory = MemorySnapshots(cfg)
+    profiler = cProfile.Profile() if mode == "deterministic" else None
+
+    logger.info(
+        "[PROFILE] %s profiling of %s mode%s",
+        mode,
+        app.mode,
+        f" for {duration:.0f}s" if duration else "",
+    )
+    memory.start()
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(app.run(), timeout=duration)
+    except asyncio.TimeoutError:
+        logger.info("[PROFILE] time limit reached")
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        sampler.stop()
+        await memory.stop()
+        timer.restore()
+        loop.set_debug(False)
+    wall = time.perf_counter() - t0
+
+    sections = [
+        f"mode={app.mode} profiler={mode} wall={wall:.3f}s",
+        "== stages ==\n" + timer.report(),
+        "== sampled self time ==\n" + sampler.report(cfg.top),
+    ]
+    if profiler is not None:
+        profiler.dump_stats(base.with_suffix(".prof"))
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(cfg.top)
+        sections.append("== cProfile (cumulative) ==\n" + buf.getvalue())
+    sections.append("== tracemalloc growth ==\n" + memory.report(cfg.top))
+
+    sampler.write_folded(base.with_suffix(".folded"))
+    report_path = base.with_suffix(".txt")
+    report_path.write_text("\n\n".join(sections) + "\n")
+    logger.info(
+        "[PROFILE] report: %s (flamegraph: %s)",
+        report_path,
+        base.with_suffix(".folded"),
+    )
+    return report_path
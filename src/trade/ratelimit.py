@@ -0,0 +1,198 @@
+"""
+Общий планировщик REST-запросов: один token bucket на все ccxt-клиенты
+(TradingApp.public_rest и Executor.exchange), очередь по приоритетам.
+
+Приоритеты (меньше — важнее):
+  EXIT     — reduceOnly-закрытия и всё, что нужно для выхода;
+  ENTRY    — выставление/снятие/опрос входных ордеров;
+  ACCOUNT  — балансы, позиции, метаданные рынка;
+  HISTORY  — загрузка истории и догрузка разрывов.
+
+Запросы выдаются строго в порядке (приоритет, время постановки). Классы
+ACCOUNT и HISTORY не могут опустошить ведро ниже ratelimit.reserve, так что
+выходу/входу всегда остаётся запас и они не ждут массовую загрузку истории.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from core.config import RateLimitConfig, settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    EXIT = 0
+    ENTRY = 1
+    ACCOUNT = 2
+    HISTORY = 3
+
+
+@dataclass(slots=True)
+class QueueStats:
+    count: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def add(self, wait: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.count if self.count else 0.0
+
+
+@dataclass(order=True, slots=True)
+class _Waiter:
+    priority: int
+    seq: int
+    weight: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class RestScheduler:
+    def __init__(
+        self,
+        rate_per_sec: float,
+        burst: float,
+        reserve: float = 0.0,
+        weights: Optional[dict[str, float]] = None,
+    ) -> None:
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.reserve = reserve
+        self.weights = dict(weights or {})
+
+        self._tokens: float = burst
+        self._stamp: float = time.monotonic()
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats: dict[Priority, QueueStats] = {p: QueueStats() for p in Priority}
+
+    @classmethod
+    def from_config(cls, cfg: RateLimitConfig) -> "RestScheduler":
+        return cls(cfg.rate_per_sec, cfg.burst, cfg.reserve, cfg.weights)
+
+    # ---------- API ----------
+
+    async def call(
+        self,
+        priority: Priority,
+        endpoint: str,
+        fn: Callable[..., Awaitable[T]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """Ждёт токены по весу endpoint и выполняет fn(*args, **kwargs)."""
+        await self.acquire(priority, self.weights.get(endpoint, 1.0))
+        return await fn(*args, **kwargs)
+
+    async def acquire(self, priority: Priority, weight: float = 1.0) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        if not self._heap and self._take(priority, weight):
+            self.stats[priority].add(0.0)
+            return
+
+        waiter = _Waiter(int(priority), next(self._seq), weight, loop.create_future())
+        heapq.heappush(self._heap, waiter)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        await waiter.future
+        self.stats[priority].add(loop.time() - started)
+
+    def summary(self) -> dict[str, float]:
+        out: dict[str, float] = {}
+        for priority, st in self.stats.items():
+            name = priority.name.lower()
+            out[f"{name}_count"] = float(st.count)
+            out[f"{name}_mean_wait"] = st.mean_wait
+            out[f"{name}_max_wait"] = st.max_wait
+        return out
+
+    def log_summary(self) -> None:
+        for priority, st in self.stats.items():
+            if st.count:
+                logger.info(
+                    "[RATELIMIT] %s: %d call(s), wait mean=%.3fs max=%.3fs",
+                    priority.name,
+                    st.count,
+                    st.mean_wait,
+                    st.max_wait,
+                )
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for waiter in self._heap:
+            waiter.future.cancel()
+        self._heap.clear()
+
+    # ---------- token bucket ----------
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _floor(self, priority: int) -> float:
+        return 0.0 if priority <= Priority.ENTRY else self.reserve
+
+    def _take(self, priority: int, weight: float) -> bool:
+        self._refill()
+        if self._tokens - weight < self._floor(priority):
+            return False
+        self._tokens -= weight
+        return True
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch(), name="rest-scheduler")
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            head = self._heap[0]
+            if head.future.done():  # вызывающий отменил ожидание
+                heapq.heappop(self._heap)
+                continue
+            if self._take(head.priority, head.weight):
+                heapq.heappop(self._heap)
+                head.future.set_result(None)
+                continue
+
+            # ждём недостающие токены; новый запрос с более высоким
+            # приоритетом будит раньше и пересматривает голову очереди
+            need = head.weight + self._floor(head.priority) - self._tokens
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=need / self.rate)
+            except asyncio.TimeoutError:
+                pass
+
+
+# общий экземпляр для всех ccxt-клиентов процесса
+rest_scheduler = RestScheduler.from_config(settings.ratelimit)
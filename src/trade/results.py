@@ -0,0 +1,472 @@
+"""
+Колоночное хранилище результатов replay/backtest.
+
+Прогон — каталог results.dir/<run_id>/:
+
+  meta.json          — режим, символ, таймфрейм, параметры стратегии,
+                       схема таблиц и число строк;
+  <table>/<col>.bin  — сырые little-endian колонки (dtype из схемы),
+                       дописываются кусками и открываются через memmap.
+
+Таблицы:
+  signals — бары с решением стратегии (ts, price, long, short);
+  orders  — бумажные входы (исполнение по close бара, как в backtest.py);
+  exits   — закрытия с PnL и причиной (TP / TRAIL / TRAIL-BE из
+            TrailingStopManager);
+  equity  — баланс, equity с нереализованным PnL и экспозиция (номинал
+            позиций / equity) на каждом баре.
+
+Строковые поля (side, reason) хранятся кодами uint8, словари — SIDES и
+EXIT_REASONS. Чтение — open_run(); метрики — trade/analytics.py.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from trade.engine import Action, BarSignals, StrategyCore
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+SIDES = ("long", "short")
+EXIT_REASONS = ("TP", "TRAIL", "TRAIL-BE", "OTHER")
+CATEGORIES: dict[str, tuple[str, ...]] = {"side": SIDES, "reason": EXIT_REASONS}
+
+SCHEMAS: dict[str, dict[str, str]] = {
+    "signals": {"ts": "<i8", "price": "<f8", "long": "u1", "short": "u1"},
+    "orders": {
+        "ts": "<i8",
+        "side": "u1",
+        "price": "<f8",
+        "qty": "<f8",
+        "balance": "<f8",
+    },
+    "exits": {
+        "ts": "<i8",
+        "side": "u1",
+        "entry_ts": "<i8",
+        "entry_price": "<f8",
+        "exit_price": "<f8",
+        "qty": "<f8",
+        "pnl": "<f8",
+        "reason": "u1",
+    },
+    "equity": {"ts": "<i8", "balance": "<f8", "equity": "<f8", "exposure": "<f8"},
+}
+
+_SIDE_CODE = {side: i for i, side in enumerate(SIDES)}
+_REASON_CODE = {reason: i for i, reason in enumerate(EXIT_REASONS)}
+
+
+def reason_code(reason: str) -> int:
+    return _REASON_CODE.get(reason, _REASON_CODE["OTHER"])
+
+
+def new_run_dir(root: Union[str, Path], name: str) -> Path:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return Path(root) / f"{name}_{stamp}"
+
+
+# ---------- запись ----------
+
+
+class _TableWriter:
+    """
+    Колонки таблицы копятся в памяти по chunk_rows строк; файл колонки
+    открывается только на время дозаписи куска — десятки прогонов (теневые
+    варианты) не держат сотни дескрипторов.
+    """
+
+    def __init__(self, path: Path, schema: Mapping[str, str], chunk_rows: int):
+        path.mkdir(parents=True, exist_ok=True)
+        self.columns = list(schema)
+        self._chunk = {
+            col: np.empty(chunk_rows, dtype=dt) for col, dt in schema.items()
+        }
+        self._arrays = [self._chunk[col] for col in self.columns]
+        self._paths = {col: path / f"{col}.bin" for col in self.columns}
+        for file in self._paths.values():
+            file.touch()
+        self._n = 0
+        self.rows = 0
+
+    def add(self, *values: Any) -> None:
+        n = self._n
+        for arr, value in zip(self._arrays, values):
+            arr[n] = value
+        self._n = n + 1
+        if self._n == len(self._arrays[0]):
+            self.flush()
+
+    def extend(self, columns: Mapping[str, np.ndarray]) -> None:
+        """Векторная дозапись (колонки одинаковой длины)."""
+        self.flush()
+        arrays = {
+            col: np.ascontiguousarray(columns[col], dtype=self._chunk[col].dtype)
+            for col in self.columns
+        }
+        size = len(arrays[self.columns[0]])
+        for col, arr in arrays.items():
+            if len(arr) != size:
+                raise ValueError(f"column {col}: {len(arr)} rows, expected {size}")
+        self._append(arrays)
+        self.rows += size
+
+    def flush(self) -> None:
+        if not self._n:
+            return
+        self._append({col: self._chunk[col][: self._n] for col in self.columns})
+        self.rows += self._n
+        self._n = 0
+
+    def _append(self, arrays: Mapping[str, np.ndarray]) -> None:
+        for col, arr in arrays.items():
+            if len(arr):
+                with open(self._paths[col], "ab") as f:
+                    arr.tofile(f)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class ResultsWriter:
+    def __init__(
+        self,
+        run_dir: Union[str, Path],
+        meta: Optional[Mapping[str, Any]] = None,
+        chunk_rows: int = 65_536,
+    ) -> None:
+        self.path = Path(run_dir)
+        if (self.path / "meta.json").exists():
+            raise FileExistsError(f"Results run already exists: {self.path}")
+        self.meta = dict(meta or {})
+        self.tables = {
+            name: _TableWriter(self.path / name, schema, chunk_rows)
+            for name, schema in SCHEMAS.items()
+        }
+        self._signals = self.tables["signals"].add
+        self._orders = self.tables["orders"].add
+        self._exits = self.tables["exits"].add
+        self._equity = self.tables["equity"].add
+
+    def signal(self, ts: int, price: float, long: bool, short: bool) -> None:
+        self._signals(ts, price, long, short)
+
+    def order(self, ts: int, side: str, price: float, qty: float, balance: float):
+        self._orders(ts, _SIDE_CODE[side], price, qty, balance)
+
+    def exit(
+        self,
+        ts: int,
+        side: str,
+        entry_ts: int,
+        entry_price: float,
+        exit_price: float,
+        qty: float,
+        pnl: float,
+        reason: str,
+    ) -> None:
+        self._exits(
+            ts,
+            _SIDE_CODE[side],
+            entry_ts,
+            entry_price,
+            exit_price,
+            qty,
+            pnl,
+            reason_code(reason),
+        )
+
+    def equity(self, ts: int, balance: float, equity: float, exposure: float):
+        self._equity(ts, balance, equity, exposure)
+
+    def close(self) -> Path:
+        for table in self.tables.values():
+            table.close()
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(),
+            **self.meta,
+            "schema": SCHEMAS,
+            "categories": CATEGORIES,
+            "rows": {name: t.rows for name, t in self.tables.items()},
+        }
+        (self.path / "meta.json").write_text(
+            json.dumps(meta, indent=2, default=str) + "\n"
+        )
+        logger.info(
+            "[RESULTS] %s: %s",
+            self.path,
+            ", ".join(f"{k}={v}" for k, v in meta["rows"].items()),
+        )
+        return self.path
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# ---------- бумажный счёт replay ----------
+
+
+@dataclass(slots=True)
+class _Position:
+    qty: float = 0.0
+    cost: float = 0.0
+    entry_ts: int = 0
+
+
+class ReplayRecorder:
+    """
+    Бумажный счёт для replay: входы исполняются по close бара (как в
+    backtest.py) и подтверждаются ядру через on_fill, выходы закрывают всю
+    позицию стороны. Всё пишется в ResultsWriter; баланс отдаётся ядру в
+    decide(), так что просадка и cooldown работают как в live.
+    """
+
+    def __init__(
+        self,
+        writer: ResultsWriter,
+        on_fill: Callable[[str, float], None],
+        start_balance: float,
+        order_percent: float,
+        max_order_cost: Optional[float] = None,
+    ) -> None:
+        self.writer = writer
+        self.on_fill = on_fill
+        self.balance = start_balance
+        self.order_percent = order_percent
+        self.max_order_cost = max_order_cost
+        self.positions = {side: _Position() for side in SIDES}
+
+    def on_bar(
+        self,
+        ts: int,
+        price: float,
+        signals: Optional[BarSignals],
+        actions: list[Action],
+    ) -> None:
+        w = self.writer
+        if signals is not None:
+            w.signal(ts, price, signals.long, signals.short)
+
+        for action in actions:
+            if action.kind == "enter":
+                self._enter(ts, action.side, price)
+            elif action.kind == "exit":
+                self._exit(ts, action.side, price, action.reason)
+
+        unrealized = 0.0
+        notional = 0.0
+        for side, pos in self.positions.items():
+            if pos.qty:
+                value = pos.qty * price
+                notional += value
+                unrealized += value - pos.cost if side == "long" else pos.cost - value
+        equity = self.balance + unrealized
+        w.equity(ts, self.balance, equity, notional / equity if equity > 0 else 0.0)
+
+    def _enter(self, ts: int, side: str, price: float) -> None:
+        qty = (self.balance * self.order_percent) / max(price, 1e-12)
+        if qty <= 0:
+            return
+        if self.max_order_cost is not None and qty * price > self.max_order_cost:
+            return
+        pos = self.positions[side]
+        if pos.qty == 0.0:
+            pos.entry_ts = ts
+        pos.qty += qty
+        pos.cost += qty * price
+        self.writer.order(ts, side, price, qty, self.balance)
+        self.on_fill(side, price)
+
+    def _exit(self, ts: int, side: str, price: float, reason: str) -> None:
+        pos = self.positions[side]
+        if pos.qty <= 0:
+            return
+        avg_entry = pos.cost / pos.qty
+        pnl = (
+            pos.qty * (price - avg_entry)
+            if side == "long"
+            else pos.qty * (avg_entry - price)
+        )
+        self.balance += pnl
+        self.writer.exit(ts, side, pos.entry_ts, avg_entry, price, pos.qty, pnl, reason)
+        self.positions[side] = _Position()
+
+
+def replay_bars(
+    core: StrategyCore,
+    recorder: Optional[ReplayRecorder],
+    chunks: Iterable[pd.DataFrame],
+    rows: Optional[Iterator[dict]] = None,
+    on_bar: Optional[Callable[[dict, Optional[BarSignals], list[Action]], None]] = None,
+) -> int:
+    """
+    Общий цикл replay (run_replay, batch): бары кусков OHLCV -> ядро ->
+    бумажный счёт. rows — готовые значения индикаторов тех же баров
+    (FeatureStore); recorder=None — без счёта, decide без баланса.
+    on_bar(kline, signals, actions) — журнал и логи вызывающего.
+    Возвращает число баров.
+    """
+    processed = 0
+    for chunk in chunks:
+        # ядро синхронное: без корутины на каждый бар
+        for ts, o, h, l, c, v in chunk.itertuples(index=False, name=None):
+            kline = {
+                "start_at": int(ts),
+                "open": float(o),
+                "high": float(h),
+                "low": float(l),
+                "close": float(c),
+                "volume": float(v),
+            }
+            signals = core.on_bar(kline, next(rows) if rows is not None else None)
+            actions = (
+                core.decide(signals, recorder.balance if recorder else None)
+                if signals is not None
+                else []
+            )
+            if recorder is not None:
+                recorder.on_bar(kline["start_at"], kline["close"], signals, actions)
+            if on_bar is not None:
+                on_bar(kline, signals, actions)
+            core.step_shadows()
+            processed += 1
+    return processed
+
+
+def write_ledger(
+    writer: ResultsWriter,
+    ledger: pd.DataFrame,
+    ts: np.ndarray,
+    start_balance: float,
+) -> None:
+    """
+    Журнал сделок backtest/walk-forward (LEDGER_COLUMNS) -> orders/exits и
+    equity по барам ts. Equity здесь реализованная (сделки исполнены по
+    close, внутри сделки цена неизвестна), экспозиция — номинал по цене входа.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    n = len(ledger)
+    side = ledger["side"].map(_SIDE_CODE).to_numpy(np.uint8) if n else np.empty(0)
+    entry_ts = ledger["entry_ts"].to_numpy(np.int64)
+    exit_ts = ledger["exit_ts"].to_numpy(np.int64)
+    qty = ledger["qty"].to_numpy(float)
+    entry_price = ledger["entry_price"].to_numpy(float)
+    pnl = ledger["pnl"].to_numpy(float)
+
+    # баланс на момент входа: стартовый + PnL сделок, закрытых не позже
+    by_exit = np.argsort(exit_ts, kind="stable")
+    realized = start_balance + np.concatenate(([0.0], np.cumsum(pnl[by_exit])))
+    order = np.argsort(entry_ts, kind="stable")
+    closed_before = np.searchsorted(exit_ts[by_exit], entry_ts[order], side="right")
+    writer.tables["orders"].extend(
+        {
+            "ts": entry_ts[order],
+            "side": side[order],
+            "price": entry_price[order],
+            "qty": qty[order],
+            "balance": realized[closed_before],
+        }
+    )
+    writer.tables["exits"].extend(
+        {
+            "ts": exit_ts,
+            "side": side,
+            "entry_ts": entry_ts,
+            "entry_price": entry_price,
+            "exit_price": ledger["exit_price"].to_numpy(float),
+            "qty": qty,
+            "pnl": pnl,
+            "reason": np.fromiter(
+                (reason_code(r) for r in ledger["reason"]), np.uint8, n
+            ),
+        }
+    )
+
+    exit_idx = np.clip(np.searchsorted(ts, exit_ts), 0, max(len(ts) - 1, 0))
+    balance = start_balance + np.cumsum(
+        np.bincount(exit_idx, weights=pnl, minlength=len(ts))[: len(ts)]
+    )
+    entry_idx = np.searchsorted(ts, entry_ts)
+    held = np.zeros(len(ts) + 1)
+    np.add.at(held, entry_idx, qty * entry_price)
+    np.add.at(held, exit_idx, -qty * entry_price)
+    notional = np.cumsum(held)[: len(ts)]
+    writer.tables["equity"].extend(
+        {
+            "ts": ts,
+            "balance": balance,
+            "equity": balance,
+            "exposure": np.divide(
+                notional, balance, out=np.zeros(len(ts)), where=balance > 0
+            ),
+        }
+    )
+
+
+# ---------- чтение ----------
+
+
+@dataclass
+class RunResults:
+    path: Path
+    meta: dict[str, Any]
+    _tables: dict[str, dict[str, np.ndarray]] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def tf_ms(self) -> Optional[int]:
+        return self.meta.get("tf_ms")
+
+    def table(self, name: str) -> dict[str, np.ndarray]:
+        """Колонки таблицы как memmap (без чтения в память)."""
+        if name not in self._tables:
+            rows = self.meta["rows"][name]
+            cols = {}
+            for col, dt in self.meta["schema"][name].items():
+                path = self.path / name / f"{col}.bin"
+                cols[col] = (
+                    np.memmap(path, dtype=dt, mode="r", shape=(rows,))
+                    if rows
+                    else np.empty(0, dtype=dt)
+                )
+            self._tables[name] = cols
+        return self._tables[name]
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """Таблица в pandas; коды side/reason -> Categorical."""
+        data: dict[str, Any] = {}
+        for col, values in self.table(name).items():
+            categories = self.meta.get("categories", {}).get(col)
+            if categories is not None:
+                data[col] = pd.Categorical.from_codes(
+                    np.asarray(values, dtype=np.int8), categories
+                )
+            else:
+                data[col] = np.asarray(values)
+        return pd.DataFrame(data)
+
+
+def open_run(path: Union[str, Path]) -> RunResults:
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"{path}: unsupported results format {meta.get('format_version')}"
+        )
+    return RunResults(path, meta)
@@ -0,0 +1,285 @@
+"""
+Теневые варианты стратегии на общем графе индикаторов.
+
+StrategyCore считает индикаторы один раз на бар и отдаёт значения в
+ShadowBook после исполнения действий основной конфигурации
+(StrategyCore.step_shadows); N вариантов параметров (retest_pct, max_bars_wait, пороги RSI,
+трейлинг, TP, min_atr_1h, order_percent, ...) получают сигналы одним
+векторным шагом BatchStrategyState, а решения принимает собственный
+DecisionCore каждого варианта — тот же код, что у основной конфигурации в
+live/replay и в backtest. Бумажный счёт — массивы [N, 2] (лонг, шорт).
+Торгует только основная конфигурация; варианты только записываются.
+
+Порядок на баре повторяет replay с ReplayRecorder: фильтр ATR → сигналы →
+DecisionCore.decide → действия по порядку (выходы закрывают позицию
+стороны, входы по close) → equity. Вариант с параметрами основной конфигурации
+повторяет её replay сделка в сделку.
+
+Каждый вариант пишется своим прогоном в колоночное хранилище
+(trade/results.py), сравнение — python -m trade.analytics по их каталогам.
+"""
+
+import logging
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import WebsocketConfig
+from trade.engine import BarSignals, DecisionCore
+from trade.results import SIDES, ResultsWriter
+from trade.strategy import BatchStrategyState
+
+logger = logging.getLogger(__name__)
+
+_SIGN = np.array([1.0, -1.0])  # знак PnL: лонг, шорт
+
+
+class ShadowBook:
+    def __init__(
+        self,
+        variants: Mapping[str, WebsocketConfig],
+        start_balance: float = 1000.0,
+        writers: Optional[Mapping[str, ResultsWriter]] = None,
+        max_consecutive_losses: int = 3,
+        cooldown_bars_after_losses: int = 10,
+        summary_every: int = 0,
+        buffer_bars: int = 1024,
+    ) -> None:
+        if not variants:
+            raise ValueError("ShadowBook: нет вариантов")
+        self.names = list(variants)
+        params = list(variants.values())
+        n = len(params)
+        self.n = n
+
+        def col(name: str, default: float = np.nan) -> np.ndarray:
+            values = [getattr(p, name) for p in params]
+            return np.array([default if v is None else v for v in values], dtype=float)
+
+        self.state = BatchStrategyState(
+            n,
+            retest_pct=col("retest_pct"),
+            max_bars_wait=np.array([p.max_bars_wait for p in params], dtype=np.int64),
+            rsi_long_max=col("rsi_long_max"),
+            rsi_short_min=col("rsi_short_min"),
+        )
+        self.min_atr = col("min_atr_1h", -np.inf)
+        self.order_percent = col("order_percent")
+        self.max_cost = col("max_order_cost_usdt", np.inf)
+        self.cores = [
+            DecisionCore(
+                p, max_consecutive_losses, cooldown_bars_after_losses, log=False
+            )
+            for p in params
+        ]
+        self.summary_every = summary_every
+
+        # бумажный счёт
+        self.balance = np.full(n, float(start_balance))
+        self.qty = np.zeros((n, 2))
+        self.cost = np.zeros((n, 2))
+        self.entry_ts = np.zeros((n, 2), dtype=np.int64)
+
+        self.trades = np.zeros(n, dtype=np.int64)
+        self.wins = np.zeros(n, dtype=np.int64)
+        self.bars = 0
+        self._writers = [writers[name] for name in self.names] if writers else None
+
+        # signals/equity всех вариантов копятся по барам [buffer_bars, N] и
+        # дописываются в хранилище колонками; orders/exits редки — построчно
+        self._rows = 0
+        self._ts = np.zeros(buffer_bars, dtype=np.int64)
+        self._price = np.zeros(buffer_bars)
+        self._decided = np.zeros((buffer_bars, n), dtype=bool)
+        self._long = np.zeros((buffer_bars, n), dtype=bool)
+        self._short = np.zeros((buffer_bars, n), dtype=bool)
+        self._balance = np.zeros((buffer_bars, n))
+        self._equity = np.zeros((buffer_bars, n))
+        self._exposure = np.zeros((buffer_bars, n))
+
+    def on_bar(self, ts: int, price: float, values: Mapping[str, Any]) -> None:
+        """
+        Бар после графа индикаторов (values — IndicatorGraph.on_bar). На барах
+        прогрева пишется только equity, как у ReplayRecorder.
+        """
+        self.bars += 1
+        inputs = [values[k] for k in ("ema60_5", "ema163_5", "ema1h", "rsi1d")]
+        if any(v is None for v in inputs):
+            self._record(ts, price)
+            return
+        ema60_5, ema163_5, ema1h, rsi1d = inputs
+
+        atr = values["atr1h"]
+        if atr is None:
+            tradable = np.isneginf(self.min_atr)
+        else:
+            tradable = ~(atr < self.min_atr)
+        long_sig, short_sig = self.state.on_new_bars(
+            ts,
+            price,
+            price5=price,
+            ema60_5=ema60_5,
+            ema163_5=ema163_5,
+            ema1h=ema1h,
+            rsi1d=rsi1d,
+            active=tradable,
+        )
+
+        longs, shorts = long_sig.tolist(), short_sig.tolist()
+        for i in np.flatnonzero(tradable).tolist():
+            core = self.cores[i]
+            signals = BarSignals(ts, price, longs[i], shorts[i])
+            for action in core.decide(signals, float(self.balance[i])):
+                if action.kind == "enter":
+                    if self._enter(i, ts, action.side, price):
+                        core.on_entry_filled(action.side, price)
+                elif action.kind == "exit":
+                    self._exit(i, ts, action.side, price, action.reason)
+
+        self._record(ts, price, tradable, long_sig, short_sig)
+        if self.summary_every > 0 and self.bars % self.summary_every == 0:
+            logger.info("[SHADOW] %s", self.brief(price))
+
+    # ---------- бумажный счёт (как ReplayRecorder) ----------
+
+    def _enter(self, i: int, ts: int, side: str, price: float) -> bool:
+        balance = float(self.balance[i])
+        qty = balance * float(self.order_percent[i]) / max(price, 1e-12)
+        if qty <= 0 or qty * price > self.max_cost[i]:
+            return False
+        k = SIDES.index(side)
+        if self.qty[i, k] == 0.0:
+            self.entry_ts[i, k] = ts
+        self.qty[i, k] += qty
+        self.cost[i, k] += qty * price
+        if self._writers is not None:
+            self._writers[i].order(ts, side, price, qty, balance)
+        return True
+
+    def _exit(self, i: int, ts: int, side: str, price: float, reason: str) -> None:
+        k = SIDES.index(side)
+        qty = float(self.qty[i, k])
+        if qty <= 0:
+            return
+        avg_entry = float(self.cost[i, k]) / qty
+        pnl = qty * (price - avg_entry) if side == "long" else qty * (avg_entry - price)
+        self.balance[i] += pnl
+        self.trades[i] += 1
+        self.wins[i] += pnl > 0
+        self.qty[i, k] = 0.0
+        self.cost[i, k] = 0.0
+        if self._writers is not None:
+            self._writers[i].exit(
+                ts, side, int(self.entry_ts[i, k]), avg_entry, price, qty, pnl, reason
+            )
+        logger.debug(
+            "[SHADOW] %s exit %s at %.6f (%s), pnl=%.4f",
+            self.names[i],
+            side,
+            price,
+            reason,
+            pnl,
+        )
+
+    def equity(self, price: float) -> tuple[np.ndarray, np.ndarray]:
+        """(equity, notional) вариантов по цене price."""
+        value = self.qty * price
+        unrealized = ((value - self.cost) * _SIGN).sum(axis=1)
+        return self.balance + unrealized, value.sum(axis=1)
+
+    def _record(
+        self,
+        ts: int,
+        price: float,
+        decided: Optional[np.ndarray] = None,
+        long_sig: Optional[np.ndarray] = None,
+        short_sig: Optional[np.ndarray] = None,
+    ) -> None:
+        if self._writers is None:
+            return
+        row = self._rows
+        self._ts[row] = ts
+        self._price[row] = price
+        self._decided[row] = False if decided is None else decided
+        self._long[row] = False if long_sig is None else long_sig
+        self._short[row] = False if short_sig is None else short_sig
+        equity, notional = self.equity(price)
+        self._balance[row] = self.balance
+        self._equity[row] = equity
+        self._exposure[row] = np.divide(
+            notional, equity, out=np.zeros(self.n), where=equity > 0
+        )
+        self._rows = row + 1
+        if self._rows == len(self._ts):
+            self.flush()
+
+    def flush(self) -> None:
+        rows = self._rows
+        if self._writers is None or not rows:
+            return
+        ts = self._ts[:rows]
+        price = self._price[:rows]
+        for i, writer in enumerate(self._writers):
+            decided = self._decided[:rows, i]
+            writer.tables["signals"].extend(
+                {
+                    "ts": ts[decided],
+                    "price": price[decided],
+                    "long": self._long[:rows, i][decided],
+                    "short": self._short[:rows, i][decided],
+                }
+            )
+            writer.tables["equity"].extend(
+                {
+                    "ts": ts,
+                    "balance": self._balance[:rows, i],
+                    "equity": self._equity[:rows, i],
+                    "exposure": self._exposure[:rows, i],
+                }
+            )
+        self._rows = 0
+
+    # ---------- сводки ----------
+
+    def summary(self, price: Optional[float] = None) -> pd.DataFrame:
+        equity = self.equity(price)[0] if price is not None else self.balance
+        return pd.DataFrame(
+            {
+                "balance": self.balance,
+                "equity": equity,
+                "trades": self.trades,
+                "win_rate": np.divide(
+                    self.wins,
+                    self.trades,
+                    out=np.full(self.n, np.nan),
+                    where=self.trades > 0,
+                ),
+                "open_long": self.qty[:, 0] > 0,
+                "open_short": self.qty[:, 1] > 0,
+                "stopped": [c.is_stopped_due_to_drawdown for c in self.cores],
+            },
+            index=pd.Index(self.names, name="variant"),
+        )
+
+    def brief(self, price: float) -> str:
+        equity = self.equity(price)[0]
+        return " | ".join(
+            f"{name} eq={eq:.2f} trades={t}"
+            for name, eq, t in zip(self.names, equity, self.trades)
+        )
+
+    def close(self) -> None:
+        if self.bars:
+            with pd.option_context("display.width", 200):
+                logger.info(
+                    "[SHADOW] %d variants, %d bars\n%s",
+                    self.n,
+                    self.bars,
+                    self.summary().to_string(),
+                )
+        if self._writers is not None:
+            self.flush()
+            for writer in self._writers:
+                writer.close()
+            self._writers = None
@@ -0,0 +1,378 @@
+"""
+Журнал SQLite (WAL): бары, сигналы, ордера, исполнения и снимки баланса
+из live и replay.
+
+Вызовы SqliteSink.bar/signal/order/fill/balance только кладут строку в
+asyncio.Queue и никогда не ждут диск. Фоновая задача пишет строки
+транзакциями до batch_rows в отдельном потоке — соединение живёт только в
+нём; одиночную строку (live) она сначала придерживает flush_interval
+секунд, чтобы строки бара ушли одной транзакцией, а при очереди пишет сразу.
+
+Очередь ограничена max_backlog строк. Replay, который кладёт строки быстрее
+диска, ждёт drain() — обратное давление; в live обработчик не ждёт, и
+строки сверх предела теряются с предупреждением (счётчик dropped).
+
+Таблицы (ts — мс UTC; mode — live/replay):
+  bars(symbol, timeframe, ts, o, h, l, c, v)        PK (symbol, timeframe, ts)
+  signals(symbol, timeframe, mode, ts, price, long, short)
+                                                    PK (symbol, timeframe, mode, ts)
+  orders(symbol, mode, ts, side, kind, price, qty, order_id, status, reason)
+  fills(symbol, mode, ts, side, price, qty, order_id)
+  balances(symbol, mode, ts, total)
+Бары и сигналы — WITHOUT ROWID по ключу (повтор бара заменяет строку),
+остальные таблицы индексированы по (symbol, ts): выборка символа за период
+идёт по индексу и не зависит от объёма журнала (см. read_table).
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import pandas as pd
+
+from trade.engine import BarSignals
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL, timeframe TEXT NOT NULL, ts INTEGER NOT NULL,
+    o REAL, h REAL, l REAL, c REAL, v REAL,
+    PRIMARY KEY (symbol, timeframe, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS signals (
+    symbol TEXT NOT NULL, timeframe TEXT NOT NULL, mode TEXT NOT NULL,
+    ts INTEGER NOT NULL, price REAL, long INTEGER, short INTEGER,
+    PRIMARY KEY (symbol, timeframe, mode, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS orders (
+    symbol TEXT NOT NULL, mode TEXT NOT NULL, ts INTEGER NOT NULL,
+    side TEXT, kind TEXT, price REAL, qty REAL,
+    order_id TEXT, status TEXT, reason TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_symbol_ts ON orders (symbol, ts);
+CREATE TABLE IF NOT EXISTS fills (
+    symbol TEXT NOT NULL, mode TEXT NOT NULL, ts INTEGER NOT NULL,
+    side TEXT, price REAL, qty REAL, order_id TEXT
+);
+CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, ts);
+CREATE TABLE IF NOT EXISTS balances (
+    symbol TEXT NOT NULL, mode TEXT NOT NULL, ts INTEGER NOT NULL, total REAL
+);
+CREATE INDEX IF NOT EXISTS balances_symbol_ts ON balances (symbol, ts);
+"""
+
+_INSERT = {
+    "bars": "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    "signals": "INSERT OR REPLACE INTO signals VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "orders": "INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "fills": "INSERT INTO fills VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "balances": "INSERT INTO balances VALUES (?, ?, ?, ?)",
+}
+TABLES = tuple(_INSERT)
+# колонки таблиц SCHEMA: только они допустимы в фильтрах read_table
+COLUMNS: dict[str, tuple[str, ...]] = {
+    "bars": ("symbol", "timeframe", "ts", "o", "h", "l", "c", "v"),
+    "signals": ("symbol", "timeframe", "mode", "ts", "price", "long", "short"),
+    "orders": (
+        "symbol",
+        "mode",
+        "ts",
+        "side",
+        "kind",
+        "price",
+        "qty",
+        "order_id",
+        "status",
+        "reason",
+    ),
+    "fills": ("symbol", "mode", "ts", "side", "price", "qty", "order_id"),
+    "balances": ("symbol", "mode", "ts", "total"),
+}
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def connect(path: Union[str, Path]) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # в WAL synchronous=NORMAL не теряет согласованность, только последние
+    # транзакции при падении ОС
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class SqliteSink:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        symbol: str,
+        timeframe: str,
+        mode: str,
+        batch_rows: int = 5000,
+        flush_interval: float = 0.5,
+        max_backlog: int = 100_000,
+    ) -> None:
+        self.path = Path(path)
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.mode = mode
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_backlog)
+        self._flushed = asyncio.Event()  # транзакция записана (см. drain)
+        self._task: Optional[asyncio.Task] = None
+        # одно соединение и один поток: транзакции идут строго по очереди
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sink")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    # ---------- запись из обработчиков (без await) ----------
+
+    def bar(self, kline: dict) -> None:
+        self._put(
+            (
+                "bars",
+                (
+                    self.symbol,
+                    self.timeframe,
+                    int(kline["start_at"]),
+                    float(kline["open"]),
+                    float(kline["high"]),
+                    float(kline["low"]),
+                    float(kline["close"]),
+                    float(kline["volume"]),
+                ),
+            )
+        )
+
+    def signal(self, signals: BarSignals) -> None:
+        self._put(
+            (
+                "signals",
+                (
+                    self.symbol,
+                    self.timeframe,
+                    self.mode,
+                    signals.ts,
+                    signals.price,
+                    int(signals.long),
+                    int(signals.short),
+                ),
+            )
+        )
+
+    def order(
+        self,
+        side: str,
+        kind: str,
+        price: float,
+        qty: Optional[float] = None,
+        order_id: Optional[str] = None,
+        status: str = "",
+        reason: str = "",
+        ts: Optional[int] = None,
+    ) -> None:
+        self._put(
+            (
+                "orders",
+                (
+                    self.symbol,
+                    self.mode,
+                    _now_ms() if ts is None else ts,
+                    side,
+                    kind,
+                    price,
+                    qty,
+                    order_id,
+                    status,
+                    reason,
+                ),
+            )
+        )
+
+    def fill(
+        self,
+        side: str,
+        price: float,
+        qty: Optional[float] = None,
+        order_id: Optional[str] = None,
+        ts: Optional[int] = None,
+    ) -> None:
+        self._put(
+            (
+                "fills",
+                (
+                    self.symbol,
+                    self.mode,
+                    _now_ms() if ts is None else ts,
+                    side,
+                    price,
+                    qty,
+                    order_id,
+                ),
+            )
+        )
+
+    def balance(self, total: float, ts: Optional[int] = None) -> None:
+        self._put(
+            (
+                "balances",
+                (self.symbol, self.mode, _now_ms() if ts is None else ts, total),
+            )
+        )
+
+    def _put(self, item: tuple[str, tuple]) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 10_000 == 0:
+                logger.warning(
+                    "[SINK] Queue full (%d rows), %d rows dropped",
+                    self._queue.maxsize,
+                    self.dropped,
+                )
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize()
+
+    async def drain(self, backlog: Optional[int] = None) -> None:
+        """
+        Ждёт, пока в очереди останется не больше backlog строк (по умолчанию
+        batch_rows). Replay вызывает между кусками баров.
+        """
+        limit = self.batch_rows if backlog is None else backlog
+        while self._queue.qsize() > limit and self._task and not self._task.done():
+            self._flushed.clear()
+            await self._flushed.wait()
+
+    # ---------- фоновая запись ----------
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        self._conn = await loop.run_in_executor(self._pool, connect, self.path)
+        self._task = asyncio.create_task(self._run())
+        logger.info("[SINK] Journal %s (WAL), mode=%s", self.path, self.mode)
+
+    async def stop(self) -> None:
+        """Дописывает очередь и закрывает соединение."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._pool, self._conn.close)
+        self._pool.shutdown()
+        logger.info(
+            "[SINK] Closed %s: %d rows in %d transactions, %d dropped",
+            self.path,
+            self.written,
+            self.batches,
+            self.dropped,
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            batch = []
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+                if not self._stopping and self._queue.empty():
+                    # короткое ожидание собирает строки одного бара в транзакцию;
+                    # при накопленной очереди пишем сразу
+                    await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_rows:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stopping = True
+                    continue
+                batch.append(item)
+            if stopping and not self._queue.empty():
+                # stop() во время длинной очереди: дописываем всё
+                stopping = False
+                self._queue.put_nowait(None)
+            if not batch:
+                continue
+            try:
+                await loop.run_in_executor(self._pool, self._write, batch)
+            except sqlite3.Error as e:
+                logger.error("[SINK] dropped %d rows: %s", len(batch), e)
+            finally:
+                self._flushed.set()
+
+    def _write(self, batch: list[tuple[str, tuple]]) -> None:
+        rows: dict[str, list[tuple]] = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        with self._conn:
+            for table, values in rows.items():
+                self._conn.executemany(_INSERT[table], values)
+        self.written += len(batch)
+        self.batches += 1
+
+
+def read_table(
+    path: Union[str, Path],
+    table: str,
+    symbol: Optional[str] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    **where: Any,
+) -> pd.DataFrame:
+    """
+    Строки table за [start, end) (ts в мс) по индексу (symbol, ts);
+    where — дополнительные равенства по колонкам таблицы (timeframe="5m",
+    mode="live", ...).
+    """
+    if table not in TABLES:
+        raise ValueError(f"unknown journal table: {table}")
+    unknown = set(where) - set(COLUMNS[table])
+    if unknown:
+        raise ValueError(f"unknown {table} columns: {sorted(unknown)}")
+    clauses, params = [], []
+    if symbol is not None:
+        clauses.append("symbol = ?")
+        params.append(symbol)
+    for column, value in where.items():
+        clauses.append(f"{column} = ?")
+        params.append(value)
+    if start is not None:
+        clauses.append("ts >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("ts < ?")
+        params.append(end)
+    sql = f"SELECT * FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY ts"
+    # connect() как контекст только завершает транзакцию, closing — закрывает
+    with closing(sqlite3.connect(f"file:{Path(path)}?mode=ro", uri=True)) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
@@ -0,0 +1,422 @@
+"""
+Soak-тест (mode=soak): миллионы синтетических баров через настоящий live-путь
+TradingApp.handle_kline — StrategyCore (буфер, индикаторы, трейлинги),
+OrderManager, Executor и rest_scheduler — с биржей-заглушкой PaperExchange
+вместо ccxt. Бары подаются без пауз (ускоренное время).
+
+Каждые sample_every баров пишется строка отчёта:
+  RSS процесса, число объектов под gc, паузы сборщика за окно,
+  p50/p99/max латентности handle_kline за окно.
+
+После warmup_bars (прогрев буферов и индикаторов) считаются тренды:
+  * наклон RSS (МБ на миллион баров, МНК) по второй половине окон —
+    разовые ступеньки аллокатора в начале не считаются утечкой —
+    > max_rss_growth_mb_per_mbar;
+  * медиана p50 латентности в последней четверти окон / в первой
+    > max_latency_ratio.
+Любое из условий — провал (run_soak возвращает False, main выходит с 1).
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import SoakConfig
+from trade.ratelimit import rest_scheduler
+from trade.synthetic import SyntheticMarket
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_DONE_KEEP = 1024  # сколько завершённых ордеров помнит заглушка
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux /proc; иначе пиковый из getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ---------- биржа-заглушка ----------
+
+
+class PaperExchange:
+    """
+    Минимальная замена ccxt.bybit для Executor: рынок, баланс, PostOnly-лимитки,
+    позиции и reduceOnly-маркет. Лимитка Buy исполняется, если low бара <= цены,
+    Sell — если high >= цены; маркет-закрытие — по close последнего бара.
+    Баланс постоянный (PnL копится в realized_pnl): стоп по просадке не должен
+    останавливать торговлю посреди прогона.
+    """
+
+    def __init__(
+        self, symbol_cx: str, balance: float, tick: float = 0.01, step: float = 0.01
+    ) -> None:
+        self.symbol_cx = symbol_cx
+        self.balance = balance
+        self.tick = tick
+        self.step = step
+        self.last_close: float = 0.0
+        self.positions: dict[str, dict[str, float]] = {}  # side -> qty, entry
+        self.open_orders: dict[str, dict[str, Any]] = {}
+        self.done_orders: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.realized_pnl: float = 0.0
+        self.fills: int = 0
+        self.closes: int = 0
+        self._ids = 0
+
+    # ---------- движок заглушки ----------
+
+    def on_bar(self, kline: dict) -> None:
+        self.last_close = float(kline["close"])
+        low, high = float(kline["low"]), float(kline["high"])
+        for order_id, order in list(self.open_orders.items()):
+            buy = order["side"] == "Buy"
+            if (buy and low <= order["price"]) or (not buy and high >= order["price"]):
+                order.update(status="closed", filled=order["amount"])
+                order["average"] = order["price"]
+                self._open_position("long" if buy else "short", order)
+                self._finish(order_id)
+
+    def _open_position(self, side: str, order: dict[str, Any]) -> None:
+        pos = self.positions.setdefault(side, {"qty": 0.0, "entry": 0.0})
+        qty = pos["qty"] + order["amount"]
+        pos["entry"] = (
+            pos["entry"] * pos["qty"] + order["price"] * order["amount"]
+        ) / qty
+        pos["qty"] = qty
+        self.fills += 1
+
+    def _finish(self, order_id: str) -> None:
+        self.done_orders[order_id] = self.open_orders.pop(order_id)
+        while len(self.done_orders) > _DONE_KEEP:
+            self.done_orders.popitem(last=False)
+
+    # ---------- подмножество API ccxt ----------
+
+    async def fetch_markets(self) -> list[dict]:
+        return [
+            {
+                "symbol": self.symbol_cx,
+                "info": {
+                    "lotSizeFilter": {"qtyStep": str(self.step)},
+                    "priceFilter": {"tickSize": str(self.tick)},
+                },
+            }
+        ]
+
+    async def fetch_balance(self) -> dict:
+        return {"total": {"USDT": self.balance}}
+
+    async def create_order(
+        self,
+        symbol: str,
+        type: str,
+        side: str,
+        amount: float,
+        price: Optional[float] = None,
+        params: Optional[dict] = None,
+    ) -> dict:
+        self._ids += 1
+        order = {
+            "id": str(self._ids),
+            "symbol": symbol,
+            "side": side,
+            "amount": float(amount),
+            "price": float(price or self.last_close),
+            "status": "open",
+            "filled": 0.0,
+        }
+        self.open_orders[order["id"]] = order
+        return dict(order)
+
+    async def fetch_order(
+        self, order_id: str, symbol: Optional[str] = None, params: Optional[dict] = None
+    ) -> dict:
+        order = self.open_orders.get(order_id) or self.done_orders.get(order_id)
+        if order is None:
+            return {"id": order_id, "status": "canceled", "filled": 0.0}
+        return dict(order)
+
+    async def cancel_order(self, order_id: str, symbol: Optional[str] = None) -> dict:
+        order = self.open_orders.get(order_id)
+        if order is not None:
+            order["status"] = "canceled"
+            self._finish(order_id)
+        return {"id": order_id, "status": "canceled"}
+
+    async def fetch_positions(self, symbols: Optional[list] = None) -> list[dict]:
+        return [
+            {"symbol": self.symbol_cx, "contracts": pos["qty"], "side": side}
+            for side, pos in self.positions.items()
+            if pos["qty"] > 0
+        ]
+
+    async def create_market_order(
+        self, symbol: str, side: str, amount: float, params: Optional[dict] = None
+    ) -> dict:
+        pos_side = "long" if side == "Sell" else "short"
+        pos = self.positions.get(pos_side)
+        qty = min(float(amount), pos["qty"]) if pos else 0.0
+        if qty > 0:
+            sign = 1.0 if pos_side == "long" else -1.0
+            self.realized_pnl += sign * (self.last_close - pos["entry"]) * qty
+            pos["qty"] -= qty
+            self.closes += 1
+        self._ids += 1
+        return {"id": str(self._ids), "status": "closed", "filled": qty}
+
+    async def close(self) -> None:
+        pass
+
+
+# ---------- замеры ----------
+
+
+@dataclass(slots=True)
+class SoakSample:
+    bars: int
+    elapsed_s: float
+    rss_mb: float
+    gc_objects: int
+    gc_collections: int
+    gc_pause_ms: float  # суммарно за окно
+    gc_pause_max_ms: float
+    latency_p50_us: float
+    latency_p99_us: float
+    latency_max_us: float
+    open_orders: int
+    fills: int
+
+
+class GcPauses:
+    """Длительность сборок через gc.callbacks (start/stop)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._t0 = 0.0
+
+    def __call__(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._t0 = time.perf_counter()
+            return
+        pause = time.perf_counter() - self._t0
+        self.count += 1
+        self.total += pause
+        if pause > self.max:
+            self.max = pause
+
+    def reset(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def __enter__(self) -> "GcPauses":
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        gc.callbacks.remove(self)
+
+
+def _slope_per_mbar(bars: np.ndarray, values: np.ndarray) -> float:
+    """Наклон МНК values по bars, в единицах на миллион баров."""
+    if len(bars) < 2:
+        return 0.0
+    return float(np.polyfit(bars / 1e6, values, 1)[0])
+
+
+def evaluate(samples: list[SoakSample], cfg: SoakConfig) -> tuple[bool, dict]:
+    """Тренды после прогрева и вердикт."""
+    steady = [s for s in samples if s.bars > cfg.warmup_bars]
+    verdict: dict[str, float] = {"windows": float(len(steady))}
+    if len(steady) < 2:
+        logger.warning("[SOAK] too few windows after warmup to judge trends")
+        return True, verdict
+
+    late = steady[len(steady) // 2 :] if len(steady) >= 4 else steady
+    bars = np.array([s.bars for s in late], dtype=float)
+    rss_slope = _slope_per_mbar(bars, np.array([s.rss_mb for s in late]))
+    obj_slope = _slope_per_mbar(bars, np.array([s.gc_objects for s in late], float))
+    k = max(1, len(steady) // 4)
+    p50 = [s.latency_p50_us for s in steady]
+    base = float(np.median(p50[:k])) or 1e-9
+    latency_ratio = float(np.median(p50[-k:])) / base
+
+    verdict.update(
+        rss_growth_mb_per_mbar=rss_slope,
+        objects_growth_per_mbar=obj_slope,
+        latency_p50_ratio=latency_ratio,
+    )
+    ok = True
+    if rss_slope > cfg.max_rss_growth_mb_per_mbar:
+        logger.error(
+            "[SOAK] FAIL: RSS grows %.2f MB per 1M bars (limit %.2f)",
+            rss_slope,
+            cfg.max_rss_growth_mb_per_mbar,
+        )
+        ok = False
+    if latency_ratio > cfg.max_latency_ratio:
+        logger.error(
+            "[SOAK] FAIL: bar latency p50 rose x%.2f (limit x%.2f)",
+            latency_ratio,
+            cfg.max_latency_ratio,
+        )
+        ok = False
+    return ok, verdict
+
+
+# ---------- прогон ----------
+
+
+async def run_soak(app: Any, cfg: SoakConfig) -> bool:
+    """
+    app — TradingApp: подменяются только клиент биржи, темп rest_scheduler
+    и опрос OrderManager; решения и исполнение идут штатным кодом.
+    Темп rest_scheduler и LOCK_PATH по завершении возвращаются как были.
+    """
+    # SIGNAL/ENTRY-логи на каждый бар глушим, свои замеры — оставляем
+    logging.getLogger().setLevel(cfg.log_level.upper())
+    logger.setLevel(logging.INFO)
+
+    paper = PaperExchange(app.executor.symbol_cx, cfg.start_balance)
+    app.executor.exchange = paper
+    app.mode = "live"
+    app.order_manager.poll_interval = cfg.order_poll_interval
+    cfg.report_path.parent.mkdir(parents=True, exist_ok=True)
+
+    market = SyntheticMarket([app.symbol], app.base_timeframe, seed=cfg.seed)
+    handle = app.handle_kline
+    clock = time.perf_counter
+    latencies = np.empty(cfg.sample_every, dtype=np.float64)
+    samples: list[SoakSample] = []
+    n = 0
+    window = 0
+
+    logger.info(
+        "[SOAK] %d bars of %s %s (seed=%d), sample every %d",
+        cfg.bars,
+        app.symbol,
+        app.base_timeframe,
+        cfg.seed,
+        cfg.sample_every,
+    )
+    saved_rate = rest_scheduler.rate, rest_scheduler.burst
+    saved_lock = os.environ.get("LOCK_PATH")
+    rest_scheduler.rate = rest_scheduler.burst = 1e12
+    os.environ["LOCK_PATH"] = str(cfg.report_path.with_suffix(".lock"))
+    app.order_manager.start()
+    started = clock()
+    try:
+        with GcPauses() as pauses:
+            for chunk in market.iter_chunks(cfg.bars):
+                frame = chunk[app.symbol]
+                for ts, o, h, l, c, v in frame.itertuples(index=False, name=None):
+                    kline = {
+                        "start_at": int(ts),
+                        "open": o,
+                        "high": h,
+                        "low": l,
+                        "close": c,
+                        "volume": v,
+                    }
+                    paper.on_bar(kline)
+                    t0 = clock()
+                    await handle(kline)
+                    latencies[window] = clock() - t0
+                    # шаг фоновым задачам (OrderManager, диспетчер rest_scheduler)
+                    await asyncio.sleep(0)
+                    n += 1
+                    window += 1
+                    if window == cfg.sample_every:
+                        samples.append(
+                            _sample(n, clock() - started, latencies, pauses, paper)
+                        )
+                        _log_sample(samples[-1])
+                        pauses.reset()
+                        window = 0
+            if window:
+                samples.append(
+                    _sample(n, clock() - started, latencies[:window], pauses, paper)
+                )
+    finally:
+        await app.order_manager.stop()
+        await rest_scheduler.close()
+        await app.public_rest.close()
+        rest_scheduler.rate, rest_scheduler.burst = saved_rate
+        if saved_lock is None:
+            os.environ.pop("LOCK_PATH", None)
+        else:
+            os.environ["LOCK_PATH"] = saved_lock
+
+    ok, verdict = evaluate(samples, cfg)
+    pd.DataFrame([asdict(s) for s in samples]).to_csv(cfg.report_path, index=False)
+    wall = clock() - started
+    logger.info(
+        "[SOAK] %s: %d bars in %.1fs (%.0f bars/s), fills=%d closes=%d, "
+        "pnl=%.2f | %s | report: %s",
+        "PASS" if ok else "FAIL",
+        n,
+        wall,
+        n / wall if wall else 0.0,
+        paper.fills,
+        paper.closes,
+        paper.realized_pnl,
+        ", ".join(f"{k}={v:.3f}" for k, v in verdict.items()),
+        cfg.report_path,
+    )
+    return ok
+
+
+def _sample(
+    n: int,
+    elapsed: float,
+    latencies: np.ndarray,
+    pauses: GcPauses,
+    paper: PaperExchange,
+) -> SoakSample:
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    return SoakSample(
+        bars=n,
+        elapsed_s=round(elapsed, 3),
+        rss_mb=round(rss_mb(), 2),
+        gc_objects=len(gc.get_objects()),
+        gc_collections=pauses.count,
+        gc_pause_ms=round(pauses.total * 1e3, 3),
+        gc_pause_max_ms=round(pauses.max * 1e3, 3),
+        latency_p50_us=round(float(p50), 2),
+        latency_p99_us=round(float(p99), 2),
+        latency_max_us=round(float(latencies.max()) * 1e6, 2),
+        open_orders=len(paper.open_orders),
+        fills=paper.fills,
+    )
+
+
+def _log_sample(s: SoakSample) -> None:
+    logger.info(
+        "[SOAK] bars=%d rss=%.1fMB objects=%d gc=%d/%.1fms "
+        "latency p50=%.1fus p99=%.1fus max=%.1fus",
+        s.bars,
+        s.rss_mb,
+        s.gc_objects,
+        s.gc_collections,
+        s.gc_pause_ms,
+        s.latency_p50_us,
+        s.latency_p99_us,
+        s.latency_max_us,
+    )
@@ -1,14 +1,34 @@
 from collections import deque
+from typing import Optional, Union
+
+import numpy as np
 import pandas as pd
 from core.config import settings
 
 
 class StrategyState:
-    def __init__(self):
+    def __init__(
+        self,
+        retest_pct: Optional[float] = None,
+        max_bars_wait: Optional[int] = None,
+        rsi_long_max: Optional[float] = None,
+        rsi_short_min: Optional[float] = None,
+    ):
         self.breakout_ts = None
         self.retested = False
-        self.prices = deque(maxlen=settings.ws.max_bars_wait + 1)
-        self.retest_pct = settings.ws.retest_pct
+        self.max_bars_wait = (
+            max_bars_wait if max_bars_wait is not None else settings.ws.max_bars_wait
+        )
+        self.prices = deque(maxlen=self.max_bars_wait + 1)
+        self.retest_pct = (
+            retest_pct if retest_pct is not None else settings.ws.retest_pct
+        )
+        self.rsi_long_max = (
+            rsi_long_max if rsi_long_max is not None else settings.ws.rsi_long_max
+        )
+        self.rsi_short_min = (
+            rsi_short_min if rsi_short_min is not None else settings.ws.rsi_short_min
+        )
 
     def on_new_bar(
         self,
@@ -17,25 +37,39 @@ class StrategyState:
         df_1h: pd.DataFrame,
         df_1d: pd.DataFrame,
     ) -> tuple[bool, bool]:
-        price = float(kline["close"])
-        self.prices.append(price)
+        return self.update(
+            kline["start_at"],
+            float(kline["close"]),
+            price5=df_5["c"].iat[-1],
+            ema60_5=df_5["ema60_5"].iat[-1],
+            ema163_5=df_5["ema163_5"].iat[-1],
+            ema1h=df_1h["ema60"].iat[-1],
+            rsi1d=df_1d["rsi"].iat[-1],
+        )
 
-        # индикаторы
-        ema1h = df_1h["ema60"].iat[-1]
-        rsi1d = df_1d["rsi"].iat[-1]
-        price5 = df_5["c"].iat[-1]
-        ema60_5 = df_5["ema60_5"].iat[-1]
-        ema163_5 = df_5["ema163_5"].iat[-1]
+    def update(
+        self,
+        start_at: int,
+        price: float,
+        *,
+        price5: float,
+        ema60_5: float,
+        ema163_5: float,
+        ema1h: float,
+        rsi1d: float,
+    ) -> tuple[bool, bool]:
+        """То же, что on_new_bar, но на скалярах — без DataFrame на каждый бар."""
+        self.prices.append(price)
 
         # пробой
         if len(self.prices) > 1:
             prev = self.prices[-2]
             if prev <= ema1h < price:
-                self.breakout_ts = kline["start_at"]
+                self.breakout_ts = start_at
                 self.retested = False
 
         # тайм-аут ретеста
-        if self.breakout_ts and len(self.prices) - 1 > settings.ws.max_bars_wait:
+        if self.breakout_ts and len(self.prices) - 1 > self.max_bars_wait:
             self.breakout_ts = None
             self.retested = False
 
@@ -48,8 +82,8 @@ class StrategyState:
         bounced = self.retested and abs(price - ema1h) / ema1h <= self.retest_pct
         mtf_long = price5 > ema60_5 and price5 > ema163_5
         mtf_short = price5 < ema60_5 and price5 < ema163_5
-        rsi_long_ok = rsi1d <= 45
-        rsi_short_ok = rsi1d >= 55
+        rsi_long_ok = rsi1d <= self.rsi_long_max
+        rsi_short_ok = rsi1d >= self.rsi_short_min
 
         long_bounce = price > ema1h and price <= ema1h * 1.007
         short_bounce = price < ema1h and price >= ema1h * 0.993
@@ -57,3 +91,130 @@ class StrategyState:
         long_signal = bounced and long_bounce and mtf_long and rsi_long_ok
         short_signal = bounced and short_bounce and mtf_short and rsi_short_ok
         return long_signal, short_signal
+
+
+class BatchStrategyState:
+    """
+    Состояние StrategyState для N символов (или N наборов параметров) в массивах.
+    on_new_bars за один векторный шаг даёт те же сигналы, что N вызовов
+    StrategyState.update на тех же барах.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        retest_pct: Union[float, np.ndarray, None] = None,
+        max_bars_wait: Union[int, np.ndarray, None] = None,
+        rsi_long_max: Union[float, np.ndarray, None] = None,
+        rsi_short_min: Union[float, np.ndarray, None] = None,
+    ):
+        self.n = n
+        self.retest_pct = np.broadcast_to(
+            np.asarray(
+                retest_pct if retest_pct is not None else settings.ws.retest_pct,
+                dtype=float,
+            ),
+            (n,),
+        ).copy()
+        self.max_bars_wait = np.broadcast_to(
+            np.asarray(
+                (
+                    max_bars_wait
+                    if max_bars_wait is not None
+                    else settings.ws.max_bars_wait
+                ),
+                dtype=np.int64,
+            ),
+            (n,),
+        ).copy()
+        self.rsi_long_max = np.broadcast_to(
+            np.asarray(
+                rsi_long_max if rsi_long_max is not None else settings.ws.rsi_long_max,
+                dtype=float,
+            ),
+            (n,),
+        ).copy()
+        self.rsi_short_min = np.broadcast_to(
+            np.asarray(
+                (
+                    rsi_short_min
+                    if rsi_short_min is not None
+                    else settings.ws.rsi_short_min
+                ),
+                dtype=float,
+            ),
+            (n,),
+        ).copy()
+
+        # аналоги полей StrategyState; breakout_ts == 0 — «нет пробоя»
+        self.breakout_ts = np.zeros(n, dtype=np.int64)
+        self.retested = np.zeros(n, dtype=bool)
+        self.prev_price = np.full(n, np.nan)
+        self.n_prices = np.zeros(n, dtype=np.int64)  # len(prices), не больше maxlen
+
+    def reset(self, idx: Union[int, np.ndarray, slice, None] = None) -> None:
+        idx = slice(None) if idx is None else idx
+        self.breakout_ts[idx] = 0
+        self.retested[idx] = False
+        self.prev_price[idx] = np.nan
+        self.n_prices[idx] = 0
+
+    def on_new_bars(
+        self,
+        start_at: np.ndarray,
+        price: np.ndarray,
+        *,
+        price5: np.ndarray,
+        ema60_5: np.ndarray,
+        ema163_5: np.ndarray,
+        ema1h: np.ndarray,
+        rsi1d: np.ndarray,
+        active: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Все аргументы — массивы длины n. active — маска символов, у которых
+        закрылся бар; остальные не меняют состояние и получают False.
+        """
+        active = np.ones(self.n, dtype=bool) if active is None else active
+        start_at = np.asarray(start_at, dtype=np.int64)
+
+        # prices.append(price)
+        has_prev = active & (self.n_prices > 0)
+        prev = self.prev_price.copy()
+        self.n_prices = np.where(
+            active, np.minimum(self.n_prices + 1, self.max_bars_wait + 1), self.n_prices
+        )
+        self.prev_price = np.where(active, price, self.prev_price)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # пробой
+            breakout = has_prev & (prev <= ema1h) & (ema1h < price)
+            self.breakout_ts = np.where(breakout, start_at, self.breakout_ts)
+            self.retested &= ~breakout
+
+            # тайм-аут ретеста
+            timeout = (
+                active
+                & (self.breakout_ts != 0)
+                & (self.n_prices - 1 > self.max_bars_wait)
+            )
+            self.breakout_ts[timeout] = 0
+            self.retested &= ~timeout
+
+            # ретест
+            near = np.abs(price - ema1h) / ema1h <= self.retest_pct
+            self.retested |= active & (self.breakout_ts != 0) & near
+
+            # условия
+            bounced = active & self.retested & near
+            mtf_long = (price5 > ema60_5) & (price5 > ema163_5)
+            mtf_short = (price5 < ema60_5) & (price5 < ema163_5)
+            rsi_long_ok = rsi1d <= self.rsi_long_max
+            rsi_short_ok = rsi1d >= self.rsi_short_min
+
+            long_bounce = (price > ema1h) & (price <= ema1h * 1.007)
+            short_bounce = (price < ema1h) & (price >= ema1h * 0.993)
+
+        long_signal = bounced & long_bounce & mtf_long & rsi_long_ok
+        short_signal = bounced & short_bounce & mtf_short & rsi_short_ok
+        return long_signal, short_signal
@@ -0,0 +1,316 @@
+"""
+Детерминированный генератор синтетических OHLCV для нагрузочных тестов
+(handle_kline, aggregate_ohlcv, индикаторы, walk-forward) без сети.
+
+Модель логарифма цены каждого символа:
+
+  trend  — случайное блуждание со сносом; снос и множитель волатильности
+           задаёт режим (up / down / range), режимы сменяются марковски
+           с геометрической длительностью;
+  vol    — кластеризация волатильности: log-vol как AR(1) (stochastic vol);
+  osc    — медленная возвратная к тренду компонента AR(1): цена ходит
+           вокруг часовой EMA, пересекает её и возвращается на ретест,
+           так что StrategyState реально выдаёт сигналы (long — на откатах
+           в нисходящем режиме, short — в восходящем);
+  gaps   — редкие скачки цены между close и следующим open;
+  drop   — (опционально) пропуски баров, для проверки backfill/dedup.
+
+Инновации символов коррелированы (разложение Холецкого для общей
+корреляции correlation). Всё считается векторно блоками по BLOCK_BARS
+баров, AR(1) — через ewm(adjust=False) pandas; результат зависит только от
+seed и параметров, но не от размера выдаваемых кусков.
+
+Запуск из src/:
+  python -m trade.synthetic --symbols LTCUSDT,BTCUSDT --bars 10000000 \\
+      --timeframe 5m --out ../data/history --format bin
+"""
+
+import argparse
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from trade.history import OHLCV_COLUMNS, write_binary
+from trade.utils import tf_to_ms
+
+logger = logging.getLogger(__name__)
+
+BLOCK_BARS = 1 << 16
+BASE_TF_MS = 300_000  # параметры волатильности заданы для 5m
+
+
+@dataclass(slots=True)
+class Regime:
+    drift: float  # снос log-цены за 5m бар
+    vol_mult: float
+
+
+@dataclass(slots=True)
+class SyntheticParams:
+    start_price: float = 100.0
+    start_ts: int = 1_577_836_800_000  # 2020-01-01 UTC
+    bar_vol: float = 0.0015  # сигма 5m доходности в среднем режиме
+    regimes: dict[str, Regime] = field(
+        default_factory=lambda: {
+            "up": Regime(3e-5, 0.9),
+            "down": Regime(-3e-5, 1.1),
+            "range": Regime(0.0, 0.7),
+        }
+    )
+    regime_mean_bars: int = 4032  # ~2 недели 5m
+    vol_persistence: float = 0.995  # phi AR(1) для log-vol
+    vol_of_vol: float = 0.06
+    osc_persistence: float = 0.995  # phi возвратной компоненты
+    osc_vol: float = 0.0012
+    gap_prob: float = 1e-4
+    gap_vol: float = 0.01
+    drop_prob: float = 0.0
+    base_volume: float = 1000.0
+    correlation: float = 0.6  # общая корреляция инноваций между символами
+
+
+def _ar1(innov: np.ndarray, phi: float, state: np.ndarray) -> np.ndarray:
+    """
+    x_t = phi * x_{t-1} + e_t по оси 1 (n_symbols, n_bars), начиная с state.
+    ewm(adjust=False) с alpha=1-phi на входе e/alpha — та же рекурсия в Cython.
+    """
+    alpha = 1.0 - phi
+    frame = np.empty((innov.shape[1] + 1, innov.shape[0]))
+    frame[0] = state
+    frame[1:] = innov.T / alpha
+    out = pd.DataFrame(frame).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out[1:].T
+
+
+class SyntheticMarket:
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        timeframe: str = "5m",
+        seed: int = 0,
+        params: Optional[SyntheticParams] = None,
+    ) -> None:
+        self.symbols = [s.upper() for s in symbols]
+        self.tf_ms = tf_to_ms(timeframe)
+        self.params = params or SyntheticParams()
+        self.rng = np.random.default_rng(seed)
+
+        p = self.params
+        n = len(self.symbols)
+        self._scale = np.sqrt(self.tf_ms / BASE_TF_MS)
+        corr = np.full((n, n), p.correlation)
+        np.fill_diagonal(corr, 1.0)
+        self._chol = np.linalg.cholesky(corr)
+
+        self._regime_names = list(p.regimes)
+        self._drift = np.array([r.drift for r in p.regimes.values()]) * (
+            self.tf_ms / BASE_TF_MS
+        )
+        self._vol_mult = np.array([r.vol_mult for r in p.regimes.values()])
+        self._regime = self.rng.integers(0, len(self._regime_names), n)
+        self._regime_left = self.rng.geometric(1 / p.regime_mean_bars, n)
+
+        self._trend = np.full(n, np.log(p.start_price))
+        self._osc = np.zeros(n)
+        self._logvol = np.zeros(n)
+        self._close = np.full(n, np.log(p.start_price))
+        self._next_ts = p.start_ts // self.tf_ms * self.tf_ms
+
+    def _regimes(self, n_bars: int) -> np.ndarray:
+        """Индексы режимов (n_symbols, n_bars) с продолжением между блоками."""
+        out = np.empty((len(self.symbols), n_bars), dtype=np.int64)
+        k = len(self._regime_names)
+        for i in range(len(self.symbols)):
+            pos = 0
+            while pos < n_bars:
+                take = min(int(self._regime_left[i]), n_bars - pos)
+                out[i, pos : pos + take] = self._regime[i]
+                pos += take
+                self._regime_left[i] -= take
+                if self._regime_left[i] == 0:
+                    # новый режим, отличный от текущего
+                    shift = self.rng.integers(1, k) if k > 1 else 0
+                    self._regime[i] = (self._regime[i] + shift) % k
+                    self._regime_left[i] = self.rng.geometric(
+                        1 / self.params.regime_mean_bars
+                    )
+        return out
+
+    def _block(self, n_bars: int) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        p = self.params
+        rng = self.rng
+        n = len(self.symbols)
+
+        regime = self._regimes(n_bars)
+        logvol = _ar1(
+            rng.standard_normal((n, n_bars)) * p.vol_of_vol,
+            p.vol_persistence,
+            self._logvol,
+        )
+        sigma = p.bar_vol * self._scale * self._vol_mult[regime] * np.exp(logvol)
+
+        eps = self._chol @ rng.standard_normal((n, n_bars))
+        trend_ret = self._drift[regime] + sigma * eps
+        trend = self._trend[:, None] + np.cumsum(trend_ret, axis=1)
+
+        osc = _ar1(
+            (self._chol @ rng.standard_normal((n, n_bars))) * p.osc_vol * self._scale,
+            p.osc_persistence,
+            self._osc,
+        )
+        gaps = np.where(
+            rng.random((n, n_bars)) < p.gap_prob,
+            rng.standard_normal((n, n_bars)) * p.gap_vol,
+            0.0,
+        )
+        log_close = (
+            trend
+            + osc
+            + np.cumsum(gaps, axis=1)
+            + (self._close - self._trend - self._osc)[:, None]
+        )
+
+        prev_close = np.empty_like(log_close)
+        prev_close[:, 0] = self._close
+        prev_close[:, 1:] = log_close[:, :-1]
+        log_open = prev_close + gaps
+
+        wick_hi = np.abs(rng.standard_normal((n, n_bars))) * sigma * 0.6
+        wick_lo = np.abs(rng.standard_normal((n, n_bars))) * sigma * 0.6
+        o = np.exp(log_open)
+        c = np.exp(log_close)
+        h = np.maximum(o, c) * np.exp(wick_hi)
+        l = np.minimum(o, c) * np.exp(-wick_lo)
+        move = np.abs(log_close - log_open) / sigma
+        v = p.base_volume * np.exp(
+            0.4 * rng.standard_normal((n, n_bars)) + 0.5 * np.minimum(move, 6.0)
+        )
+
+        self._trend = trend[:, -1]
+        self._osc = osc[:, -1]
+        self._logvol = logvol[:, -1]
+        self._close = log_close[:, -1]
+
+        ts = self._next_ts + np.arange(n_bars, dtype=np.int64) * self.tf_ms
+        self._next_ts = int(ts[-1]) + self.tf_ms
+        keep = (
+            rng.random((n, n_bars)) >= p.drop_prob
+            if p.drop_prob > 0
+            else np.ones((n, n_bars), dtype=bool)
+        )
+        return ts, {"o": o, "h": h, "l": l, "c": c, "v": v, "keep": keep}
+
+    def iter_chunks(
+        self, n_bars: int, chunk_bars: int = 100_000
+    ) -> Iterator[dict[str, pd.DataFrame]]:
+        """
+        Куски {symbol: DataFrame['ts','o','h','l','c','v']} по chunk_bars
+        баров времени (при drop_prob строк может быть меньше).
+        """
+        pending: list[tuple[np.ndarray, dict[str, np.ndarray]]] = []
+        pending_bars = 0
+        produced = 0
+        while produced < n_bars:
+            while pending_bars < min(chunk_bars, n_bars - produced):
+                ts, cols = self._block(BLOCK_BARS)
+                pending.append((ts, cols))
+                pending_bars += len(ts)
+
+            take = min(chunk_bars, n_bars - produced)
+            ts = np.concatenate([t for t, _ in pending])
+            cols = {
+                key: np.concatenate([blk[key] for _, blk in pending], axis=1)
+                for key in ("o", "h", "l", "c", "v", "keep")
+            }
+            yield {
+                symbol: self._frame(ts[:take], cols, i, slice(0, take))
+                for i, symbol in enumerate(self.symbols)
+            }
+            produced += take
+            rest = slice(take, None)
+            pending = (
+                [(ts[rest], {k: v[:, rest] for k, v in cols.items()})]
+                if len(ts) > take
+                else []
+            )
+            pending_bars = len(ts) - take
+
+    @staticmethod
+    def _frame(
+        ts: np.ndarray, cols: dict[str, np.ndarray], i: int, sl: slice
+    ) -> pd.DataFrame:
+        keep = cols["keep"][i, sl]
+        data = {"ts": ts[keep]}
+        for key in ("o", "h", "l", "c", "v"):
+            data[key] = cols[key][i, sl][keep]
+        return pd.DataFrame(data, columns=OHLCV_COLUMNS)
+
+    def to_frame(self, n_bars: int) -> dict[str, pd.DataFrame]:
+        """Всё сразу (для небольших объёмов)."""
+        parts: dict[str, list[pd.DataFrame]] = {s: [] for s in self.symbols}
+        for chunk in self.iter_chunks(n_bars):
+            for symbol, df in chunk.items():
+                parts[symbol].append(df)
+        return {
+            symbol: pd.concat(dfs, ignore_index=True) for symbol, dfs in parts.items()
+        }
+
+
+def write_files(
+    market: SyntheticMarket,
+    n_bars: int,
+    out_dir: Path,
+    timeframe: str,
+    fmt: str = "bin",
+    chunk_bars: int = 1_000_000,
+) -> list[Path]:
+    """Потоково пишет {SYMBOL}_{tf}.{bin,csv} (формат history.OHLCVFileSource)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {s: out_dir / f"{s}_{timeframe}.{fmt}" for s in market.symbols}
+    for path in paths.values():
+        path.unlink(missing_ok=True)
+
+    written = 0
+    for chunk in market.iter_chunks(n_bars, chunk_bars):
+        for symbol, df in chunk.items():
+            if fmt == "bin":
+                write_binary(df, paths[symbol])
+            else:
+                df.to_csv(
+                    paths[symbol],
+                    mode="a",
+                    header=not paths[symbol].exists(),
+                    index=False,
+                )
+        written += chunk_bars
+        logger.info("Synthetic: %d/%d bars", min(written, n_bars), n_bars)
+    return list(paths.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthetic OHLCV generator")
+    parser.add_argument("--symbols", default="LTCUSDT")
+    parser.add_argument("--bars", type=int, default=1_000_000)
+    parser.add_argument("--timeframe", default="5m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("data/history"))
+    parser.add_argument("--format", choices=["bin", "csv"], default="bin")
+    parser.add_argument("--drop-prob", type=float, default=0.0)
+    parser.add_argument("--correlation", type=float, default=0.6)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    params = SyntheticParams(drop_prob=args.drop_prob, correlation=args.correlation)
+    market = SyntheticMarket(
+        args.symbols.split(","), args.timeframe, seed=args.seed, params=params
+    )
+    for path in write_files(market, args.bars, args.out, args.timeframe, args.format):
+        logger.info("Synthetic: wrote %s", path)
+
+
+if __name__ == "__main__":
+    main()
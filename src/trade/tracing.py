@@ -0,0 +1,272 @@
+"""
+Трассировка tick-to-trade по барам: от закрытия бара на бирже до ответа
+биржи на create_order.
+
+Стадии (STAGES), время — локальные часы в мс относительно границы бара
+(start_at + tf); exchange_ts — ts сообщения биржи, на нём видно и
+расхождение часов:
+
+  exchange_ts     — ts сообщения WS с подтверждённой свечой (часы биржи);
+  ws_recv         — приём сообщения в DataWS (до json.loads);
+  handler_start   — бар взят из очереди обработчика (handle_kline);
+  indicators_done — граф индикаторов пересчитан (StrategyCore.on_bar);
+  strategy_done   — StrategyState выдал сигналы;
+  balance_ready   — ответ fetch_balance;
+  order_sent      — create_order / create_market_order уходит в сеть
+                    (после ожидания в rest_scheduler);
+  order_ack       — ответ биржи на ордер.
+
+Текущий BarTrace живёт в ContextVar: DataWS выставляет его на время
+обработчика, OrderManager переносит в фоновую задачу вместе с командой
+place, так что ядро и Executor отмечают стадии через mark() без
+протаскивания трассы по сигнатурам. Вне live (replay, soak) трассы нет и
+mark() ничего не делает.
+
+Трасса закрывается, когда отработал обработчик и все её ордера; готовые
+пишутся в кольцо LatencyTracer (numpy, capacity x стадии) — по нему
+считаются перцентили, а бары дольше budget_ms выгружаются в slow_path
+(JSON lines) с разбивкой по стадиям.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STAGES = (
+    "exchange_ts",
+    "ws_recv",
+    "handler_start",
+    "indicators_done",
+    "strategy_done",
+    "balance_ready",
+    "order_sent",
+    "order_ack",
+)
+_STAGE_INDEX = {name: i for i, name in enumerate(STAGES)}
+
+_current: ContextVar[Optional["BarTrace"]] = ContextVar("bar_trace", default=None)
+
+
+def now_ms() -> float:
+    return time.time_ns() / 1e6
+
+
+class BarTrace:
+    __slots__ = ("tracer", "bar_ts", "close_ms", "marks", "refs")
+
+    def __init__(self, tracer: "LatencyTracer", bar_ts: int, close_ms: int) -> None:
+        self.tracer = tracer
+        self.bar_ts = bar_ts
+        self.close_ms = close_ms  # граница бара по часам биржи
+        self.marks = np.full(len(STAGES), np.nan)
+        self.refs = 1  # обработчик + ордера в фоне
+
+    def mark(self, stage: str, at_ms: Optional[float] = None) -> None:
+        # первая отметка: при выходе и входе на одном баре важен первый ордер
+        i = _STAGE_INDEX[stage]
+        if np.isnan(self.marks[i]):
+            self.marks[i] = now_ms() if at_ms is None else at_ms
+
+    def hold(self) -> None:
+        """Стадии трассы продолжатся в другой задаче (ордер в OrderManager)."""
+        self.refs += 1
+
+    def release(self) -> None:
+        self.refs -= 1
+        if self.refs == 0:
+            self.tracer.record(self)
+
+
+def current() -> Optional[BarTrace]:
+    return _current.get()
+
+
+def mark(stage: str) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+async def traced_call(fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """fn(*args, **kwargs) с отметками order_sent / order_ack текущей трассы."""
+    mark("order_sent")
+    result = await fn(*args, **kwargs)
+    mark("order_ack")
+    return result
+
+
+def activate(trace: Optional[BarTrace]) -> Token:
+    return _current.set(trace)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+@contextmanager
+def bar_scope(
+    tracer: Optional["LatencyTracer"],
+    bar_ts: int,
+    recv_ms: Optional[float] = None,
+    exchange_ms: Optional[float] = None,
+) -> Iterator[Optional[BarTrace]]:
+    """Трасса бара — текущая на время обработчика (tracer=None — без трассы)."""
+    trace = tracer.begin(bar_ts, recv_ms, exchange_ms) if tracer is not None else None
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        if trace is not None:
+            trace.release()
+
+
+class LatencyTracer:
+    def __init__(
+        self,
+        tf_ms: int,
+        capacity: int = 4096,
+        budget_ms: float = 1000.0,
+        summary_every: int = 12,  # баров между строками [TRACE] в логе
+        slow_path: Optional[Union[str, Path]] = None,
+    ) -> None:
+        self.tf_ms = tf_ms
+        self.capacity = capacity
+        self.budget_ms = budget_ms
+        self.summary_every = summary_every
+        self.slow_path = Path(slow_path) if slow_path is not None else None
+
+        # кольцо: мс от границы бара по стадиям
+        self._ring = np.full((capacity, len(STAGES)), np.nan)
+        self.count = 0  # всего записано трасс
+        self.slow = 0
+
+    def begin(
+        self,
+        bar_ts: int,
+        recv_ms: Optional[float] = None,
+        exchange_ms: Optional[float] = None,
+    ) -> BarTrace:
+        trace = BarTrace(self, bar_ts, bar_ts + self.tf_ms)
+        if exchange_ms is not None:
+            trace.mark("exchange_ts", exchange_ms)
+        trace.mark("ws_recv", recv_ms)
+        return trace
+
+    def record(self, trace: BarTrace) -> None:
+        row = trace.marks - trace.close_ms
+        slot = self.count % self.capacity
+        self._ring[slot] = row
+        self.count += 1
+
+        total = np.nanmax(row)
+        if total > self.budget_ms:
+            self.slow += 1
+            self._dump_slow(trace.bar_ts, row, total)
+        if self.summary_every > 0 and self.count % self.summary_every == 0:
+            logger.info("[TRACE] %s", self.brief())
+
+    def _dump_slow(self, bar_ts: int, row: np.ndarray, total: float) -> None:
+        steps = _steps(row[None, :])[0]
+        worst = STAGES[int(np.nanargmax(steps))] if np.isfinite(steps).any() else "?"
+        logger.warning(
+            "[TRACE] slow bar %d: %.1f ms after close > budget %.0f ms, "
+            "worst stage %s (+%.1f ms)",
+            bar_ts,
+            total,
+            self.budget_ms,
+            worst,
+            np.nanmax(steps) if np.isfinite(steps).any() else float("nan"),
+        )
+        if self.slow_path is None:
+            return
+        record = {
+            "bar_ts": bar_ts,
+            "total_ms": round(float(total), 3),
+            "since_close_ms": _finite(row),
+            "step_ms": _finite(steps),
+        }
+        self.slow_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.slow_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    # ---------- сводки ----------
+
+    def rows(self) -> np.ndarray:
+        """Записанные трассы кольца (порядок слотов, не времени)."""
+        return self._ring[: min(self.count, self.capacity)]
+
+    def summary(self, percentiles: tuple[float, ...] = (50, 90, 99)) -> pd.DataFrame:
+        """
+        Перцентили по стадиям: since_close — мс от границы бара,
+        step — мс от предыдущей отмеченной стадии.
+        """
+        rows = self.rows()
+        out = {}
+        for kind, data in (("since_close", rows), ("step", _steps(rows))):
+            filled = np.isfinite(data)
+            out[f"{kind}_n"] = filled.sum(axis=0)
+            for p in percentiles:
+                out[f"{kind}_p{p:g}"] = _nanpercentile(data, p)
+            out[f"{kind}_max"] = _nanpercentile(data, 100)
+        return pd.DataFrame(out, index=pd.Index(STAGES, name="stage"))
+
+    def brief(self) -> str:
+        """Строка p50/p99 (мс от границы бара) по стадиям для лога."""
+        rows = self.rows()
+        parts = []
+        for i, stage in enumerate(STAGES):
+            col = rows[:, i]
+            col = col[np.isfinite(col)]
+            if len(col):
+                p50, p99 = np.percentile(col, [50, 99])
+                parts.append(f"{stage} {p50:.0f}/{p99:.0f}")
+        return f"n={len(rows)} slow={self.slow} p50/p99 ms: " + " | ".join(parts)
+
+    def log_summary(self) -> None:
+        if not self.count:
+            return
+        with pd.option_context(
+            "display.width", 200, "display.float_format", "{:.1f}".format
+        ):
+            logger.info(
+                "[TRACE] %d bars, %d over budget %.0f ms\n%s",
+                self.count,
+                self.slow,
+                self.budget_ms,
+                self.summary().to_string(),
+            )
+
+
+def _steps(rows: np.ndarray) -> np.ndarray:
+    """Разность с предыдущей отмеченной стадией той же трассы (первая — с границей)."""
+    prev = np.column_stack([np.zeros(len(rows)), rows])
+    prev = pd.DataFrame(prev).ffill(axis=1).to_numpy()[:, :-1]
+    return rows - prev
+
+
+def _nanpercentile(data: np.ndarray, p: float) -> np.ndarray:
+    out = np.full(data.shape[1], np.nan)
+    for i in range(data.shape[1]):
+        col = data[:, i]
+        col = col[np.isfinite(col)]
+        if len(col):
+            out[i] = np.percentile(col, p)
+    return out
+
+
+def _finite(row: np.ndarray) -> dict[str, float]:
+    return {
+        stage: round(float(v), 3) for stage, v in zip(STAGES, row) if np.isfinite(v)
+    }
@@ -14,6 +14,23 @@ def normalize_kline(d: dict) -> dict:
     }
 
 
+TF_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+    "1d": 86_400_000,
+}
+
+
+def tf_to_ms(timeframe: str) -> int:
+    try:
+        return TF_MS[timeframe.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported timeframe: {timeframe}") from None
+
+
 def aggregate_ohlcv(df_base: pd.DataFrame, rule: str) -> pd.DataFrame:
     """
     Агрегирует 5m OHLCV в 1h/1d.
@@ -49,3 +66,40 @@ def to_ccxt_linear_symbol(symbol: str) -> str:
         return f"{base}/USDT:USDT"  # USDT-маржинальный linear
     # если уже в нормальном формате — вернём как есть
     return symb
+
+
+def read_ohlcv_file(path) -> pd.DataFrame:
+    """
+    Читает локальную историю OHLCV (CSV или Parquet) в формат
+    ['ts','o','h','l','c','v'] с ts в мс, без дублей, по возрастанию.
+    """
+    path = str(path)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+
+    df = df.rename(
+        columns={
+            "start_at": "ts",
+            "timestamp": "ts",
+            "open": "o",
+            "high": "h",
+            "low": "l",
+            "close": "c",
+            "volume": "v",
+        }
+    )
+    missing = {"ts", "o", "h", "l", "c", "v"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path}: нет колонок {sorted(missing)}")
+
+    df = df[["ts", "o", "h", "l", "c", "v"]]
+    df = df.astype(
+        {"ts": "int64", "o": float, "h": float, "l": float, "c": float, "v": float}
+    )
+    return (
+        df.drop_duplicates(subset=["ts"], keep="last")
+        .sort_values("ts")
+        .reset_index(drop=True)
+    )
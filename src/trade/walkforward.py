@@ -0,0 +1,311 @@
+"""
+Walk-forward: история режется на скользящие пары окон in-sample/out-of-sample.
+На in-sample перебирается сетка параметров WebsocketConfig, лучший набор
+проверяется на следующем out-of-sample окне.
+
+Индикаторы считаются один раз на всю историю и кладутся в cache_dir как .npy;
+воркеры открывают их через mmap, так что перекрывающиеся окна ничего не
+пересчитывают и не копируют. Так же кэшируется путь 1m подбаров для
+выходов внутри бара (WalkForwardConfig.sub_bars_path, см. intrabar.py).
+"""
+
+import hashlib
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import DEFAULT_INDICATORS, WalkForwardConfig, WebsocketConfig
+from trade.backtest import LEDGER_COLUMNS, BacktestResult, run_backtest
+from trade.feature_store import FeatureStore
+from trade.features import FEATURE_COLUMNS, compute_features
+from trade.intrabar import SubBarPath, cache_path, load_path
+
+logger = logging.getLogger(__name__)
+
+# массивы индикаторов, открытые в процессе-воркере (см. _init_worker)
+_FEATURES: Optional[dict[str, np.ndarray]] = None
+_SUB_BARS: Optional[SubBarPath] = None
+
+
+@dataclass(slots=True, frozen=True)
+class Fold:
+    index: int
+    is_start: int
+    is_stop: int
+    oos_start: int
+    oos_stop: int
+
+
+@dataclass(slots=True)
+class FoldResult:
+    fold: Fold
+    params: dict[str, Any]
+    is_result: BacktestResult
+    oos_result: BacktestResult
+
+
+@dataclass(slots=True)
+class WalkForwardReport:
+    folds: pd.DataFrame
+    trades: pd.DataFrame
+    summary: dict[str, Any] = field(default_factory=dict)
+
+
+def make_folds(
+    n_bars: int,
+    in_sample_bars: int,
+    out_sample_bars: int,
+    step_bars: Optional[int] = None,
+) -> list[Fold]:
+    step = step_bars or out_sample_bars
+    folds: list[Fold] = []
+    start = 0
+    while start + in_sample_bars + out_sample_bars <= n_bars:
+        is_stop = start + in_sample_bars
+        folds.append(
+            Fold(
+                index=len(folds),
+                is_start=start,
+                is_stop=is_stop,
+                oos_start=is_stop,
+                oos_stop=is_stop + out_sample_bars,
+            )
+        )
+        start += step
+    return folds
+
+
+def expand_grid(grid: dict[str, list[Any]]) -> list[dict[str, Any]]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def score(result: BacktestResult, objective: str) -> float:
+    if objective == "calmar":
+        return result.total_return / max(result.max_drawdown, 1e-3)
+    return result.total_return
+
+
+def cache_features(
+    df_base: pd.DataFrame,
+    cache_dir: Path,
+    store: Optional[FeatureStore] = None,
+    symbol: str = "",
+    timeframe: str = "",
+) -> Path:
+    """
+    Считает индикаторы и сохраняет их в cache_dir/<hash истории>/<col>.npy.
+    Повторный запуск на тех же данных берёт готовые файлы; со store ряды
+    берутся из FeatureStore — история, дополненная новыми барами, только
+    дописывает хвост.
+    """
+    digest = hashlib.sha1()
+    for col in ("ts", "o", "h", "l", "c"):
+        digest.update(np.ascontiguousarray(df_base[col].to_numpy()).tobytes())
+    feature_dir = Path(cache_dir) / digest.hexdigest()[:16]
+
+    if all((feature_dir / f"{col}.npy").exists() for col in FEATURE_COLUMNS):
+        logger.info("Features cache hit: %s", feature_dir)
+        return feature_dir
+
+    feature_dir.mkdir(parents=True, exist_ok=True)
+    features: Optional[Mapping[str, Any]] = None
+    if store is not None:
+        try:
+            features = {
+                "ts": df_base["ts"].to_numpy(dtype=np.int64),
+                "c": df_base["c"].to_numpy(dtype=float),
+                **store.load(symbol, timeframe, df_base, DEFAULT_INDICATORS),
+            }
+        except ValueError as e:
+            logger.warning("Feature store skipped: %s", e)
+    if features is None:
+        features = compute_features(df_base)
+    for col in FEATURE_COLUMNS:
+        np.save(feature_dir / f"{col}.npy", np.asarray(features[col]))
+    logger.info("Features cached: %s (%d bars)", feature_dir, len(features))
+    return feature_dir
+
+
+def load_features(feature_dir: Path) -> dict[str, np.ndarray]:
+    return {
+        col: np.load(Path(feature_dir) / f"{col}.npy", mmap_mode="r")
+        for col in FEATURE_COLUMNS
+    }
+
+
+def _init_worker(feature_dir: Path, sub_bars_dir: Optional[Path] = None) -> None:
+    global _FEATURES, _SUB_BARS
+    _FEATURES = load_features(feature_dir)
+    _SUB_BARS = load_path(sub_bars_dir) if sub_bars_dir is not None else None
+
+
+def _run_fold(
+    fold: Fold,
+    base_params: WebsocketConfig,
+    candidates: list[dict[str, Any]],
+    objective: str,
+    start_balance: float,
+) -> FoldResult:
+    assert _FEATURES is not None, "worker is not initialized"
+
+    best: Optional[tuple[float, dict[str, Any], BacktestResult]] = None
+    for candidate in candidates:
+        params = base_params.model_copy(update=candidate)
+        result = run_backtest(
+            _FEATURES,
+            params,
+            start=fold.is_start,
+            stop=fold.is_stop,
+            start_balance=start_balance,
+            sub_bars=_SUB_BARS,
+        )
+        value = score(result, objective)
+        if best is None or value > best[0]:
+            best = (value, candidate, result)
+
+    _, chosen, is_result = best
+    oos_result = run_backtest(
+        _FEATURES,
+        base_params.model_copy(update=chosen),
+        start=fold.oos_start,
+        stop=fold.oos_stop,
+        start_balance=start_balance,
+        sub_bars=_SUB_BARS,
+    )
+    return FoldResult(fold, chosen, is_result, oos_result)
+
+
+def build_report(
+    results: list[FoldResult],
+    ts: np.ndarray,
+) -> WalkForwardReport:
+    rows = []
+    trades = []
+    for r in results:
+        rows.append(
+            {
+                "fold": r.fold.index,
+                "is_start_ts": int(ts[r.fold.is_start]),
+                "oos_start_ts": int(ts[r.fold.oos_start]),
+                "oos_end_ts": int(ts[r.fold.oos_stop - 1]),
+                **r.params,
+                "is_return": r.is_result.total_return,
+                "is_trades": len(r.is_result.trades),
+                "oos_return": r.oos_result.total_return,
+                "oos_max_dd": r.oos_result.max_drawdown,
+                "oos_trades": len(r.oos_result.trades),
+            }
+        )
+        if r.oos_result.trades:
+            ledger = r.oos_result.ledger()
+            ledger.insert(0, "fold", r.fold.index)
+            trades.append(ledger)
+
+    folds = pd.DataFrame(rows)
+    trades_df = (
+        pd.concat(trades, ignore_index=True)
+        if trades
+        else pd.DataFrame(columns=["fold", *LEDGER_COLUMNS])
+    )
+
+    summary: dict[str, Any] = {"folds": len(folds)}
+    if not folds.empty:
+        oos = folds["oos_return"]
+        summary.update(
+            {
+                "oos_compounded_return": float(np.prod(1 + oos.to_numpy()) - 1),
+                "oos_mean_return": float(oos.mean()),
+                "oos_positive_folds": float((oos > 0).mean()),
+                "oos_worst_dd": float(folds["oos_max_dd"].max()),
+                "oos_trades": int(folds["oos_trades"].sum()),
+                "oos_hit_rate": (
+                    float((trades_df["pnl"] > 0).mean()) if not trades_df.empty else 0.0
+                ),
+                "is_oos_return_gap": float((folds["is_return"] - oos).mean()),
+            }
+        )
+    return WalkForwardReport(folds=folds, trades=trades_df, summary=summary)
+
+
+def run_walkforward(
+    df_base: pd.DataFrame,
+    base_params: WebsocketConfig,
+    cfg: WalkForwardConfig,
+    df_sub: Optional[pd.DataFrame] = None,
+    base_ms: Optional[int] = None,
+    store: Optional[FeatureStore] = None,
+    symbol: str = "",
+    timeframe: str = "",
+) -> WalkForwardReport:
+    """
+    df_sub: 1m подбары под df_base (base_ms — длина базового бара) — трейлинг
+    тогда проверяется по пути подбаров, а не по close базового бара.
+    store: индикаторы из FeatureStore по (symbol, timeframe) вместо расчёта.
+    """
+    folds = make_folds(
+        len(df_base), cfg.in_sample_bars, cfg.out_sample_bars, cfg.step_bars
+    )
+    if not folds:
+        raise ValueError(
+            f"История слишком короткая: {len(df_base)} баров < "
+            f"{cfg.in_sample_bars + cfg.out_sample_bars}"
+        )
+
+    feature_dir = cache_features(df_base, cfg.cache_dir, store, symbol, timeframe)
+    sub_bars_dir = (
+        cache_path(df_base, base_ms, df_sub, cfg.intrabar_path, feature_dir)
+        if df_sub is not None
+        else None
+    )
+    candidates = expand_grid(cfg.grid)
+    workers = min(cfg.workers or os.cpu_count() or 1, len(folds))
+    logger.info(
+        "Walk-forward: %d folds x %d candidates on %d workers",
+        len(folds),
+        len(candidates),
+        workers,
+    )
+
+    job = partial(
+        _run_fold,
+        base_params=base_params,
+        candidates=candidates,
+        objective=cfg.objective,
+        start_balance=cfg.start_balance,
+    )
+    results: list[FoldResult] = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(feature_dir, sub_bars_dir),
+    ) as pool:
+        for result in pool.map(job, folds):
+            results.append(result)
+            logger.info(
+                "Fold %d/%d: params=%s | IS=%.4f | OOS=%.4f (%d trades)",
+                result.fold.index + 1,
+                len(folds),
+                result.params,
+                result.is_result.total_return,
+                result.oos_result.total_return,
+                len(result.oos_result.trades),
+            )
+
+    report = build_report(results, df_base["ts"].to_numpy())
+    report_path = Path(cfg.report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.folds.to_csv(report_path, index=False)
+    report.trades.to_csv(
+        report_path.with_name(f"{report_path.stem}_trades.csv"), index=False
+    )
+    logger.info("Walk-forward report written to %s", report_path)
+    return report
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+# core.config собирает settings при импорте — обязательные поля из окружения
+os.environ.setdefault("APP__API__KEY", "test-key")
+os.environ.setdefault("APP__API__SECRET", "test-secret-key")
+os.environ.setdefault("APP__WS__URL", "wss://stream.bybit.com/v5/public/linear")
+os.environ.setdefault("APP__WS__SYMBOL", "BTCUSDT")
+os.environ.setdefault("APP__WS__TIMEFRAME", "5m")
+
+from core.config import settings  # noqa: E402
+from trade.synthetic import SyntheticMarket  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def bars():
+    """Синтетические 5m бары: столбцы ts, o, h, l, c, v."""
+    return SyntheticMarket(["LTCUSDT"], "5m", seed=7).to_frame(40_000)["LTCUSDT"]
+
+
+@pytest.fixture(scope="session")
+def params():
+    """Частые сделки и узкий трейлинг: много выходов на одном баре со входом."""
+    return settings.ws.model_copy(
+        update={
+            "min_atr_1h": None,
+            "retest_pct": 0.01,
+            "max_bars_wait": 48,
+            "rsi_long_max": 60.0,
+            "rsi_short_min": 40.0,
+            "trailing_pct": 0.003,
+            "balance_drawdown_limit_pct": 0.9,
+        }
+    )
@@ -0,0 +1,85 @@
+import asyncio
+
+from trade.barclock import EarlyBarCloser
+from trade.data_ws import DataWS
+
+TF_MS = 300_000
+
+
+def candle(start_at: int, close: float) -> dict:
+    return {
+        "start_at": start_at,
+        "open": 1.0,
+        "high": max(1.0, close),
+        "low": min(1.0, close),
+        "close": close,
+        "volume": 1.0,
+    }
+
+
+def test_close_by_clock():
+    closer = EarlyBarCloser(TF_MS, grace_ms=150)
+    closer.observe_clock(0, 0)
+    assert closer.update(candle(0, 2.0)) is None
+    assert closer.close_due(TF_MS + 100) is None
+    bar = closer.close_due(TF_MS + 150)
+    assert bar["start_at"] == 0
+    assert not closer.confirm(candle(0, 2.0))  # matched
+    assert closer.stats["early"] == closer.stats["matched"] == 1
+
+
+def test_next_bar_before_deadline_closes_current():
+    closer = EarlyBarCloser(TF_MS, grace_ms=150)
+    closer.observe_clock(0, 0)
+    closer.update(candle(0, 2.0))
+    # первое обновление следующего бара раньше дедлайна текущего
+    rolled = closer.update(candle(TF_MS, 2.5))
+    assert rolled is not None and rolled["start_at"] == 0
+    assert closer.forming["start_at"] == TF_MS
+    assert closer.close_due(TF_MS + 150) is None  # дедлайн уже следующего бара
+
+    assert not closer.confirm(candle(0, 2.0))
+    assert closer.stats == {
+        "early": 1,
+        "matched": 1,
+        "revised": 0,
+        "missed": 0,
+        "rolled": 1,
+    }
+
+
+def test_late_update_of_closed_bar_is_ignored():
+    closer = EarlyBarCloser(TF_MS)
+    closer.update(candle(0, 2.0))
+    closer.update(candle(TF_MS, 2.5))
+    assert closer.update(candle(0, 2.1)) is None
+    assert closer.forming["start_at"] == TF_MS
+    assert closer.confirm(candle(0, 2.1))  # revised: отдаётся ещё раз
+    assert closer.stats["revised"] == 1
+
+
+def test_data_ws_emits_rolled_bar():
+    got = []
+
+    async def handler(bar, backfill=False):
+        got.append((bar["start_at"], bar["close"]))
+
+    def raw(start: int, close: float, confirm: bool) -> dict:
+        return {**candle(start, close), "start": start, "confirm": confirm}
+
+    async def run():
+        ws = DataWS(handler, early_close=True)
+        feed = ws.feeds[0]
+        await ws._on_candles(feed, {"ts": 10}, [raw(0, 2.0, False)], 10.0)
+        assert got == []
+        await ws._on_candles(
+            feed, {"ts": TF_MS + 100}, [raw(TF_MS, 2.5, False)], TF_MS + 100.0
+        )
+        assert got == [(0, 2.0)]
+        # совпавший confirm повторно не отдаётся
+        await ws._on_candles(
+            feed, {"ts": TF_MS + 400}, [raw(0, 2.0, True)], TF_MS + 400.0
+        )
+        assert got == [(0, 2.0)]
+
+    asyncio.run(run())
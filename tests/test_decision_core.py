@@ -0,0 +1,80 @@
+import logging
+
+from trade.backtest import run_backtest
+from trade.engine import BarSignals, DecisionCore, StrategyCore
+from trade.features import compute_features
+from trade.results import ReplayRecorder, ResultsWriter, open_run, replay_bars
+from trade.shadow import ShadowBook
+
+
+def count_core_exits(monkeypatch) -> list:
+    """Выходы, учтённые ядрами в серии убытков (DecisionCore.on_exit)."""
+    calls = []
+    on_exit = DecisionCore.on_exit
+
+    def spy(self, side, price):
+        calls.append((side, price))
+        on_exit(self, side, price)
+
+    monkeypatch.setattr(DecisionCore, "on_exit", spy)
+    return calls
+
+
+def test_backtest_ledger_matches_core(monkeypatch, bars, params):
+    calls = count_core_exits(monkeypatch)
+    result = run_backtest(compute_features(bars), params)
+    assert len(result.trades) > 100
+    assert len(calls) == len(result.trades)
+
+
+def test_replay_recorder_matches_core(monkeypatch, tmp_path, bars, params):
+    calls = count_core_exits(monkeypatch)
+    core = StrategyCore("5m", params=params)
+    writer = ResultsWriter(tmp_path)
+    recorder = ReplayRecorder(
+        writer,
+        core.on_entry_filled,
+        1000.0,
+        params.order_percent,
+        params.max_order_cost_usdt,
+    )
+    replay_bars(core, recorder, (bars[["ts", "o", "h", "l", "c", "v"]],))
+    writer.close()
+
+    exits = open_run(tmp_path).table("exits")
+    assert len(exits["ts"]) > 100
+    assert len(calls) == len(exits["ts"])
+
+
+def test_shadow_ledger_matches_core(monkeypatch, bars, params):
+    core = StrategyCore("5m", params=params)
+    core.shadows = ShadowBook(
+        {
+            "same": params,
+            "wide": params.model_copy(update={"trailing_pct": 0.006}),
+        }
+    )
+    # без счёта основная конфигурация не входит — выходы только теневые
+    calls = count_core_exits(monkeypatch)
+    replay_bars(core, None, (bars[["ts", "o", "h", "l", "c", "v"]],))
+
+    assert core.shadows.trades.sum() > 100
+    assert len(calls) == core.shadows.trades.sum()
+
+
+def test_paper_core_does_not_log(caplog, params):
+    caplog.set_level(logging.DEBUG)
+    core = DecisionCore(params, max_consecutive_losses=1, log=False)
+    core.on_entry_filled("long", 100.0)
+    core.decide(BarSignals(0, 90.0, False, False), 1000.0)
+    core.decide(BarSignals(1, 90.0, True, False), 1000.0)
+    assert core.cooldown_bars > 0
+    assert caplog.records == []
+
+
+def test_fill_log_without_trailing(caplog, params):
+    caplog.set_level(logging.INFO, logger="trade.engine")
+    core = DecisionCore(params)
+    core.on_entry_filled("short", 100.0, trailing=False)
+    assert not core.trailing["short"].active
+    assert caplog.messages == ["[FILLED] short entry at 100.000000"]
@@ -0,0 +1,60 @@
+import logging
+
+import numpy as np
+
+from core.config import DEFAULT_INDICATORS
+from trade.feature_store import FeatureStore
+from trade.features import compute_indicator
+
+
+def full_series(bars) -> dict[str, np.ndarray]:
+    ts, high, low, close = (bars[k].to_numpy() for k in ("ts", "h", "l", "c"))
+    return {
+        spec.name: compute_indicator(ts, high, low, close, spec)[0]
+        for spec in DEFAULT_INDICATORS
+    }
+
+
+def assert_same(features, expected: dict[str, np.ndarray]) -> None:
+    for name, values in expected.items():
+        np.testing.assert_array_equal(np.asarray(features[name]), values)
+
+
+def test_extend_matches_full_recompute(caplog, tmp_path, bars):
+    caplog.set_level(logging.INFO, logger="trade.feature_store")
+    store = FeatureStore(tmp_path)
+    head = bars.iloc[:30_000]
+    assert_same(
+        store.load("LTCUSDT", "5m", head, DEFAULT_INDICATORS), full_series(head)
+    )
+    # дозапись от сохранённого seed — те же значения, что расчёт с нуля
+    for stop in (30_137, len(bars)):
+        part = bars.iloc[:stop]
+        assert_same(
+            store.load("LTCUSDT", "5m", part, DEFAULT_INDICATORS), full_series(part)
+        )
+        assert "0 cached, 5 extended" in caplog.messages[-1]
+    store.load("LTCUSDT", "5m", bars, DEFAULT_INDICATORS)
+    assert "5 cached" in caplog.messages[-1]
+
+
+def test_changed_history_is_recomputed(tmp_path, bars):
+    store = FeatureStore(tmp_path)
+    store.load("LTCUSDT", "5m", bars.iloc[:30_000], DEFAULT_INDICATORS)
+    changed = bars.copy()
+    changed.loc[500, "c"] += 1.0
+    assert_same(
+        store.load("LTCUSDT", "5m", changed, DEFAULT_INDICATORS),
+        full_series(changed),
+    )
+
+
+def test_chunks_match_single_frame(tmp_path, bars):
+    bounds = range(0, len(bars), 7_000)
+    chunked = FeatureStore(tmp_path / "chunks").load_chunks(
+        "LTCUSDT",
+        "5m",
+        lambda: (bars.iloc[lo : lo + 7_000] for lo in bounds),
+        DEFAULT_INDICATORS,
+    )
+    assert_same(chunked, full_series(bars))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from core.config import DEFAULT_INDICATORS, IndicatorSpec
+from trade.features import compute_features, compute_indicator
+from trade.indicator_graph import IndicatorGraph
+
+
+def graph_series(bars, specs) -> dict[str, np.ndarray]:
+    """Значения IndicatorGraph на каждом баре; None — NaN."""
+    graph = IndicatorGraph(specs, "5m")
+    out = {name: np.empty(len(bars)) for name in graph.names}
+    for i, (ts, o, h, l, c) in enumerate(
+        bars[["ts", "o", "h", "l", "c"]].itertuples(index=False, name=None)
+    ):
+        values = graph.on_bar(
+            {"start_at": ts, "open": o, "high": h, "low": l, "close": c}
+        )
+        for name, value in values.items():
+            out[name][i] = np.nan if value is None else value
+    return out
+
+
+def assert_same_series(actual: np.ndarray, expected: np.ndarray) -> None:
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, equal_nan=True)
+
+
+@pytest.fixture(scope="module")
+def graph_values(bars):
+    return graph_series(bars, DEFAULT_INDICATORS)
+
+
+def test_graph_matches_compute_features(bars, graph_values):
+    features = compute_features(bars)
+    for spec in DEFAULT_INDICATORS:
+        assert_same_series(graph_values[spec.name], features[spec.name].to_numpy())
+
+
+def test_graph_matches_compute_indicator(bars, graph_values):
+    ts, high, low, close = (bars[k].to_numpy() for k in ("ts", "h", "l", "c"))
+    for spec in DEFAULT_INDICATORS:
+        series, _ = compute_indicator(ts, high, low, close, spec)
+        assert_same_series(graph_values[spec.name], series)
+
+
+def test_compute_indicator_continues_from_seed(bars):
+    ts, high, low, close = (bars[k].to_numpy() for k in ("ts", "h", "l", "c"))
+    cut = 25_000
+    for spec in [
+        *DEFAULT_INDICATORS,
+        IndicatorSpec(name="rsi15", kind="rsi", timeframe="15m", window=14),
+    ]:
+        full, _ = compute_indicator(ts, high, low, close, spec)
+        _, seed = compute_indicator(ts[:cut], high[:cut], low[:cut], close[:cut], spec)
+        tail, _ = compute_indicator(
+            ts[seed.start :],
+            high[seed.start :],
+            low[seed.start :],
+            close[seed.start :],
+            spec,
+            seed,
+        )
+        np.testing.assert_array_equal(tail, full[seed.start :])
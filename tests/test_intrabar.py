@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from trade.intrabar import SCAN_REASONS, scan_exits
+from trade.trailing import TrailingStopManager
+
+
+@pytest.mark.parametrize("take_profit_pct", [None, 0.02])
+def test_scan_exits_matches_trailing_manager(take_profit_pct):
+    rng = np.random.default_rng(1)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 50_000)))
+    n = 500
+    start = rng.integers(1, 45_000, n)
+    end = np.minimum(start + rng.integers(1, 5_000, n), len(prices))
+    is_long = rng.random(n) < 0.5
+    entry = prices[start - 1] * (1 + rng.normal(0, 0.001, n))
+
+    index, code = scan_exits(
+        prices, start, end, entry, is_long, 0.01, take_profit_pct, chunk=64
+    )
+
+    for k in range(n):
+        manager = TrailingStopManager(
+            "long" if is_long[k] else "short", 0.01, take_profit_pct
+        )
+        manager.activate(entry[k])
+        expected = (-1, "")
+        for j in range(start[k], end[k]):
+            manager.update_price(prices[j])
+            reason = manager.should_exit(prices[j])
+            if reason:
+                expected = (j, reason)
+                break
+        assert (int(index[k]), SCAN_REASONS[code[k]]) == expected
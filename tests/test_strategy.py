@@ -0,0 +1,62 @@
+import numpy as np
+
+from trade.features import compute_features, tradable_mask
+from trade.strategy import BatchStrategyState, StrategyState
+
+# (retest_pct, max_bars_wait, rsi_long_max, rsi_short_min)
+VARIANTS = [
+    (0.003, 12, 45.0, 55.0),
+    (0.01, 48, 60.0, 40.0),
+    (0.006, 24, 55.0, 45.0),
+    (0.002, 6, 70.0, 30.0),
+]
+
+
+def test_batch_state_matches_scalar_states(bars):
+    features = compute_features(bars)
+    rows = features[tradable_mask(features)]
+    retest, wait, rsi_long, rsi_short = (np.array(col) for col in zip(*VARIANTS))
+    batch = BatchStrategyState(
+        len(VARIANTS),
+        retest_pct=retest,
+        max_bars_wait=wait,
+        rsi_long_max=rsi_long,
+        rsi_short_min=rsi_short,
+    )
+    states = [StrategyState(*variant) for variant in VARIANTS]
+    # бар закрывается не у всех вариантов сразу — как маска ATR в ShadowBook
+    rng = np.random.default_rng(1)
+
+    n = len(VARIANTS)
+    signals = 0
+    for ts, c, ema60_5, ema163_5, ema1h, rsi1d in rows[
+        ["ts", "c", "ema60_5", "ema163_5", "ema1h", "rsi1d"]
+    ].itertuples(index=False, name=None):
+        active = rng.random(n) < 0.9
+        longs, shorts = batch.on_new_bars(
+            np.full(n, ts),
+            np.full(n, c),
+            price5=np.full(n, c),
+            ema60_5=np.full(n, ema60_5),
+            ema163_5=np.full(n, ema163_5),
+            ema1h=np.full(n, ema1h),
+            rsi1d=np.full(n, rsi1d),
+            active=active,
+        )
+        for i, state in enumerate(states):
+            expected = (
+                state.update(
+                    ts,
+                    c,
+                    price5=c,
+                    ema60_5=ema60_5,
+                    ema163_5=ema163_5,
+                    ema1h=ema1h,
+                    rsi1d=rsi1d,
+                )
+                if active[i]
+                else (False, False)
+            )
+            assert (bool(longs[i]), bool(shorts[i])) == expected
+            signals += sum(expected)
+    assert signals > 100